@@ -0,0 +1,47 @@
+"""
+Startup benchmarks of the FPVsimulation package.
+
+The heavy dependencies are imported lazily, so importing the simulation module should
+not load pandas, pvlib, requests, geopandas, shapely or pyproj. Each timeraw benchmark
+runs in a fresh interpreter.
+"""
+import subprocess
+import sys
+
+# Modules that importing FPVsimulation should not execute
+heavy_modules = ('pandas', 'pvlib', 'requests', 'geopandas', 'shapely', 'pyproj', 'scipy.spatial')
+
+
+def timeraw_import_simulation():
+    return """
+    import FPVsimulation.simulation
+    """
+
+
+def timeraw_import_pvsystem():
+    return """
+    import FPVsimulation.pvsystem
+    """
+
+
+def timeraw_import_default_soiling_lookup():
+    return """
+    from FPVsimulation.soiling_loss_NS3031 import get_default_soiling_lookup
+    get_default_soiling_lookup().get_soiling(60.0, 10.0)
+    """
+
+
+def track_heavy_modules_loaded():
+    """
+    Number of heavy modules executed by importing FPVsimulation.simulation, expected 0.
+    """
+    code = ("import sys, FPVsimulation.simulation\n"
+            f"print(sum(type(sys.modules.get(name)).__name__ == 'module' for name in {heavy_modules!r}))")
+    return int(subprocess.check_output([sys.executable, '-c', code]))
+
+
+track_heavy_modules_loaded.unit = 'modules'
+
+
+def peakmem_import_simulation():
+    import FPVsimulation.simulation
@@ -0,0 +1,122 @@
+"""
+Benchmarks of the PVmodel and PVsystem hot paths on the TMY fixture.
+"""
+import numpy as np
+from .fixtures import fixture_latitude, fixture_longitude, load_tmy, make_weather_cache
+
+
+class PVmodelSuite:
+    """
+    PVmodel.get_module_performance on the hourly data of n systems, stacked as rows, and
+    the array kernel on hours x systems arrays, with and without preallocated buffers.
+    """
+    params = [1, 100, 1000]
+    param_names = ['n_systems']
+
+    def setup(self, n_systems):
+        import pandas as pd
+        from FPVsimulation.pvmodel import PVmodel, default_PVmodel_parameters, get_module_performance_buffers
+
+        tmy_df = load_tmy()
+        G_poa_df = pd.DataFrame({'poa_global_W/m2': tmy_df['G(h)'].to_numpy(),
+                                 'T2m': tmy_df['T2m'].to_numpy(),
+                                 'aoi': np.linspace(0, 120, len(tmy_df))})
+        self.G_poa_df = pd.concat([G_poa_df]*n_systems, ignore_index=True)
+        self.module = PVmodel(dict(default_PVmodel_parameters))
+        self.arrays = [np.repeat(G_poa_df[column].to_numpy()[:, None], n_systems, axis=1)
+                       for column in ('poa_global_W/m2', 'T2m', 'aoi')]
+        self.buffers = get_module_performance_buffers(self.arrays[0].shape)
+
+    def time_get_module_performance(self, n_systems):
+        self.module.get_module_performance(self.G_poa_df)
+
+    def peakmem_get_module_performance(self, n_systems):
+        self.module.get_module_performance(self.G_poa_df)
+
+    def time_get_module_performance_arrays(self, n_systems):
+        self.module.get_module_performance_arrays(*self.arrays)
+
+    def time_get_module_performance_arrays_out(self, n_systems):
+        self.module.get_module_performance_arrays(*self.arrays, out=self.buffers)
+
+    def peakmem_get_module_performance_arrays_out(self, n_systems):
+        self.module.get_module_performance_arrays(*self.arrays, out=self.buffers)
+
+
+class PVsystemSuite:
+    """
+    PVsystem methods of one system, with the weather read from the offline cache.
+    """
+    params = [0, 20]
+    param_names = ['tilt']
+
+    def setup(self, tilt):
+        from FPVsimulation.pvmodel import default_PVmodel_parameters
+
+        self.weather_cache = make_weather_cache()
+        self.PVparams = dict(default_PVmodel_parameters, tilt=tilt)
+        self.weather = load_tmy()
+        # Warm the shared solar position cache, as in a fleet run
+        self.make_system().get_annual_energy_yield(self.PVparams)
+
+    def make_system(self):
+        from FPVsimulation.pvsystem import PVsystem
+        return PVsystem(fixture_latitude, fixture_longitude, 2e4, 5.0, weather_cache=self.weather_cache)
+
+    def time_get_system_simulation_data(self, tilt):
+        self.make_system().get_system_simulation_data(self.PVparams)
+
+    def time_get_montly_aggragates(self, tilt):
+        self.make_system().get_montly_aggragates(self.PVparams)
+
+    def time_get_annual_energy_yield(self, tilt):
+        self.make_system().get_annual_energy_yield(self.PVparams)
+
+    def time_get_annual_energy_yield_weather(self, tilt):
+        self.make_system().get_annual_energy_yield(self.PVparams, self.weather)
+
+
+class SolarPositionSuite:
+    """
+    Solar position of n distinct locations over the TMY time index with the vectorized
+    algorithm of Meeus.
+    """
+    params = [100, 1000, 10000]
+    param_names = ['n_locations']
+    timeout = 1200
+    number = 1
+
+    def setup(self, n_locations):
+        from FPVsimulation.solar_position import get_solar_position_meeus
+
+        rng = np.random.default_rng(0)
+        self.times = load_tmy().index
+        self.latitudes = rng.uniform(58, 71, n_locations)
+        self.longitudes = rng.uniform(5, 31, n_locations)
+        # Look up the altitudes of the refraction correction, kept for the timed calls
+        get_solar_position_meeus(self.times[:1], self.latitudes, self.longitudes)
+
+    def time_meeus(self, n_locations):
+        from FPVsimulation.solar_position import get_solar_position_meeus
+        get_solar_position_meeus(self.times, self.latitudes, self.longitudes)
+
+
+class SolarPositionSPASuite:
+    """
+    Solar position with the SPA of pvlib per location, about a minute per 1000 locations.
+    """
+    params = [100, 1000]
+    param_names = ['n_locations']
+    timeout = 1200
+    number = 1
+
+    def setup(self, n_locations):
+        rng = np.random.default_rng(0)
+        self.times = load_tmy().index
+        self.latitudes = rng.uniform(58, 71, n_locations)
+        self.longitudes = rng.uniform(5, 31, n_locations)
+
+    def time_spa(self, n_locations):
+        import pvlib
+        for latitude, longitude in zip(self.latitudes, self.longitudes):
+            pvlib.location.Location(latitude, longitude).get_solarposition(self.times)
@@ -0,0 +1,149 @@
+"""
+Benchmarks of FPVsimulation fleet runs on the TMY fixture.
+
+The systems share 100 distinct coordinates within one weather cache cell, so a run reads
+the fixture from the offline cache for every system and the solar position cache is warm.
+"""
+from .fixtures import make_lakes_dataframe, make_weather_cache, make_weather_store
+
+
+class FPVsimulationSuite:
+    """
+    FPVsimulation.get_annual_energy_yield and the batch engine at 1 to 10k systems.
+    """
+    params = [1, 100, 1000, 10000]
+    param_names = ['n_systems']
+    timeout = 1200
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup_cache(self):
+        return make_weather_cache()
+
+    def setup(self, weather_cache, n_systems):
+        from FPVsimulation.simulation import FPVsimulation
+
+        self.dataframe = make_lakes_dataframe(n_systems)
+        self.simulation = FPVsimulation(weather_cache=weather_cache)
+        self.simulation.register_lakes(self.dataframe)
+        warm_up = FPVsimulation(weather_cache=weather_cache)
+        warm_up.register_lakes(make_lakes_dataframe(100))
+        warm_up.get_annual_energy_yield()
+
+    def time_register_lakes(self, weather_cache, n_systems):
+        from FPVsimulation.simulation import FPVsimulation
+        FPVsimulation(weather_cache=weather_cache).register_lakes(self.dataframe)
+
+    def time_get_annual_energy_yield(self, weather_cache, n_systems):
+        self.simulation.get_annual_energy_yield()
+
+    def peakmem_get_annual_energy_yield(self, weather_cache, n_systems):
+        self.simulation.get_annual_energy_yield()
+
+    def time_batch_annual_energy_yield(self, weather_cache, n_systems):
+        from FPVsimulation.batch import PVsystemBatch
+        systems = [system for lake in self.simulation.lakes.values() for system in lake.systems]
+        PVsystemBatch(systems).get_annual_energy_yield(self.simulation.PVmodel_parameters)
+
+    def peakmem_batch_annual_energy_yield(self, weather_cache, n_systems):
+        from FPVsimulation.batch import PVsystemBatch
+        systems = [system for lake in self.simulation.lakes.values() for system in lake.systems]
+        PVsystemBatch(systems).get_annual_energy_yield(self.simulation.PVmodel_parameters)
+
+
+class WeatherStoreSuite:
+    """
+    FPVsimulation.get_annual_energy_yield and the batch engine reading the weather from a
+    memory-mapped weather store instead of the weather cache.
+    """
+    params = [100, 1000, 10000]
+    param_names = ['n_systems']
+    timeout = 1200
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup_cache(self):
+        return make_weather_store()
+
+    def setup(self, weather_store, n_systems):
+        from FPVsimulation.simulation import FPVsimulation
+
+        self.simulation = FPVsimulation(weather_store=weather_store)
+        self.simulation.register_lakes(make_lakes_dataframe(n_systems))
+        warm_up = FPVsimulation(weather_store=weather_store)
+        warm_up.register_lakes(make_lakes_dataframe(100))
+        warm_up.get_annual_energy_yield()
+
+    def time_get_annual_energy_yield(self, weather_store, n_systems):
+        self.simulation.get_annual_energy_yield()
+
+    def time_batch_annual_energy_yield(self, weather_store, n_systems):
+        from FPVsimulation.batch import PVsystemBatch
+        systems = [system for lake in self.simulation.lakes.values() for system in lake.systems]
+        PVsystemBatch(systems).get_annual_energy_yield(self.simulation.PVmodel_parameters)
+
+    def time_get_weather_arrays(self, weather_store, n_systems):
+        from FPVsimulation.batch import PVsystemBatch
+        systems = [system for lake in self.simulation.lakes.values() for system in lake.systems]
+        PVsystemBatch(systems).get_weather_arrays()
+
+
+class StageCachingSuite:
+    """
+    FPVsimulation.get_annual_energy_yield after a change of one PV model parameter, with the
+    intermediate results of the systems kept by their stage caches.
+    """
+    params = [100, 1000]
+    param_names = ['n_systems']
+    timeout = 1200
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup_cache(self):
+        return make_weather_cache()
+
+    def setup(self, weather_cache, n_systems):
+        from FPVsimulation.simulation import FPVsimulation
+
+        self.simulation = FPVsimulation(weather_cache=weather_cache)
+        self.simulation.register_lakes(make_lakes_dataframe(n_systems))
+        self.simulation.set_stage_caching()
+        self.simulation.get_annual_energy_yield()
+
+    def time_change_derate_factor(self, weather_cache, n_systems):
+        self.simulation.set_PVmodel_parameters({'system_derate_factor': 0.8})
+        self.simulation.get_annual_energy_yield()
+
+    def time_change_efficiency(self, weather_cache, n_systems):
+        self.simulation.set_PVmodel_parameters({'eff_nom': 21})
+        self.simulation.get_annual_energy_yield()
+
+    def time_change_tilt(self, weather_cache, n_systems):
+        self.simulation.set_PVmodel_parameters({'tilt': 15})
+        self.simulation.get_annual_energy_yield()
+
+
+class ResultCacheSuite:
+    """
+    Repeated FPVsimulation.get_annual_energy_yield with the same inputs, served by a result cache.
+    """
+    params = [100, 1000]
+    param_names = ['n_systems']
+    timeout = 1200
+    number = 1
+    repeat = (1, 3, 600)
+
+    def setup_cache(self):
+        return make_weather_cache()
+
+    def setup(self, weather_cache, n_systems):
+        from FPVsimulation.result_cache import ResultCache
+        from FPVsimulation.simulation import FPVsimulation
+
+        self.simulation = FPVsimulation(weather_cache=weather_cache)
+        self.simulation.register_lakes(make_lakes_dataframe(n_systems))
+        self.simulation.set_result_cache(ResultCache())
+        self.simulation.get_annual_energy_yield()
+
+    def time_get_annual_energy_yield(self, weather_cache, n_systems):
+        self.simulation.get_annual_energy_yield()
@@ -0,0 +1,118 @@
+"""
+Synthetic, checked-in inputs for the benchmarks, so they run without network access.
+
+The TMY fixture in data/ has the columns and time format of a PVGIS TMY response for a
+location near Oslo. It is generated from a clear sky model with random cloudiness, and can
+be regenerated with `python benchmarks/fixtures.py`.
+"""
+import os
+import tempfile
+import numpy as np
+
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+tmy_fixture_path = os.path.join(fixture_dir, 'tmy_60.00_10.00.csv.gz')
+
+# Location of the TMY fixture; all benchmark systems lie in its 1 degree weather cache cell
+fixture_latitude = 60.0
+fixture_longitude = 10.0
+fixture_grid_resolution = 1.0
+
+# Year of each month of the TMY, as PVGIS combines months from different years
+tmy_years = (2007, 2010, 2012, 2008, 2015, 2011, 2009, 2013, 2016, 2006, 2014, 2019)
+
+
+def make_synthetic_tmy(latitude=fixture_latitude, longitude=fixture_longitude, seed=0):
+    """
+    Generates a synthetic TMY profile in the PVGIS response format.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Hourly data with a 'time(UTC)' column formatted as in the PVGIS response.
+    """
+    import pandas as pd
+    import pvlib
+
+    rng = np.random.default_rng(seed)
+    times = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(f'{year}-{month:02d}-01', periods=24*pd.Period(f'{year}-{month:02d}').days_in_month,
+                      freq='h').to_numpy()
+        for month, year in enumerate(tmy_years, start=1)]))
+    zenith = pvlib.solarposition.get_solarposition(times, latitude, longitude)['zenith'].to_numpy()
+    cos_zenith = np.cos(np.radians(zenith)).clip(min=0)
+    clearness = rng.uniform(0.2, 0.8, len(times))
+    dni = 900*clearness*cos_zenith**0.3*(cos_zenith > 0)
+    dhi = 120*cos_zenith*(1 - clearness) + 5*(cos_zenith > 0)
+    day_of_year = np.arange(len(times))/len(times)
+    return pd.DataFrame({
+        'time(UTC)': times.strftime('%Y%m%d:%H%M'),
+        'T2m': (5 + 10*np.sin(2*np.pi*day_of_year - 1.5) + rng.normal(0, 2, len(times))).round(2),
+        'RH': rng.uniform(40, 90, len(times)).round(2),
+        'G(h)': (dni*cos_zenith + dhi).round(2),
+        'Gb(n)': dni.round(2),
+        'Gd(h)': dhi.round(2),
+        'IR(h)': rng.uniform(200, 300, len(times)).round(2),
+        'WS10m': rng.uniform(0, 10, len(times)).round(2),
+        'WD10m': rng.uniform(0, 360, len(times)).round(2),
+        'SP': rng.uniform(98000, 102000, len(times)).round(0),
+    })
+
+
+def load_tmy():
+    """
+    Loads the TMY fixture as returned by the PVGIS client.
+    """
+    import pandas as pd
+    from FPVsimulation.pvgis import parse_tmy_response
+
+    records = pd.read_csv(tmy_fixture_path, dtype={'time(UTC)': str}).to_dict('records')
+    return parse_tmy_response({'outputs': {'tmy_hourly': records}}, 'PVGIS-SARAH2')
+
+
+def make_weather_cache():
+    """
+    Returns an offline weather cache in a temporary directory holding the TMY fixture.
+    """
+    from FPVsimulation.pvgis import get_default_client
+    from FPVsimulation.weather_cache import WeatherCache
+
+    client = get_default_client()
+    weather_cache = WeatherCache(tempfile.mkdtemp(prefix='fpv_benchmark_'),
+                                 grid_resolution=fixture_grid_resolution, offline=True)
+    weather_cache.put(fixture_latitude, fixture_longitude, client.raddatabases[0], client.usehorizon, load_tmy())
+    return weather_cache
+
+
+def make_weather_store():
+    """
+    Returns a weather store in a temporary directory built from the offline weather cache.
+    """
+    from FPVsimulation.weather_store import WeatherStore
+
+    return WeatherStore.from_weather_cache(os.path.join(tempfile.mkdtemp(prefix='fpv_benchmark_'), 'store'),
+                                           make_weather_cache())
+
+
+def make_lakes_dataframe(n_systems, systems_per_lake=10, n_locations=100, seed=0):
+    """
+    Returns a DataFrame for FPVsimulation.register_lakes with systems around the fixture.
+
+    The systems share n_locations distinct coordinates, like clusters of systems on lakes.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    location = rng.integers(0, n_locations, n_systems)
+    return pd.DataFrame({
+        'lake_id': np.arange(n_systems) // systems_per_lake,
+        'lake_area': 1e6,
+        'latitude': fixture_latitude + 0.01*(location % 10),
+        'longitude': fixture_longitude + 0.01*(location // 10),
+        'selected_area': rng.uniform(1e3, 5e4, n_systems).round(1),
+        'max_power_MW': rng.choice([1.0, 5.0, np.nan], n_systems),
+    })
+
+
+if __name__ == '__main__':
+    os.makedirs(fixture_dir, exist_ok=True)
+    make_synthetic_tmy().to_csv(tmy_fixture_path, index=False)
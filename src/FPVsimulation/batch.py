@@ -0,0 +1,471 @@
+from FPVsimulation.pvmodel import PVmodel, default_PVmodel_parameters
+from FPVsimulation.solar_position import get_solar_position_arrays as get_cached_solar_position_arrays
+from FPVsimulation.soiling_loss_NS3031 import get_default_soiling_lookup
+from FPVsimulation.instrumentation import instrumentation
+import numpy as np
+
+
+def get_solar_position_arrays(times, latitudes, longitudes):
+    """
+    Calculates the solar position of many locations, through the shared solar position cache.
+
+    With the 'meeus' solar position method, the locations are computed at once on arrays,
+    see solar_position.get_solar_position_meeus.
+
+    Parameters
+    ----------
+    times : list of pandas.DatetimeIndex
+        Time index of each location.
+    latitudes : numpy.ndarray
+        Latitude of each location.
+    longitudes : numpy.ndarray
+        Longitude of each location.
+
+    Returns
+    -------
+    dict
+        Arrays of shape hours x locations with the 'zenith', 'apparent_zenith' and 'azimuth'
+        of the sun in degrees.
+    """
+    return get_cached_solar_position_arrays(times, latitudes, longitudes)
+
+
+def get_poa_arrays(weather, solar_position, tilt, azimuth, albedo=0.25):
+    """
+    Calculates the plane of array irradiance with the isotropic sky model.
+
+    Parameters
+    ----------
+    weather : dict
+        Arrays of shape hours x systems with the 'G(h)', 'Gb(n)' and 'Gd(h)' irradiance in W/m^2.
+    solar_position : dict
+        Arrays of shape hours x systems with the 'zenith', 'apparent_zenith' and 'azimuth'
+        of the sun in degrees.
+    tilt : float or numpy.ndarray
+        Tilt of the modules in degrees, per system if an array.
+    azimuth : float or numpy.ndarray
+        Azimuth of the modules in degrees, per system if an array.
+    albedo : float, optional
+        Ground reflectance (default is 0.25).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Plane of array irradiance in W/m^2 and angle of incidence in degrees.
+    """
+    tilt = np.asarray(tilt, dtype=float)
+    azimuth = np.asarray(azimuth, dtype=float)
+    tilt_rad = np.radians(tilt)
+    zenith_rad = np.radians(solar_position['apparent_zenith'])
+
+    # Projection of the beam on the module surface
+    projection = (np.cos(tilt_rad)*np.cos(zenith_rad) +
+                  np.sin(tilt_rad)*np.sin(zenith_rad)*np.cos(np.radians(solar_position['azimuth'] - azimuth)))
+    projection = np.clip(projection, -1, 1)
+    aoi = np.degrees(np.arccos(projection))
+
+    poa_direct = np.maximum(weather['Gb(n)']*projection, 0)
+    poa_sky_diffuse = weather['Gd(h)']*(1 + np.cos(tilt_rad))*0.5
+    poa_ground_diffuse = weather['G(h)']*albedo*(1 - np.cos(tilt_rad))*0.5
+    poa = poa_direct + (poa_sky_diffuse + poa_ground_diffuse)
+
+    # Use GHI as POA when the tilt is zero
+    horizontal = tilt == 0
+    poa = np.where(horizontal, weather['G(h)'], poa)
+    aoi = np.where(horizontal, solar_position['zenith'], aoi)
+    return poa, aoi
+
+
+def get_power_arrays(poa, T2m, aoi, months, monthly_soiling, system_area, max_power_MW,
+                     PVparams=default_PVmodel_parameters, out=None, module_performance=None):
+    """
+    Calculates the module performance, soiling and derate losses and the power output.
+
+    The power output of each system is scaled down if its peak exceeds the maximum power.
+    The hours are always the second to last axis, so the irradiance and the PV model
+    parameters may carry a leading scenario axis, for example scenarios x hours x systems.
+
+    Parameters
+    ----------
+    poa : numpy.ndarray
+        Plane of array irradiance in W/m^2, of shape hours x systems.
+    T2m : numpy.ndarray
+        Ambient temperature in degrees Celsius, of shape hours x systems.
+    aoi : numpy.ndarray
+        Angle of incidence in degrees, of shape hours x systems.
+    months : numpy.ndarray
+        Month of each hour, 1 to 12.
+    monthly_soiling : numpy.ndarray
+        Soiling loss in percentage, of shape 12 x systems.
+    system_area : numpy.ndarray
+        Area of each system.
+    max_power_MW : numpy.ndarray
+        Maximum power output of each system in megawatts, NaN for no limit.
+    PVparams : dict, optional
+        Parameters for the PV model (default is default_PVmodel_parameters).
+    out : dict, optional
+        Buffers for the module performance arrays, see pvmodel.get_module_performance_buffers,
+        reused across calls with the same shape (default is None).
+    module_performance : dict, optional
+        Module performance arrays already calculated with PVmodel.get_module_performance_arrays
+        for these parameters, which are then only read (default is None, calculate them).
+
+    Returns
+    -------
+    dict
+        Hourly arrays with the same names as the columns of PVsystem.get_system_simulation_data,
+        and 'effective_area' with the area of each system after scaling to the maximum power.
+    """
+    if module_performance is None:
+        with instrumentation.stage('pvmodel'):
+            module_performance = PVmodel(PVparams).get_module_performance_arrays(poa, T2m, aoi, out)
+    data = dict(module_performance)
+    with instrumentation.stage('power'):
+        return _get_power(data, poa, months, monthly_soiling, system_area, max_power_MW, PVparams)
+
+
+def _get_power(data, poa, months, monthly_soiling, system_area, max_power_MW, PVparams):
+    """
+    Applies the soiling, derate and maximum power stages to the module performance.
+    """
+    data['s_soiling'] = np.asarray(monthly_soiling, dtype=float)[np.asarray(months) - 1]
+    data['syst_perf'] = ((data['module_efficiency']/100)*
+                         (1 - data['s_soiling']/100)*
+                         PVparams['system_derate_factor'])
+    data['Power_out_W/m2'] = poa*data['syst_perf']
+    data['Power_out_W'] = data['Power_out_W/m2']*np.asarray(system_area, dtype=float)
+
+    # Scale the systems down to the maximum power
+    max_power_W = np.asarray(max_power_MW, dtype=float) * 10**6
+    P_peak = data['Power_out_W'].max(axis=-2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = np.where(P_peak > max_power_W, max_power_W / P_peak, 1.0)
+    data['Power_out_W'] = data['Power_out_W']*scale
+    data['effective_area'] = np.asarray(system_area, dtype=float)*np.squeeze(scale, axis=-2)
+    data['energy_yield_kWh'] = data['Power_out_W']/1_000
+    return data
+
+
+def get_monthly_sum(values, months):
+    """
+    Sums hourly values per month.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Hourly values, of shape hours x systems.
+    months : numpy.ndarray
+        Month of each hour, 1 to 12.
+
+    Returns
+    -------
+    numpy.ndarray
+        Monthly sums, of shape 12 x systems.
+    """
+    months = np.asarray(months)
+    return np.stack([values[months == month].sum(axis=0) for month in range(1, 13)])
+
+
+def get_day_keys(times):
+    """
+    Returns a key identifying the calendar day of each timestamp.
+
+    Parameters
+    ----------
+    times : pandas.DatetimeIndex
+        Timestamps of the hourly values.
+
+    Returns
+    -------
+    numpy.ndarray
+        Day of each timestamp as the integer year*10000 + month*100 + day.
+    """
+    return (times.year.to_numpy(dtype=np.int64)*10000 + times.month.to_numpy(dtype=np.int64)*100
+            + times.day.to_numpy(dtype=np.int64))
+
+
+def get_common_months(times):
+    """
+    Returns the month and day of month of each hour, which must be common to all locations.
+
+    Parameters
+    ----------
+    times : list of pandas.DatetimeIndex
+        Time index of each location, the same index may be repeated.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Month and day of month of each hour.
+
+    Raises
+    ------
+    ValueError
+        If the time indexes do not have the same month and day of month for every hour.
+    """
+    months = times[0].month.to_numpy()
+    days_of_month = times[0].day.to_numpy()
+    for index in {id(index): index for index in times[1:]}.values():
+        if not (np.array_equal(index.month.to_numpy(), months) and
+                np.array_equal(index.day.to_numpy(), days_of_month)):
+            raise ValueError("The weather data of the systems do not have the same months")
+    return months, days_of_month
+
+
+def get_summary_arrays(power_W, months, days):
+    """
+    Reduces hourly power to the annual, monthly and daily summaries in one pass.
+
+    The hours are reduced to daily sums and peaks with a single reduceat per statistic,
+    and the monthly statistics are computed from the daily ones. The hours are always the
+    second to last axis, so power_W may carry leading axes such as scenarios.
+
+    Parameters
+    ----------
+    power_W : numpy.ndarray
+        Hourly power output in Watts, of shape hours x systems.
+    months : numpy.ndarray
+        Month of each hour, 1 to 12.
+    days : numpy.ndarray
+        Day of each hour, see get_day_keys.
+
+    Returns
+    -------
+    dict
+        'annual_energy_yield_kWh' per system, 'monthly_energy_yield_kWh',
+        'monthly_max_energy_yield_kWh', 'monthly_max_power_W' and 'monthly_avg_daily_peak_W'
+        of shape 12 x systems, NaN for the months without data, 'daily_peak_W' of shape
+        days x systems and 'days' with the day of each row of 'daily_peak_W'.
+    """
+    months = np.asarray(months)
+    days = np.asarray(days)
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    if len(np.unique(days)) != len(starts):
+        # Make the hours of each day contiguous
+        order = np.argsort(days, kind='stable')
+        power_W = np.take(power_W, order, axis=-2)
+        months = months[order]
+        days = days[order]
+        starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+
+    daily_energy = np.add.reduceat(power_W, starts, axis=-2) / 1_000
+    daily_peak = np.maximum.reduceat(power_W, starts, axis=-2)
+    day_months = months[starts]
+
+    shape = daily_peak.shape[:-2] + (12,) + daily_peak.shape[-1:]
+    summary = {'monthly_energy_yield_kWh': np.full(shape, np.nan),
+               'monthly_max_power_W': np.full(shape, np.nan),
+               'monthly_avg_daily_peak_W': np.full(shape, np.nan)}
+    for month in np.unique(day_months):
+        selected = day_months == month
+        summary['monthly_energy_yield_kWh'][..., month - 1, :] = daily_energy[..., selected, :].sum(axis=-2)
+        summary['monthly_max_power_W'][..., month - 1, :] = daily_peak[..., selected, :].max(axis=-2)
+        summary['monthly_avg_daily_peak_W'][..., month - 1, :] = daily_peak[..., selected, :].mean(axis=-2)
+    summary['monthly_max_energy_yield_kWh'] = summary['monthly_max_power_W'] / 1_000
+    summary['annual_energy_yield_kWh'] = daily_energy.sum(axis=-2)
+    summary['daily_peak_W'] = daily_peak
+    summary['days'] = days[starts]
+    return summary
+
+
+class PVsystemBatch():
+    """
+    A class to simulate many PV systems at once on arrays of shape hours x systems.
+
+    Attributes
+    ----------
+    systems : list
+        The PVsystem objects simulated together.
+    latitude : numpy.ndarray
+        Latitude of each system.
+    longitude : numpy.ndarray
+        Longitude of each system.
+    system_area : numpy.ndarray
+        Area of each system.
+    max_power_MW : numpy.ndarray
+        Maximum power output of each system in megawatts, NaN for no limit.
+
+    Methods
+    -------
+    get_weather_arrays():
+        Collects the weather data and solar position of all systems.
+    get_monthly_soiling():
+        Looks up the monthly soiling loss of all systems.
+    get_simulation_arrays(PVparams=default_PVmodel_parameters, weather=None):
+        Simulates all systems and returns hourly arrays.
+    get_annual_energy_yield(PVparams=default_PVmodel_parameters, weather=None):
+        Calculates the annual energy yield of all systems.
+    get_monthly_energy_yield(PVparams=default_PVmodel_parameters, weather=None):
+        Calculates the monthly energy yield of all systems.
+    get_energy_summary(PVparams=default_PVmodel_parameters, weather=None):
+        Calculates the annual, monthly and daily peak summaries of all systems.
+    """
+    def __init__(self, systems):
+        """
+        Constructs all the necessary attributes for the PVsystemBatch object.
+
+        Parameters
+        ----------
+        systems : list
+            The PVsystem objects to simulate together.
+        """
+        self.systems = list(systems)
+        self.latitude = np.array([system.latitude for system in self.systems], dtype=float)
+        self.longitude = np.array([system.longitude for system in self.systems], dtype=float)
+        self.system_area = np.array([system.system_area for system in self.systems], dtype=float)
+        self.max_power_MW = np.array([np.nan if system.max_power_MW is None else system.max_power_MW
+                                      for system in self.systems], dtype=float)
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the PVsystemBatch instance.
+        """
+        return f"PVsystemBatch(n_systems={len(self.systems)})"
+
+    def get_weather_arrays(self):
+        """
+        Collects the weather data, solar position and soiling loss of all systems.
+
+        The TMY profiles of all systems must have the same month and day of month for every
+        hour, which holds for PVGIS TMY data. When all systems share a weather store, the
+        weather is gathered directly from its memory-mapped arrays.
+
+        Returns
+        -------
+        dict
+            Arrays of shape hours x systems for the weather and solar position, 'months' and
+            'days' with the month and day of each hour, 'monthly_soiling' of shape 12 x systems
+            and 'raddatabase' with the radiation database of each system.
+        """
+        weather_stores = {id(system.weather_store): system.weather_store for system in self.systems}
+        weather_store = self.systems[0].weather_store if len(weather_stores) == 1 else None
+        if weather_store is not None:
+            # Gather the weather of all systems from the memory-mapped store, without DataFrames
+            with instrumentation.stage('weather'):
+                weather = weather_store.get_weather_arrays(self.latitude, self.longitude)
+            times = weather.pop('times')
+            for system, raddatabase in zip(self.systems, weather['raddatabase']):
+                system.raddatabase = raddatabase
+        else:
+            tmy_dfs = [system.get_tmy_profile() for system in self.systems]
+            times = [tmy_df.index for tmy_df in tmy_dfs]
+            weather = {column: np.column_stack([tmy_df[column].to_numpy(dtype=float) for tmy_df in tmy_dfs])
+                       for column in ('G(h)', 'Gb(n)', 'Gd(h)', 'T2m', 'WS10m')}
+            weather['raddatabase'] = np.array([tmy_df['raddatabase'].iloc[0] for tmy_df in tmy_dfs])
+
+        months, _ = get_common_months(times)
+        weather.update(get_solar_position_arrays(times, self.latitude, self.longitude))
+        weather['months'] = months
+        weather['days'] = get_day_keys(times[0])
+        weather['monthly_soiling'] = self.get_monthly_soiling()
+        return weather
+
+    def get_monthly_soiling(self):
+        """
+        Looks up the monthly soiling loss of all systems, in bulk when they share a soiling table.
+
+        Returns
+        -------
+        numpy.ndarray
+            Soiling loss in percentage, of shape 12 x systems.
+        """
+        soiling_lookups = {id(system.soiling_lookup): system.soiling_lookup for system in self.systems}
+        if len(soiling_lookups) == 1:
+            soiling_lookup = self.systems[0].soiling_lookup
+            if soiling_lookup is None:
+                soiling_lookup = get_default_soiling_lookup()
+            return soiling_lookup.get_soiling(self.latitude, self.longitude).T
+        return np.array([system.get_monthly_soiling_loss() for system in self.systems], dtype=float).T
+
+    def get_simulation_arrays(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Simulates all systems and returns hourly arrays.
+
+        As in PVsystem.get_system_simulation_data, the systems are not modified when their
+        peak power exceeds the maximum power. The scaled area is returned as 'effective_area'.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : dict, optional
+            Weather arrays from get_weather_arrays (default is None, collect them).
+
+        Returns
+        -------
+        dict
+            Arrays of shape hours x systems with the same names as the columns of
+            PVsystem.get_system_simulation_data, and 'effective_area' per system.
+        """
+        if weather is None:
+            weather = self.get_weather_arrays()
+
+        with instrumentation.stage('poa'):
+            poa, aoi = get_poa_arrays(weather, weather, PVparams['tilt'], PVparams['azimuth'])
+        data = {'poa_global_W/m2': poa, 'T2m': weather['T2m'], 'WS10m': weather['WS10m'], 'aoi': aoi}
+        data.update(get_power_arrays(poa, weather['T2m'], aoi, weather['months'], weather['monthly_soiling'],
+                                     self.system_area, self.max_power_MW, PVparams))
+        return data
+
+    def get_annual_energy_yield(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Calculates the annual energy yield of all systems.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : dict, optional
+            Weather arrays from get_weather_arrays (default is None, collect them).
+
+        Returns
+        -------
+        numpy.ndarray
+            Total annual energy yield in kilowatt-hours (kWh) of each system.
+        """
+        return self.get_simulation_arrays(PVparams, weather)['energy_yield_kWh'].sum(axis=0)
+
+    def get_monthly_energy_yield(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Calculates the monthly energy yield of all systems.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : dict, optional
+            Weather arrays from get_weather_arrays (default is None, collect them).
+
+        Returns
+        -------
+        numpy.ndarray
+            Energy yield in kilowatt-hours (kWh), of shape 12 x systems.
+        """
+        if weather is None:
+            weather = self.get_weather_arrays()
+        data = self.get_simulation_arrays(PVparams, weather)
+        return get_monthly_sum(data['energy_yield_kWh'], weather['months'])
+
+    def get_energy_summary(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Calculates the annual, monthly and daily peak summaries of all systems.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : dict, optional
+            Weather arrays from get_weather_arrays (default is None, collect them).
+
+        Returns
+        -------
+        dict
+            Summary arrays as returned by get_summary_arrays, and 'effective_area' per system.
+        """
+        if weather is None:
+            weather = self.get_weather_arrays()
+        data = self.get_simulation_arrays(PVparams, weather)
+        with instrumentation.stage('aggregation'):
+            summary = get_summary_arrays(data['Power_out_W'], weather['months'], weather['days'])
+        summary['effective_area'] = data['effective_area']
+        return summary
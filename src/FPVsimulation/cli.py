@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import sys
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.solar_position import solar_position_methods, set_solar_position_method
+from FPVsimulation.instrumentation import instrumentation, print_report
+from FPVsimulation.lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+
+def main(argv=None):
+    """
+    Runs the fpvsim command line interface.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments (default is None, the arguments of the process).
+
+    Returns
+    -------
+    int
+        Exit status of the command.
+    """
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'run', None) is None:
+        parser.print_help()
+        return 2
+    if args.profile:
+        instrumentation.enable()
+    try:
+        status = args.run(args)
+    except (KeyError, LookupError, ValueError, OSError) as error:
+        print(f"fpvsim {args.command}: error: {error}", file=sys.stderr)
+        return 1
+    if args.profile:
+        print_report()
+    return status
+
+
+def _get_parser():
+    """
+    Builds the argument parser of the command line interface.
+    """
+    parser = argparse.ArgumentParser(prog='fpvsim', description='Simulate floating PV systems on lakes.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    scenarios = subparsers.add_parser(
+        'scenarios', help='simulate several scenario CSV files, sharing the work across their locations',
+        description='Simulate the systems of several scenario CSV files of the area selection, computing the '
+                    'weather, solar position and yield per square meter once per unique location, and write '
+                    'one result table per scenario.')
+    scenarios.add_argument('inputs', nargs='+', help='scenario CSV files, named after their scenario')
+    scenarios.add_argument('-o', '--output-dir', default='.', help='directory of the result tables (default: .)')
+    scenarios.add_argument('--format', choices=('csv', 'parquet', 'xlsx'), default='csv',
+                           help='format of the result tables (default: csv)')
+    _add_input_arguments(scenarios)
+    scenarios.set_defaults(run=_run_scenarios)
+
+    shard = subparsers.add_parser(
+        'shard', help='split the simulation of a lakes CSV file into shards run on several nodes',
+        description='Split the simulation of the lakes of a CSV file into shards by a hash of their lake_id. '
+                    'Create a manifest on a shared filesystem, run the shards on any number of nodes, each '
+                    'writing a partial result file, and merge the checked partial results.')
+    shard_commands = shard.add_subparsers(dest='shard_command')
+    create = shard_commands.add_parser('create', help='write a shard manifest')
+    create.add_argument('lakes', help='CSV file of the lakes, with the columns of FPVsimulation.register_lakes')
+    create.add_argument('-n', '--shards', type=int, required=True, help='number of shards')
+    create.add_argument('-o', '--output-dir', default='.',
+                        help='directory of the manifest and the partial results (default: .)')
+    create.add_argument('--batch-size', type=int, default=100,
+                        help='number of lakes written to a partial result file at a time (default: 100)')
+    _add_input_arguments(create)
+    create.set_defaults(run=_run_shard_create)
+    run = shard_commands.add_parser('run', help='run shards of a manifest on this node')
+    run.add_argument('manifest', help='shard manifest file')
+    run.add_argument('--shard', type=int, action='append',
+                     help='shard to run, resuming it if it was interrupted, repeatable (default: claim shards '
+                          'until none is left)')
+    run.add_argument('--nodes', type=int, default=1,
+                     help='number of local processes claiming shards, each acting as a node (default: 1)')
+    run.add_argument('--workers', type=int, default=1, help='number of worker processes per node (default: 1)')
+    run.add_argument('--profile', action='store_true', help='print the timing of the pipeline stages')
+    run.set_defaults(run=_run_shard_run)
+    status = shard_commands.add_parser('status', help='print the state of the shards of a manifest')
+    status.add_argument('manifest', help='shard manifest file')
+    status.set_defaults(run=_run_shard_status)
+    merge = shard_commands.add_parser('merge', help='check and combine the partial results of all shards')
+    merge.add_argument('manifest', help='shard manifest file')
+    merge.add_argument('-o', '--output', required=True, help='result file, .csv, .parquet or .xlsx')
+    merge.set_defaults(run=_run_shard_merge)
+    parser.set_defaults(profile=False)
+    return parser
+
+
+def _add_input_arguments(parser):
+    """
+    Adds the arguments selecting the weather data and the PV model parameters.
+    """
+    parser.add_argument('--weather-cache', help='directory of the persistent TMY cache')
+    parser.add_argument('--weather-store', help='directory of a memory-mapped weather store')
+    parser.add_argument('--offline', action='store_true',
+                        help='never download missing TMY data, fail on a weather cache miss instead')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='PV model parameter, for example --param tilt=15, repeatable')
+    parser.add_argument('--solar-position', choices=solar_position_methods, default='spa',
+                        help='solar position algorithm, the SPA of pvlib or the vectorized Meeus algorithm, '
+                             'within 0.01 degrees of the SPA (default: spa)')
+    parser.add_argument('--profile', action='store_true', help='print the timing of the pipeline stages')
+
+
+def _get_inputs(args):
+    """
+    Returns the PV model parameters, weather cache and weather store selected by the arguments.
+    """
+    from FPVsimulation.weather_cache import WeatherCache
+    from FPVsimulation.weather_store import WeatherStore
+
+    PVparams = _get_PVparams(args)
+    weather_cache = None
+    if args.weather_cache is not None:
+        weather_cache = WeatherCache(args.weather_cache, offline=args.offline)
+    elif args.offline and args.weather_store is None:
+        raise ValueError("--offline needs a weather cache or a weather store")
+    weather_store = None if args.weather_store is None else WeatherStore(args.weather_store)
+    set_solar_position_method(args.solar_position)
+    return PVparams, weather_cache, weather_store
+
+
+def _get_PVparams(args):
+    """
+    Returns the PV model parameters selected by the arguments.
+    """
+    PVparams = dict(default_PVmodel_parameters)
+    for param in args.param:
+        name, separator, value = param.partition('=')
+        if not separator or name not in PVparams:
+            raise ValueError(f"Invalid PV model parameter: {param}")
+        PVparams[name] = json.loads(value)
+    return PVparams
+
+
+def _write_table(result_df, path):
+    """
+    Writes a result table in the format given by the extension of its path.
+    """
+    extension = os.path.splitext(path)[1]
+    if extension == '.parquet':
+        result_df.to_parquet(path, index=False)
+    elif extension == '.xlsx':
+        result_df.to_excel(path, index=False)
+    else:
+        result_df.to_csv(path, index=False)
+
+
+def _run_scenarios(args):
+    """
+    Runs the scenarios command.
+    """
+    from FPVsimulation.scenarios import get_scenario_energy_yield
+
+    PVparams, weather_cache, weather_store = _get_inputs(args)
+    scenarios = {}
+    for path in args.inputs:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in scenarios:
+            raise ValueError(f"Two scenario files are named {name}")
+        scenarios[name] = pd.read_csv(path)
+
+    result_dfs = get_scenario_energy_yield(scenarios, PVparams, weather_cache, None, weather_store)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, result_df in result_dfs.items():
+        path = os.path.join(args.output_dir, f"{name}_annual_energy_yield.{args.format}")
+        _write_table(result_df, path)
+        print(f"{name}: {len(result_df)} systems, {result_df['annual_energy_yield_kWh'].sum()/10**6:.1f} GWh -> {path}")
+    return 0
+
+
+def _run_shard_create(args):
+    """
+    Runs the shard create command.
+    """
+    from FPVsimulation.sharding import ShardManifest
+
+    if args.offline and args.weather_cache is None and args.weather_store is None:
+        raise ValueError("--offline needs a weather cache or a weather store")
+    path = os.path.join(args.output_dir, 'manifest.json')
+    manifest = ShardManifest.create(path, args.lakes, args.shards, _get_PVparams(args), args.weather_cache,
+                                    args.weather_store, args.offline, args.batch_size, args.solar_position)
+    print(f"{manifest.n_shards} shards -> {path}")
+    return 0
+
+
+def _run_shard_run(args):
+    """
+    Runs the shard run command.
+    """
+    from FPVsimulation.sharding import ShardManifest, run_local
+
+    manifest = ShardManifest(args.manifest)
+    if args.shard is not None:
+        for shard in args.shard:
+            if not 0 <= shard < manifest.n_shards:
+                raise ValueError(f"The shard must be between 0 and {manifest.n_shards - 1}, not {shard}")
+            n_systems = manifest.run_shard(shard, args.workers)
+            print(f"shard {shard}: {n_systems} systems -> {manifest.get_partial_path(shard)}")
+    elif args.nodes > 1:
+        for node, shards in enumerate(run_local(args.manifest, args.nodes, args.workers)):
+            print(f"node {node}: shards {shards}")
+    else:
+        print(f"shards {manifest.run_node(args.workers)}")
+    return 0
+
+
+def _run_shard_status(args):
+    """
+    Runs the shard status command.
+    """
+    from FPVsimulation.sharding import ShardManifest
+
+    status = ShardManifest(args.manifest).get_status()
+    for state in ('done', 'claimed', 'pending'):
+        shards = [shard for shard, shard_state in enumerate(status) if shard_state == state]
+        print(f"{state}: {len(shards)} {shards}")
+    return 0 if all(state == 'done' for state in status) else 3
+
+
+def _run_shard_merge(args):
+    """
+    Runs the shard merge command.
+    """
+    from FPVsimulation.sharding import ShardManifest
+
+    result_df = ShardManifest(args.manifest).merge()
+    _write_table(result_df, args.output)
+    print(f"{len(result_df)} systems, {result_df['annual_energy_yield_kWh'].sum()/10**6:.1f} GWh -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+from FPVsimulation.lazy import lazy_import
+from FPVsimulation.soiling_loss_NS3031 import _to_unit_vectors
+import numpy as np
+
+scipy_spatial = lazy_import('scipy.spatial')
+
+# Mean radius of the Earth in kilometers
+earth_radius_km = 6371.0088
+
+
+def get_distance_km(latitudes1, longitudes1, latitudes2, longitudes2):
+    """
+    Returns the great-circle distance between pairs of coordinates.
+
+    Parameters
+    ----------
+    latitudes1, longitudes1 : array-like
+        Coordinates of the first points in degrees.
+    latitudes2, longitudes2 : array-like
+        Coordinates of the second points in degrees.
+
+    Returns
+    -------
+    numpy.ndarray
+        Distance of each pair in kilometers.
+    """
+    chord = np.linalg.norm(_to_unit_vectors(latitudes1, longitudes1) - _to_unit_vectors(latitudes2, longitudes2), axis=1)
+    return 2*earth_radius_km*np.arcsin(np.clip(chord/2, 0, 1))
+
+
+def cluster_systems(latitudes, longitudes, grid_resolution=None, tolerance_km=None):
+    """
+    Groups nearby systems into clusters sharing one weather location.
+
+    With a grid resolution, the systems are snapped to a regular grid in degrees and every
+    grid point is a cluster. With a tolerance, the systems are clustered greedily in order:
+    the first system not yet in a cluster becomes the center of a new cluster holding every
+    remaining system within the tolerance, so no system is farther than the tolerance from
+    its cluster center.
+
+    Parameters
+    ----------
+    latitudes : array-like
+        Latitude of each system.
+    longitudes : array-like
+        Longitude of each system.
+    grid_resolution : float, optional
+        Size of the grid cells in degrees.
+    tolerance_km : float, optional
+        Maximum great-circle distance in kilometers between a system and its cluster center.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Cluster of each system, and the latitude and longitude of each cluster center.
+
+    Raises
+    ------
+    ValueError
+        If not exactly one of grid_resolution and tolerance_km is given.
+    """
+    if (grid_resolution is None) == (tolerance_km is None):
+        raise ValueError("Give exactly one of grid_resolution and tolerance_km")
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+
+    if grid_resolution is not None:
+        cells = np.column_stack([np.round(latitudes / grid_resolution), np.round(longitudes / grid_resolution)])
+        cells, clusters = np.unique(cells.astype(np.int64), axis=0, return_inverse=True)
+        return (clusters.reshape(-1), np.round(cells[:, 0]*grid_resolution, 6),
+                np.round(cells[:, 1]*grid_resolution, 6))
+
+    points = _to_unit_vectors(latitudes, longitudes)
+    tree = scipy_spatial.cKDTree(points)
+    radius = 2*np.sin(tolerance_km / (2*earth_radius_km))
+    clusters = np.full(len(points), -1, dtype=np.int64)
+    centers = []
+    for i in range(len(points)):
+        if clusters[i] >= 0:
+            continue
+        members = np.asarray(tree.query_ball_point(points[i], radius), dtype=np.int64)
+        members = members[clusters[members] < 0]
+        clusters[members] = len(centers)
+        centers.append(i)
+    centers = np.asarray(centers, dtype=np.int64)
+    return clusters, latitudes[centers], longitudes[centers]
@@ -0,0 +1,210 @@
+import threading
+import time
+
+
+class _NullStage():
+    """
+    Context manager doing nothing, returned by stage() while instrumentation is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+class _Stage():
+    """
+    Context manager timing one pass through a stage.
+    """
+    __slots__ = ('_instrumentation', '_name', '_start')
+
+    def __init__(self, instrumentation, name):
+        self._instrumentation = instrumentation
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._instrumentation.add_time(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class Instrumentation():
+    """
+    A class to record the wall time and call count of the pipeline stages, and counters
+    such as cache hits and downloaded bytes.
+
+    The pipeline reports to the shared instance `instrumentation` of this module, which is
+    disabled by default. While disabled, stage() returns a shared context manager doing
+    nothing and count() returns at once, so the hooks cost well below a microsecond.
+
+    Stages may be nested, for example 'pvmodel' runs inside 'lake', so the times of nested
+    stages are included in the time of the enclosing stage. With several worker processes,
+    only the stages run in the main process are recorded.
+
+    Attributes
+    ----------
+    enabled : bool
+        True if the stages and counters are recorded.
+    callback : callable or None
+        Function called with an event dictionary after every stage and counter update.
+
+    Methods
+    -------
+    enable(callback=None):
+        Starts recording.
+    disable():
+        Stops recording.
+    stage(name):
+        Returns a context manager recording the time spent in a stage.
+    add_time(name, elapsed_s):
+        Records one pass through a stage.
+    count(name, value=1):
+        Adds to a counter.
+    report():
+        Returns the recorded totals.
+    reset():
+        Clears the recorded totals.
+    """
+    def __init__(self):
+        """
+        Constructs a disabled Instrumentation with no recorded totals.
+        """
+        self.enabled = False
+        self.callback = None
+        self.__stages = {}
+        self.__counters = {}
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the Instrumentation instance.
+        """
+        return f"Instrumentation(enabled={self.enabled}, stages={len(self.__stages)}, counters={len(self.__counters)})"
+
+    def enable(self, callback=None):
+        """
+        Starts recording.
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Function called with an event dictionary after every stage, with the keys 'type'
+            ('stage'), 'name' and 'elapsed_s', and after every counter update, with the keys
+            'type' ('counter'), 'name' and 'value' (default is None).
+        """
+        self.callback = callback
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stops recording, keeping the recorded totals.
+        """
+        self.enabled = False
+
+    def stage(self, name):
+        """
+        Returns a context manager recording the time spent in a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, for example 'solar_position'.
+
+        Returns
+        -------
+        context manager
+            Records the wall time of the with block when the instrumentation is enabled.
+        """
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name)
+
+    def add_time(self, name, elapsed_s):
+        """
+        Records one pass through a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        elapsed_s : float
+            Wall time of the pass in seconds.
+        """
+        with self.__lock:
+            stage = self.__stages.get(name)
+            if stage is None:
+                stage = self.__stages[name] = [0, 0.0]
+            stage[0] += 1
+            stage[1] += elapsed_s
+        if self.callback is not None:
+            self.callback({'type': 'stage', 'name': name, 'elapsed_s': elapsed_s})
+
+    def count(self, name, value=1):
+        """
+        Adds to a counter, if the instrumentation is enabled.
+
+        Parameters
+        ----------
+        name : str
+            Name of the counter, for example 'weather_cache_hits'.
+        value : int or float, optional
+            Amount to add (default is 1).
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+        if self.callback is not None:
+            self.callback({'type': 'counter', 'name': name, 'value': value})
+
+    def report(self):
+        """
+        Returns the recorded totals.
+
+        Returns
+        -------
+        dict
+            'stages' maps each stage to a dictionary with its 'calls', 'total_s' and 'mean_s',
+            and 'counters' maps each counter to its total.
+        """
+        with self.__lock:
+            stages = {name: {'calls': calls, 'total_s': total_s, 'mean_s': total_s / calls}
+                      for name, (calls, total_s) in self.__stages.items()}
+            counters = dict(self.__counters)
+        return {'stages': stages, 'counters': counters}
+
+    def reset(self):
+        """
+        Clears the recorded totals.
+        """
+        with self.__lock:
+            self.__stages.clear()
+            self.__counters.clear()
+
+
+# Instrumentation shared by the whole pipeline
+instrumentation = Instrumentation()
+
+
+def print_report(report=None):
+    """
+    Prints the stages and counters of a report.
+
+    Parameters
+    ----------
+    report : dict, optional
+        Report from Instrumentation.report (default is None, the report of the shared instance).
+    """
+    if report is None:
+        report = instrumentation.report()
+    for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['total_s']):
+        print(f"{name:<20} {stage['calls']:>10} calls {stage['total_s']:>10.3f} s {1e3*stage['mean_s']:>10.3f} ms/call")
+    for name, value in sorted(report['counters'].items()):
+        print(f"{name:<20} {value:>10}")
@@ -1,18 +1,25 @@
 from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.registry import SystemRegistry
+from FPVsimulation.instrumentation import instrumentation
 import numpy as np
 
 class Lake():
     """
     A class used to represent a Lake with an array of PV systems.
 
+    A Lake is a lightweight view of one row of a SystemRegistry. A Lake created directly
+    holds its own registry, while the lakes of an FPVsimulation share the registry of the
+    simulation.
+
     Attributes
     ----------
     lake_id : str
         Identifier for the lake.
     lake_area : float
         Area of the lake in square kilometers.
-    systems : list
-        List of PV systems installed on the lake.
+    systems : tuple
+        Read-only tuple of the PV systems installed on the lake, as views of the registry,
+        built on each access. Systems are added with register_pvsystem.
     covered_area : float
         Total area covered by the PV systems on the lake.
 
@@ -22,11 +29,14 @@ class Lake():
         Returns a string representation of the lake details.
     __repr__():
         Returns a formal string representation of the Lake instance.
-    register_pvsystem(latitude, longitude, system_area, max_power_MW):
+    register_pvsystem(latitude, longitude, system_area, max_power_MW, weather_cache=None, soiling_lookup=None,
+                      weather_store=None):
         Registers a new PV system on the lake.
     get_annual_energy_yield(PVparams):
         Calculates the annual energy yield for all PV systems on the lake.
     """
+    __slots__ = ('_registry', '_index')
+
     def __init__(self, lake_id, lake_area):
         """
         Constructs all the necessary attributes for the Lake object.
@@ -38,10 +48,56 @@ class Lake():
         lake_area : float
             Area of the lake in square kilometers.
         """
-        self.lake_id = lake_id
-        self.lake_area = lake_area
-        self.systems = []
-        self.covered_area = 0
+        registry = SystemRegistry()
+        self._registry = registry
+        self._index = registry.add_lake(lake_id, lake_area)
+
+    @classmethod
+    def from_registry(cls, registry, index):
+        """
+        Returns the view of a lake of a registry.
+
+        Parameters
+        ----------
+        registry : SystemRegistry
+            Registry holding the lake.
+        index : int
+            Row of the lake in the registry.
+
+        Returns
+        -------
+        Lake
+            View of the lake.
+        """
+        lake = cls.__new__(cls)
+        lake._registry = registry
+        lake._index = index
+        return lake
+
+    def __reduce__(self):
+        # Pickle a copy of this lake only, not the whole registry
+        return (Lake.from_registry, (self._registry.subset([self._index]), 0))
+
+    @property
+    def lake_id(self):
+        return self._registry.get_lake_column('lake_id')[self._index]
+
+    @property
+    def lake_area(self):
+        return self._registry.get_lake_column('lake_area')[self._index]
+
+    @property
+    def covered_area(self):
+        return self._registry.get_lake_column('covered_area')[self._index]
+
+    @covered_area.setter
+    def covered_area(self, value):
+        self._registry.get_lake_column('covered_area')[self._index] = value
+
+    @property
+    def systems(self):
+        return tuple(PVsystem.from_registry(self._registry, index)
+                     for index in self._registry.get_lake_systems(self._index))
     
     def __str__(self):
         """
@@ -71,7 +127,8 @@ class Lake():
         """
         return f"Lake(lake_id={self.lake_id}, lake_area={self.lake_area})"
 
-    def register_pvsystem(self, latitude, longitude, system_area, max_power_MW):
+    def register_pvsystem(self, latitude, longitude, system_area, max_power_MW, weather_cache=None,
+                          soiling_lookup=None, weather_store=None):
         """
         Registers a new PV system on the lake.
 
@@ -85,11 +142,15 @@ class Lake():
             Area covered by the PV system in square kilometers.
         max_power_MW : float
             Maximum power output of the PV system in megawatts.
+        weather_cache : WeatherCache, optional
+            Persistent cache for the TMY data (default is None).
+        soiling_lookup : SoilingLookup, optional
+            Soiling table of the system (default is None, use the built-in NS3031 table).
+        weather_store : WeatherStore, optional
+            Memory-mapped store of the TMY data (default is None).
         """
-        system_area = system_area
-        pv_system = PVsystem(latitude, longitude, system_area, max_power_MW)
-        self.systems.append(pv_system)
-        self.covered_area+=system_area
+        self._registry.add_system(self._index, latitude, longitude, system_area, max_power_MW,
+                                  weather_cache, soiling_lookup, weather_store)
     
     def get_annual_energy_yield(self, PVparams):
         """
@@ -104,20 +165,26 @@ class Lake():
         -------
         list
             List of dictionaries containing lake_id, lake_area, system_area, latitude, longitude, 
-            annual energy yield, and radiation data for each PV system.
+            annual energy yield, radiation data, the area after scaling to the maximum power
+            and whether the system was scaled for each PV system.
         """
         data = []
-        for system in self.systems:
-            system_data = {
-                'lake_id': self.lake_id,
-                'lake_area': self.lake_area,
-                'system_area': system.system_area,
-                'latitude': system.latitude,
-                'longitude': system.longitude, 
-                'annual_energy_yield_kWh': system.get_annual_energy_yield(PVparams),
-                'raddata': system.raddatabase
-            }
-            data.append(system_data)
+        with instrumentation.stage('lake'):
+            for system in self.systems:
+                results = system.get_annual_results(PVparams)
+                system_data = {
+                    'lake_id': self.lake_id,
+                    'lake_area': self.lake_area,
+                    'system_area': system.system_area,
+                    'latitude': system.latitude,
+                    'longitude': system.longitude, 
+                    'annual_energy_yield_kWh': results['annual_energy_yield_kWh'],
+                    'raddata': system.raddatabase,
+                    'effective_area': results['effective_area'],
+                    'clipped': results['clipped']
+                }
+                data.append(system_data)
+        instrumentation.count('systems', len(data))
         return data
 
 
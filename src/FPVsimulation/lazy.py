@@ -0,0 +1,39 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Imports a module lazily, executing it on first attribute access.
+
+    The heavy dependencies of the package (pandas, pvlib, requests, scipy and geopandas)
+    are imported with this function, so importing FPVsimulation only loads the modules
+    that a run actually uses.
+
+    Parameters
+    ----------
+    name : str
+        Full name of the module, for example 'pvlib'.
+
+    Returns
+    -------
+    module
+        The module, loaded when one of its attributes is first accessed. A module that
+        is already imported is returned as is.
+
+    Raises
+    ------
+    ModuleNotFoundError
+        If the module is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,450 @@
+import gzip
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
+
+tmy_api_url = 'https://re.jrc.ec.europa.eu/api/v5_2/tmy?'
+series_api_url = 'https://re.jrc.ec.europa.eu/api/v5_2/seriescalc?'
+
+# Status codes worth retrying against the same database, other errors fall back to the next database
+retry_status_codes = (429, 500, 502, 503, 504)
+
+
+def parse_tmy_response(payload, raddatabase):
+    """
+    Converts a PVGIS TMY json response to a DataFrame.
+
+    Parameters
+    ----------
+    payload : dict
+        Decoded json response from the PVGIS TMY API.
+    raddatabase : str
+        Radiation database the data was retrieved from.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame containing TMY data indexed by 'time(UTC)', with a 'raddatabase' column.
+    """
+    tmy_df = pd.DataFrame(payload['outputs']['tmy_hourly'])
+    tmy_df['raddatabase'] = raddatabase
+    tmy_df['time(UTC)'] = pd.to_datetime(tmy_df['time(UTC)'], format='%Y%m%d:%H%M')
+    return tmy_df.set_index('time(UTC)')
+
+
+def parse_series_response(payload, raddatabase):
+    """
+    Converts a PVGIS seriescalc json response to a DataFrame with the columns of a TMY.
+
+    The response must hold the irradiance components on a horizontal plane, as requested by
+    PVGISclient.get_hourly_series. The direct normal irradiance is recovered from the direct
+    horizontal irradiance and the sun height.
+
+    Parameters
+    ----------
+    payload : dict
+        Decoded json response from the PVGIS seriescalc API with components=1 and angle=0.
+    raddatabase : str
+        Radiation database the data was retrieved from.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame indexed by 'time(UTC)' with the columns 'G(h)', 'Gb(n)', 'Gd(h)', 'T2m',
+        'WS10m' and 'raddatabase'.
+    """
+    hourly_df = pd.DataFrame(payload['outputs']['hourly'])
+    sin_sun_height = np.sin(np.radians(hourly_df['H_sun'].to_numpy(dtype=float)))
+    beam_horizontal = hourly_df['Gb(i)'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beam_normal = np.where(sin_sun_height > 0, beam_horizontal / sin_sun_height, 0.0)
+    series_df = pd.DataFrame({'G(h)': beam_horizontal + hourly_df['Gd(i)'].to_numpy(dtype=float)
+                                      + hourly_df['Gr(i)'].to_numpy(dtype=float),
+                              'Gb(n)': beam_normal,
+                              'Gd(h)': hourly_df['Gd(i)'].to_numpy(dtype=float),
+                              'T2m': hourly_df['T2m'].to_numpy(dtype=float),
+                              'WS10m': hourly_df['WS10m'].to_numpy(dtype=float),
+                              'raddatabase': raddatabase},
+                             index=pd.DatetimeIndex(pd.to_datetime(hourly_df['time'], format='%Y%m%d:%H%M'),
+                                                    name='time(UTC)'))
+    return series_df
+
+
+def _read_pvgis_file(path, time_column, hourly_key):
+    """
+    Reads a file downloaded from PVGIS in json or csv format, optionally gzipped.
+
+    Returns
+    -------
+    tuple
+        Latitude, longitude, radiation database or None if the file does not record it,
+        and the payload in the format of the json response.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as file:
+        if name.endswith('.json'):
+            payload = json.load(file)
+            location = payload['inputs']['location']
+            raddatabase = payload['inputs'].get('meteo_data', {}).get('radiation_db')
+            return float(location['latitude']), float(location['longitude']), raddatabase, payload
+        if not name.endswith('.csv'):
+            raise ValueError(f"Unknown PVGIS file format: {path}")
+        lines = file.read().splitlines()
+
+    # The header lines hold the coordinates, for example 'Latitude (decimal degrees): 45.000'
+    start = next((i for i, line in enumerate(lines) if line.startswith(time_column + ',')), None)
+    header = {line.split(':')[0].split('(')[0].strip(): line.split(':', 1)[1].strip(' ,\t')
+              for line in lines[:start] if ':' in line}
+    if start is None or 'Latitude' not in header or 'Longitude' not in header:
+        raise ValueError(f"Not a PVGIS csv file with a {time_column} column: {path}")
+    columns = [column.strip() for column in lines[start].split(',')]
+    records = []
+    # The hourly rows run until the descriptions of the variables at the end of the file
+    for line in lines[start + 1:]:
+        if not line[:1].isdigit():
+            break
+        values = line.split(',')
+        records.append({time_column: values[0], **{column: float(value)
+                                                   for column, value in zip(columns[1:], values[1:])}})
+    return (float(header['Latitude']), float(header['Longitude']), header.get('Radiation database'),
+            {'outputs': {hourly_key: records}})
+
+
+def read_tmy_file(path, raddatabase=None):
+    """
+    Reads a TMY file downloaded from PVGIS, in json or csv format, optionally gzipped.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file, ending in '.json', '.csv', '.json.gz' or '.csv.gz'.
+    raddatabase : str, optional
+        Radiation database of the data (default is None, read from the file, or the first
+        database of the default client if the file does not record it).
+
+    Returns
+    -------
+    tuple
+        Latitude and longitude of the location, and the TMY data as returned by
+        parse_tmy_response.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a PVGIS TMY file in json or csv format.
+    """
+    latitude, longitude, file_raddatabase, payload = _read_pvgis_file(path, 'time(UTC)', 'tmy_hourly')
+    raddatabase = raddatabase or file_raddatabase or get_default_client().raddatabases[0]
+    return latitude, longitude, parse_tmy_response(payload, raddatabase)
+
+
+def read_series_file(path, raddatabase=None):
+    """
+    Reads an hourly series downloaded from the PVGIS seriescalc API, in json or csv format,
+    optionally gzipped.
+
+    The series must hold the irradiance components on a horizontal plane, requested with
+    components=1 and angle=0.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file, ending in '.json', '.csv', '.json.gz' or '.csv.gz'.
+    raddatabase : str, optional
+        Radiation database of the data (default is None, read from the file, or the first
+        database of the default client if the file does not record it).
+
+    Returns
+    -------
+    tuple
+        Latitude and longitude of the location, and the hourly series as returned by
+        parse_series_response.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a PVGIS seriescalc file in json or csv format.
+    """
+    latitude, longitude, file_raddatabase, payload = _read_pvgis_file(path, 'time', 'hourly')
+    raddatabase = raddatabase or file_raddatabase or get_default_client().raddatabases[0]
+    return latitude, longitude, parse_series_response(payload, raddatabase)
+
+
+class PVGISclient():
+    """
+    A class to retrieve TMY data from the PVGIS API over pooled HTTP connections.
+
+    Requests are rate limited and retried with exponential backoff on connection errors
+    and transient server errors. If a radiation database does not cover a location, the
+    request falls back to the next database in `raddatabases`.
+
+    Attributes
+    ----------
+    api_url : str
+        URL of the TMY endpoint, can point to a local stand-in server.
+    series_api_url : str
+        URL of the hourly series endpoint, can point to a local stand-in server.
+    raddatabases : tuple
+        Radiation databases to try, in order of preference.
+    usehorizon : int
+        1 if the horizon is taken into account, otherwise 0.
+    max_workers : int
+        Maximum number of concurrent requests.
+    rate_limit : float or None
+        Maximum number of requests per second, None for no limit.
+    max_retries : int
+        Number of retries of a failed request before giving up on a database.
+    backoff_factor : float
+        Delay in seconds before the first retry, doubled for each following retry.
+    timeout : float
+        Timeout of a single request in seconds.
+    bytes_downloaded : int
+        Total number of bytes downloaded by the client.
+
+    Methods
+    -------
+    get_tmy(latitude, longitude):
+        Retrieves the TMY data for one location.
+    get_tmy_many(locations):
+        Retrieves the TMY data for many locations concurrently.
+    get_hourly_series(latitude, longitude, startyear=2005, endyear=2020):
+        Retrieves the multi-year hourly series for one location.
+    """
+    def __init__(self, api_url=tmy_api_url, raddatabases=('PVGIS-SARAH2', 'PVGIS-ERA5'), usehorizon=1,
+                 max_workers=8, rate_limit=None, max_retries=3, backoff_factor=1.0, timeout=60,
+                 series_api_url=series_api_url):
+        """
+        Constructs all the necessary attributes for the PVGISclient object.
+
+        Parameters
+        ----------
+        api_url : str, optional
+            URL of the TMY endpoint (default is the PVGIS 5.2 TMY API).
+        raddatabases : tuple, optional
+            Radiation databases to try, in order of preference (default is SARAH2, then ERA5).
+        usehorizon : int, optional
+            1 if the horizon is taken into account, otherwise 0 (default is 1).
+        max_workers : int, optional
+            Maximum number of concurrent requests and pooled connections (default is 8).
+        rate_limit : float, optional
+            Maximum number of requests per second (default is None, no limit).
+        max_retries : int, optional
+            Number of retries of a failed request (default is 3).
+        backoff_factor : float, optional
+            Delay in seconds before the first retry (default is 1.0).
+        timeout : float, optional
+            Timeout of a single request in seconds (default is 60).
+        series_api_url : str, optional
+            URL of the hourly series endpoint (default is the PVGIS 5.2 seriescalc API).
+        """
+        self.api_url = api_url
+        self.series_api_url = series_api_url
+        self.raddatabases = tuple(raddatabases)
+        self.usehorizon = usehorizon
+        self.max_workers = max_workers
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.bytes_downloaded = 0
+
+        self.__lock = threading.Lock()
+        self.__next_request_time = 0.0
+        self.__session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the PVGISclient instance.
+        """
+        return (f"PVGISclient(api_url={self.api_url!r}, raddatabases={self.raddatabases}, "
+                f"max_workers={self.max_workers}, rate_limit={self.rate_limit})")
+
+    def __reduce__(self):
+        # Worker processes get a client with the same settings and their own connection pool
+        return (PVGISclient, (self.api_url, self.raddatabases, self.usehorizon, self.max_workers, self.rate_limit,
+                              self.max_retries, self.backoff_factor, self.timeout, self.series_api_url))
+
+    def __wait_for_rate_limit(self):
+        """
+        Blocks until the next request is allowed by the rate limit.
+        """
+        if not self.rate_limit:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            request_time = max(now, self.__next_request_time)
+            self.__next_request_time = request_time + 1 / self.rate_limit
+        if request_time > now:
+            time.sleep(request_time - now)
+
+    def __request(self, url, params):
+        """
+        Sends one request, retrying connection errors and transient server errors.
+
+        Returns
+        -------
+        requests.Response
+            The last response received.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.__wait_for_rate_limit()
+            try:
+                with instrumentation.stage('http_fetch'):
+                    response = self.__session.get(url, params=params, timeout=self.timeout)
+                instrumentation.count('http_requests')
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                with self.__lock:
+                    self.bytes_downloaded += len(response.content)
+                instrumentation.count('bytes_downloaded', len(response.content))
+                if response.status_code not in retry_status_codes or attempt == self.max_retries:
+                    return response
+            time.sleep(self.backoff_factor * 2**attempt)
+
+    def get_tmy(self, latitude, longitude):
+        """
+        Retrieves the TMY data for one location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame containing TMY data indexed by 'time(UTC)', with a 'raddatabase'
+            column holding the database the data was retrieved from.
+
+        Raises
+        ------
+        requests.HTTPError
+            If none of the radiation databases returned data for the location.
+        """
+        for raddatabase in self.raddatabases:
+            params = {'lat': latitude,
+                      'lon': longitude,
+                      'usehorizon': self.usehorizon,
+                      'raddatabase': raddatabase,
+                      'outputformat': 'json'}
+            response = self.__request(self.api_url, params)
+            if response.status_code == 200:
+                return parse_tmy_response(response.json(), raddatabase)
+
+        raise requests.HTTPError(f"Error: {response.status_code}, {response.text}", response=response)
+
+    def get_hourly_series(self, latitude, longitude, startyear=2005, endyear=2020):
+        """
+        Retrieves the multi-year hourly series for one location.
+
+        The irradiance components are requested on a horizontal plane and converted to the
+        columns of a TMY, so the series can be simulated like a TMY profile.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        startyear : int, optional
+            First year of the series (default is 2005).
+        endyear : int, optional
+            Last year of the series (default is 2020).
+
+        Returns
+        -------
+        pandas.DataFrame
+            Hourly series as returned by parse_series_response.
+
+        Raises
+        ------
+        requests.HTTPError
+            If none of the radiation databases returned data for the location.
+        """
+        for raddatabase in self.raddatabases:
+            params = {'lat': latitude,
+                      'lon': longitude,
+                      'startyear': startyear,
+                      'endyear': endyear,
+                      'usehorizon': self.usehorizon,
+                      'raddatabase': raddatabase,
+                      'components': 1,
+                      'angle': 0,
+                      'outputformat': 'json'}
+            response = self.__request(self.series_api_url, params)
+            if response.status_code == 200:
+                return parse_series_response(response.json(), raddatabase)
+
+        raise requests.HTTPError(f"Error: {response.status_code}, {response.text}", response=response)
+
+    def get_tmy_many(self, locations):
+        """
+        Retrieves the TMY data for many locations concurrently.
+
+        Parameters
+        ----------
+        locations : iterable of tuple
+            Latitude and longitude of each location.
+
+        Returns
+        -------
+        dict
+            TMY DataFrame for each (latitude, longitude) location, or the exception
+            raised while retrieving it.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.get_tmy, latitude, longitude): (latitude, longitude)
+                       for latitude, longitude in set(locations)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as error:
+                    results[futures[future]] = error
+        return results
+
+
+_default_client = None
+
+
+def get_default_client():
+    """
+    Returns the PVGIS client shared by the PV systems without a client, created on first use.
+
+    Returns
+    -------
+    PVGISclient
+        The shared client.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = PVGISclient()
+    return _default_client
+
+
+def set_default_client(client):
+    """
+    Sets the PVGIS client shared by the PV systems without a client.
+
+    Parameters
+    ----------
+    client : PVGISclient
+        The client to share, for example one pointing to a local stand-in server.
+    """
+    global _default_client
+    _default_client = client
@@ -1,5 +1,7 @@
+from FPVsimulation.lazy import lazy_import
 import numpy as np
-import pandas as pd 
+
+pd = lazy_import('pandas')
 
 default_PVmodel_parameters = {
     'tilt': 0,
@@ -11,6 +13,31 @@ default_PVmodel_parameters = {
     'b0': 0.05,                         # Incidence Angle Modifier (IAM) coefficient
     }
 
+# Names of the module performance arrays, in the column order of get_module_performance
+module_performance_names = ('temperature_eff', 'IAM', 'T_module', 'module_efficiency')
+
+
+def get_module_performance_buffers(shape, dtype=np.float64):
+    """
+    Allocates output buffers for PVmodel.get_module_performance_arrays.
+
+    The buffers are the rows of a single array, so they can be reused for every call with
+    the same shape and wrapped in a DataFrame without copying.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the arrays, for example (hours, systems).
+    dtype : numpy.dtype, optional
+        Data type of the arrays (default is numpy.float64).
+
+    Returns
+    -------
+    dict
+        An uninitialized array for each of module_performance_names.
+    """
+    buffer = np.empty((len(module_performance_names),) + tuple(shape), dtype=dtype)
+    return dict(zip(module_performance_names, buffer))
 
 
 class PVmodel():
@@ -24,12 +51,10 @@ class PVmodel():
     
     Methods
     -------
-    __get_cell_temperature_profile(gpoa_df):
-        Calculates the cell temperature profile based on given weather data.
-    __get_IAM_profile(G_poa_df):
-        Calculates the Incidence Angle Modifier (IAM) profile based on given data.
     get_module_performance(G_poa_df):
         Calculates the module performance metrics based on given data.
+    get_module_performance_arrays(poa, T2m, aoi, out=None):
+        Calculates the module performance metrics on NumPy arrays.
     """
 
 
@@ -63,65 +88,83 @@ class PVmodel():
         for param, value in params.items():
             self.params[param] = value
 
-    def __get_cell_temperature_profile(self, gpoa_df):
+    def get_module_performance(self, G_poa_df): 
         """
-        Calculates the cell temperature profile based on given weather data.
+        Calculates the module performance metrics based on given data.
 
         Parameters
         ----------
-        gpoa_df : pandas.DataFrame
-            DataFrame containing weather data, with columns 'T2m' (ambient temperature) and 
-            'poa_global_W/m2' (plane of array irradiance in W/m^2).
+        G_poa_df : pandas.DataFrame
+            DataFrame containing weather and irradiance data, with columns 'T2m' (ambient temperature), 
+            'poa_global_W/m2' (plane of array irradiance in W/m^2), and 'aoi' (angle of incidence in degrees).
 
         Returns
         -------
-        pandas.Series
-            Series containing the cell temperature for each time step.
+        pandas.DataFrame
+            DataFrame containing the temperature efficiency, IAM, module temperature, and module efficiency for each time step.
         """
+        # Evaluate into the rows of one array, wrapped below as the columns of the DataFrame
+        buffer = np.empty((len(module_performance_names), len(G_poa_df)))
+        self.get_module_performance_arrays(G_poa_df['poa_global_W/m2'].to_numpy(), G_poa_df['T2m'].to_numpy(),
+                                           G_poa_df['aoi'].to_numpy(), dict(zip(module_performance_names, buffer)))
+        return pd.DataFrame(buffer.T, index=G_poa_df.index, columns=list(module_performance_names), copy=False)
 
-        # Calculate cell temperature using ambient temperature and irradiance
-        return gpoa_df['T2m'] + gpoa_df['poa_global_W/m2'] / self.params['U']
-       
-    def __get_IAM_profile(self, G_poa_df):
+    def get_module_performance_arrays(self, poa, T2m, aoi, out=None):
         """
-        Calculates the Incidence Angle Modifier (IAM) profile based on given data.
+        Calculates the module performance metrics on NumPy arrays.
 
-        Parameters
-        ----------
-        G_poa_df : pandas.DataFrame
-            DataFrame containing angle of incidence (AOI) data in degrees.
-
-        Returns
-        -------
-        numpy.ndarray
-            Array containing the IAM for each time step, clipped to a minimum of 0.
-        """
-        aoi_rad = G_poa_df['aoi']*np.pi/180
-        IAM = np.where(G_poa_df['aoi'] < 90, 1 - self.params['b0'] * (1 / np.cos(aoi_rad) - 1), 0)
-        return IAM.clip(min=0)
-    
-    def get_module_performance(self, G_poa_df): 
-        """
-        Calculates the module performance metrics based on given data.
+        The arrays may have any shape, for example hours x systems, and the parameters
+        may be scalars or arrays broadcasting against them. The metrics are evaluated in
+        place in the output arrays, so with preallocated buffers nothing is allocated.
 
         Parameters
         ----------
-        G_poa_df : pandas.DataFrame
-            DataFrame containing weather and irradiance data, with columns 'T2m' (ambient temperature), 
-            'poa_global_W/m2' (plane of array irradiance in W/m^2), and 'aoi' (angle of incidence in degrees).
+        poa : numpy.ndarray
+            Plane of array irradiance in W/m^2.
+        T2m : numpy.ndarray
+            Ambient temperature in degrees Celsius.
+        aoi : numpy.ndarray
+            Angle of incidence in degrees.
+        out : dict, optional
+            Arrays of the broadcast shape of the inputs and parameters for each of
+            module_performance_names, see get_module_performance_buffers (default is None,
+            allocating new arrays).
 
         Returns
         -------
-        pandas.DataFrame
-            DataFrame containing the temperature efficiency, IAM, module temperature, and module efficiency for each time step.
+        dict
+            Arrays of the temperature efficiency, IAM, module temperature and module efficiency.
         """
+        params = self.params
+        if out is None:
+            out = get_module_performance_buffers(np.broadcast_shapes(
+                np.shape(poa), np.shape(T2m), np.shape(aoi),
+                *(np.shape(params[param]) for param in ('eff_nom', 'beta', 'U', 'b0'))))
+        temperature_eff = out['temperature_eff']
+        IAM = out['IAM']
+        T_module = out['T_module']
+        module_efficiency = out['module_efficiency']
         T_STC = 25
-        T_module = self.__get_cell_temperature_profile(G_poa_df)
-        temperature_eff = 1 - self.params['beta']*(T_module - T_STC)
-        IAM = self.__get_IAM_profile(G_poa_df)
-        module_efficiency = (self.params['eff_nom']* IAM * temperature_eff )
-        return pd.DataFrame({'temperature_eff': module_efficiency,
-                             'IAM': IAM, 'T_module': T_module,
-                             'module_efficiency': module_efficiency })
-
 
+        # Cell temperature from the ambient temperature and the irradiance
+        np.divide(poa, params['U'], out=T_module)
+        T_module += T2m
+        np.subtract(T_module, T_STC, out=temperature_eff)
+        temperature_eff *= params['beta']
+        np.subtract(1, temperature_eff, out=temperature_eff)
+
+        # Incidence angle modifier, zero from 90 degrees, using module_efficiency as the mask
+        np.multiply(aoi, np.pi, out=IAM)
+        IAM /= 180
+        np.cos(IAM, out=IAM)
+        np.reciprocal(IAM, out=IAM)
+        IAM -= 1
+        IAM *= params['b0']
+        np.subtract(1, IAM, out=IAM)
+        np.fmax(IAM, 0, out=IAM)
+        np.less(aoi, 90, out=module_efficiency)
+        IAM *= module_efficiency
+
+        np.multiply(IAM, params['eff_nom'], out=module_efficiency)
+        module_efficiency *= temperature_eff
+        return out
@@ -1,15 +1,31 @@
 from FPVsimulation.pvmodel import PVmodel, default_PVmodel_parameters
-from FPVsimulation.soiling_loss_NS3031 import soiling_loss_NS3031_gdf
-import pvlib
-import requests
-import pandas as pd
-from shapely.geometry import Point
+from FPVsimulation.soiling_loss_NS3031 import get_default_soiling_lookup
+from FPVsimulation.pvgis import get_default_client
+from FPVsimulation.registry import SystemRegistry
+from FPVsimulation.solar_position import get_solar_position, get_solar_position_method
+from FPVsimulation.batch import get_day_keys, get_poa_arrays, get_power_arrays, get_summary_arrays
+from FPVsimulation.multiyear import get_exceedance_statistics, get_multiyear_arrays, iter_series_years
+from FPVsimulation.stages import get_stage
+from FPVsimulation.result_cache import get_result_key
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pvlib = lazy_import('pvlib')
+pd = lazy_import('pandas')
 
 
 class PVsystem():
     """
     A class to represent a Photovoltaic (PV) system and simulate its performance.
 
+    A PVsystem is a lightweight view of one row of a SystemRegistry. A PVsystem created
+    directly holds its own registry, while the systems of a Lake share the registry of the lake.
+
+    The simulation does not modify the system: when the peak power exceeds the maximum power,
+    the output is scaled down and the scaled area is returned as 'effective_area', so the
+    results only depend on the inputs and can be memoized in a result cache.
+
     Attributes
     ----------
     latitude : float
@@ -22,6 +38,20 @@ class PVsystem():
         Maximum power output of the PV system in megawatts.
     raddatabase : str
         The radiation database used for simulation.
+    weather_cache : WeatherCache or None
+        Persistent cache for the TMY data, None to always use the online API.
+    soiling_lookup : SoilingLookup or None
+        Soiling table of the system, None to use the built-in NS3031 table.
+    weather_store : WeatherStore or None
+        Memory-mapped store of the TMY data, used instead of the weather cache and the online API.
+    stage_cache : StageCache or None
+        Intermediate results kept between runs, so only the stages whose inputs changed are
+        evaluated again, None to evaluate every stage on every run.
+    result_cache : ResultCache or None
+        Cache of the simulation results keyed on the content of their inputs, None to always
+        simulate.
+    client : PVGISclient or None
+        Client for the PVGIS API, None to use the shared default client.
 
     Methods
     -------
@@ -34,15 +64,30 @@ class PVsystem():
     __get_system_performance(PVparams=default_PVmodel_parameters, G_poa_df=None):
         Calculates the system performance metrics.
     __get_power_profiles(G_poa_df, perf_df, PVparams):
-        Calculates the power output profiles.
+        Calculates the power output profiles and the effective area.
+    get_client():
+        Returns the PVGIS client of the system.
+    get_tmy_profile():
+        Returns the TMY weather data of the system, from the weather store, cache or online API.
+    get_monthly_soiling_loss():
+        Returns the monthly soiling loss of the system.
     get_system_simulation_data(PVparams=default_PVmodel_parameters, weather=None):
         Simulates the system performance and returns the data.
     get_annual_energy_yield(PVparams=default_PVmodel_parameters, weather=None):
         Calculates the annual energy yield of the system.
-    get_monthly_aggregates(PVparams=default_PVmodel_parameters, weather=None):
+    get_annual_results(PVparams=default_PVmodel_parameters, weather=None):
+        Calculates the annual energy yield, the effective area and the clipping of the system.
+    get_energy_summary(PVparams=default_PVmodel_parameters, weather=None):
+        Calculates the annual, monthly and daily peak summaries of the system in one pass.
+    get_montly_aggragates(PVparams=default_PVmodel_parameters, weather=None):
         Calculates the monthly aggregates of the system performance.
+    get_multiyear_energy_yield(PVparams=default_PVmodel_parameters, series=None, reuse_solar_position=True):
+        Calculates the yearly and monthly energy yield and the P50 and P90 over a multi-year series.
     """
-    def __init__(self, latitude, longitude, system_area, max_power_MW):
+    __slots__ = ('_registry', '_index')
+
+    def __init__(self, latitude, longitude, system_area, max_power_MW, weather_cache=None, soiling_lookup=None,
+                 weather_store=None):
         """
         Constructs all the necessary attributes for the PVsystem object.
 
@@ -56,48 +101,175 @@ class PVsystem():
             Area covered by the PV system in square kilometers.
         max_power_MW : float
             Maximum power output of the PV system in megawatts.
+        weather_cache : WeatherCache, optional
+            Persistent cache for the TMY data (default is None).
+        soiling_lookup : SoilingLookup, optional
+            Soiling table of the system (default is None, use the built-in NS3031 table).
+        weather_store : WeatherStore, optional
+            Memory-mapped store of the TMY data (default is None).
+        """
+        registry = SystemRegistry()
+        self._registry = registry
+        self._index = registry.add_system(-1, latitude, longitude, system_area, max_power_MW,
+                                          weather_cache, soiling_lookup, weather_store)
+
+    @classmethod
+    def from_registry(cls, registry, index):
+        """
+        Returns the view of a system of a registry.
+
+        Parameters
+        ----------
+        registry : SystemRegistry
+            Registry holding the system.
+        index : int
+            Row of the system in the registry.
+
+        Returns
+        -------
+        PVsystem
+            View of the system.
+        """
+        system = cls.__new__(cls)
+        system._registry = registry
+        system._index = index
+        return system
+
+    def __reduce__(self):
+        # Pickle a standalone copy of this system only, not the whole registry
+        system = (self.latitude, self.longitude, self.system_area, self.max_power_MW,
+                  self.weather_cache, self.soiling_lookup, self.weather_store)
+        return (_unpickle_pvsystem, (system, self.raddatabase, self.result_cache, self.client))
+
+    def __get_column(self, name):
+        return self._registry.get_system_column(name)
+
+    @property
+    def latitude(self):
+        return self.__get_column('latitude')[self._index]
+
+    @property
+    def longitude(self):
+        return self.__get_column('longitude')[self._index]
+
+    @property
+    def system_area(self):
+        return self.__get_column('system_area')[self._index]
+
+    @system_area.setter
+    def system_area(self, value):
+        self.__get_column('system_area')[self._index] = value
+
+    @property
+    def max_power_MW(self):
+        max_power_MW = self.__get_column('max_power_MW')[self._index]
+        return None if np.isnan(max_power_MW) else max_power_MW
+
+    @property
+    def raddatabase(self):
+        return self.__get_column('raddatabase')[self._index]
+
+    @raddatabase.setter
+    def raddatabase(self, value):
+        self.__get_column('raddatabase')[self._index] = value
+
+    @property
+    def weather_cache(self):
+        return self.__get_column('weather_cache')[self._index]
+
+    @weather_cache.setter
+    def weather_cache(self, value):
+        self.__get_column('weather_cache')[self._index] = value
+
+    @property
+    def soiling_lookup(self):
+        return self.__get_column('soiling_lookup')[self._index]
+
+    @soiling_lookup.setter
+    def soiling_lookup(self, value):
+        self.__get_column('soiling_lookup')[self._index] = value
+
+    @property
+    def weather_store(self):
+        return self.__get_column('weather_store')[self._index]
+
+    @weather_store.setter
+    def weather_store(self, value):
+        self.__get_column('weather_store')[self._index] = value
+
+    @property
+    def stage_cache(self):
+        return self.__get_column('stage_cache')[self._index]
+
+    @stage_cache.setter
+    def stage_cache(self, value):
+        self.__get_column('stage_cache')[self._index] = value
+
+    @property
+    def result_cache(self):
+        return self.__get_column('result_cache')[self._index]
+
+    @result_cache.setter
+    def result_cache(self, value):
+        self.__get_column('result_cache')[self._index] = value
+
+    @property
+    def client(self):
+        return self.__get_column('client')[self._index]
+
+    @client.setter
+    def client(self, value):
+        self.__get_column('client')[self._index] = value
+
+    def get_client(self):
+        """
+        Returns the PVGIS client of the system.
+
+        Returns
+        -------
+        PVGISclient
+            The client of the system, or the shared default client if it has none.
         """
-        self.latitude = latitude
-        self.longitude = longitude
-        self.system_area = system_area
-        self.max_power_MW = max_power_MW
-        self.raddatabase = None
+        client = self.client
+        return get_default_client() if client is None else client
           
     def __get_tmy_profile_api(self):
         """
         Retrieves Typical Meteorological Year (TMY) data from an online API.
 
+        If a weather cache is set, the data is read from the cache when available, and
+        downloaded data is stored in the cache. The coordinates are then snapped to the
+        cache grid, so every system within a grid cell gets the same data.
+
         Returns
         -------
         pandas.DataFrame
             DataFrame containing TMY data with columns for weather parameters.
         """
-        api_url = 'https://re.jrc.ec.europa.eu/api/v5_2/tmy?'
-
-        params = {'lat': self.latitude,
-                'lon': self.longitude, 
-                'usehorizon': 1, 
-                'raddatabase': 'PVGIS-SARAH2',
-                'outputformat': 'json'}
-
-        response = requests.get(api_url, params=params)
-   
-        if response.status_code == 200:
-            tmy_df = pd.DataFrame(response.json()['outputs']['tmy_hourly'])
-        else:
-            params['raddatabase'] = 'PVGIS-ERA5'
-            response = requests.get(api_url, params=params)
-    
-            assert response.status_code == 200, f"Error: {response.status_code}, {response.text}"
-            tmy_df = pd.DataFrame(response.json()['outputs']['tmy_hourly'])
-
-        self.raddatabase = params['raddatabase']  
-        tmy_df['raddatabase'] = params['raddatabase']
-        tmy_df['time(UTC)'] =  pd.to_datetime(tmy_df['time(UTC)'], format='%Y%m%d:%H%M')
-        tmy_df = tmy_df.set_index('time(UTC)')
-
+        with instrumentation.stage('weather'):
+            client = self.get_client()
+            raddatabase = client.raddatabases[0]
+
+            if self.weather_cache is not None:
+                tmy_df = self.weather_cache.get(self.latitude, self.longitude, raddatabase, client.usehorizon)
+                if tmy_df is not None:
+                    self.raddatabase = tmy_df['raddatabase'].iloc[0]
+                    return tmy_df
+                if self.weather_cache.offline:
+                    raise LookupError(f"No cached TMY data for ({self.latitude}, {self.longitude}) "
+                                      "and the weather cache is offline")
+                latitude, longitude = self.weather_cache.snap(self.latitude, self.longitude)
+            else:
+                latitude, longitude = self.latitude, self.longitude
+
+            # Falls back from PVGIS-SARAH2 to PVGIS-ERA5 outside the SARAH2 coverage
+            tmy_df = client.get_tmy(latitude, longitude)
+            self.raddatabase = tmy_df['raddatabase'].iloc[0]
+
+            if self.weather_cache is not None:
+                self.weather_cache.put(self.latitude, self.longitude, raddatabase, client.usehorizon, tmy_df)
         
-        return tmy_df
+            return tmy_df
 
     def __get_G_POA_profile(self, PVparams=default_PVmodel_parameters, weather=None):        
         """
@@ -120,42 +292,47 @@ class PVsystem():
         """
         if weather is None: 
             # Get TMY weather data if no weather data is provided
-            __weather = self.__get_tmy_profile_api().copy()
+            __weather = self.get_tmy_profile()
         else: 
-            __weather = weather.copy()
-
-        # Create a location object using latitude and longitude
-        __location = pvlib.location.Location(latitude=self.latitude,
-                                    longitude=self.longitude)
-        __times = __weather.copy().index 
-        # Get solar position data
-        __solar_position = __location.get_solarposition(__times)
+            # The weather data is only read, so it is not copied
+            __weather = weather
+
+        # Get solar position data, shared with every system at the same location
+        __solar_position = get_solar_position(self.latitude, self.longitude, __weather.index)
         
         
-        if PVparams['tilt']==0:
-            # Use GHI as POA when the tilt is zero
-            __G_poa_df = pd.DataFrame({'poa_global_W/m2': __weather['G(h)']})
-            __G_poa_df['aoi'] = __solar_position['zenith']
-        else:
-            # Calculate POA irradiance for tilted surfaces
-            __G_poa_df = pvlib.irradiance.get_total_irradiance(
-                    surface_tilt=PVparams['tilt'],  # tilted 20 degrees from horizontal
-                    surface_azimuth=PVparams['azimuth'],  # facing South
-                    dni=weather['Gb(n)'],
-                    ghi=weather['G(h)'],
-                    dhi=weather['Gd(h)'],
-                    solar_zenith=__solar_position['apparent_zenith'],
-                    solar_azimuth=__solar_position['azimuth'],
-                    model='isotropic')
-            __G_poa_df['aoi'] = pvlib.irradiance.aoi(
-                    PVparams['tilt'],
-                    PVparams['azimuth'],
-                    __solar_position['apparent_zenith'],
-                    __solar_position['azimuth']
-                )
+        with instrumentation.stage('poa'):
+            if PVparams['tilt']==0:
+                # Use GHI as POA when the tilt is zero
+                __poa_global = __weather['G(h)']
+                __aoi = __solar_position['zenith']
+            else:
+                # Calculate POA irradiance for tilted surfaces
+                __irradiance = pvlib.irradiance.get_total_irradiance(
+                        surface_tilt=PVparams['tilt'],  # tilted 20 degrees from horizontal
+                        surface_azimuth=PVparams['azimuth'],  # facing South
+                        dni=__weather['Gb(n)'],
+                        ghi=__weather['G(h)'],
+                        dhi=__weather['Gd(h)'],
+                        solar_zenith=__solar_position['apparent_zenith'],
+                        solar_azimuth=__solar_position['azimuth'],
+                        model='isotropic')
+                __poa_global = __irradiance['poa_global']
+                __aoi = pvlib.irradiance.aoi(
+                        PVparams['tilt'],
+                        PVparams['azimuth'],
+                        __solar_position['apparent_zenith'],
+                        __solar_position['azimuth']
+                    )
             
-        __G_poa_df = pd.concat([__G_poa_df, __weather], axis=1)
-        return __G_poa_df[['poa_global_W/m2', 'T2m', 'WS10m', 'aoi', 'raddatabase']]
+        with instrumentation.stage('dataframe'):
+            # Take only the needed weather columns instead of joining the whole weather frame
+            return pd.DataFrame({'poa_global_W/m2': __poa_global.to_numpy(),
+                                 'T2m': __weather['T2m'].to_numpy(),
+                                 'WS10m': __weather['WS10m'].to_numpy(),
+                                 'aoi': __aoi.to_numpy(),
+                                 'raddatabase': __weather['raddatabase'].to_numpy()},
+                                index=__weather.index)
     
     def __get_system_loss_soiling(self):
         """
@@ -163,20 +340,15 @@ class PVsystem():
 
         Returns
         -------
-        float
-            Soiling loss percentage for the system.
+        numpy.ndarray
+            Soiling loss percentage for each month of the year.
         """
-        # Create a Point object for the system center
-        center = Point(self.longitude, self.latitude)
-        soiling_loss_gdf = soiling_loss_NS3031_gdf.copy()
-
-        # Calculate the distance between the system center and each municipality center for soiling loss
-        soiling_loss_gdf['distance'] = soiling_loss_NS3031_gdf['geometry'].distance(center)
+        soiling_lookup = self.soiling_lookup
+        if soiling_lookup is None:
+            soiling_lookup = get_default_soiling_lookup()
 
-        # Get the soiling data belonging to the nearest municipality
-        nearest_point = soiling_loss_gdf.loc[soiling_loss_gdf['distance'].idxmin()]
-
-        return nearest_point['soiling']
+        # Get the soiling data belonging to the nearest municipality by great-circle distance
+        return soiling_lookup.get_soiling(self.latitude, self.longitude)[0]
 
 
     def __get_system_performance(self, PVparams=default_PVmodel_parameters, G_poa_df=None):
@@ -199,10 +371,11 @@ class PVsystem():
         # Create a PV model with the provided parameters
         module = PVmodel(PVparams)
         # Get module performance metrics
-        perf_df = module.get_module_performance(G_poa_df)
+        with instrumentation.stage('pvmodel'):
+            perf_df = module.get_module_performance(G_poa_df)
         # Calculate soiling losses
         monthly_soiling = self.__get_system_loss_soiling()
-        perf_df['s_soiling'] = perf_df.index.month.map(lambda month: monthly_soiling[month-1])
+        perf_df['s_soiling'] = monthly_soiling[perf_df.index.month - 1]
         # Calculate overall system performance
         perf_df['syst_perf'] = (
             (perf_df['module_efficiency']/100)*
@@ -213,7 +386,7 @@ class PVsystem():
     
     def __get_power_profiles(self, G_poa_df, perf_df, PVparams):
         """
-        Calculates the power output profiles.
+        Calculates the power output profiles and the effective area.
 
         Parameters
         ----------
@@ -226,8 +399,9 @@ class PVsystem():
 
         Returns
         -------
-        pandas.DataFrame
-            DataFrame containing power output profiles.
+        tuple
+            DataFrame containing power output profiles, and the area of the system after
+            scaling to the maximum power.
         """
         power_df = pd.DataFrame()
         # Calculate power output per square meter
@@ -236,16 +410,56 @@ class PVsystem():
         power_df['Power_out_W'] = power_df['Power_out_W/m2'] * self.system_area
 
         # Adjust power output if it exceeds the maximum power capacity
+        effective_area = self.system_area
         if self.max_power_MW is not None:
             P_peak = max(power_df['Power_out_W'])
             if P_peak > self.max_power_MW * 10**6:
-                self.system_area *= self.max_power_MW * 10**6 / P_peak
+                effective_area *= self.max_power_MW * 10**6 / P_peak
                 power_df['Power_out_W'] *= self.max_power_MW * 10**6 / P_peak
         
-        return power_df
+        return power_df, effective_area
         
 
-    def get_system_simulation_data(self, PVparams=default_PVmodel_parameters, weather=None):
+    def get_tmy_profile(self):
+        """
+        Returns the TMY weather data of the system, from the weather store, the weather cache
+        or the online API.
+
+        With a weather store, the numeric columns are read-only views of the memory-mapped
+        store and neither the cache nor the API is used.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame containing TMY data with columns for weather parameters.
+
+        Raises
+        ------
+        LookupError
+            If the system has a weather store that does not hold its location.
+        """
+        if self.weather_store is None:
+            return self.__get_tmy_profile_api()
+        with instrumentation.stage('weather'):
+            tmy_df = self.weather_store.get(self.latitude, self.longitude)
+        if tmy_df is None:
+            raise LookupError(f"No TMY data for ({self.latitude}, {self.longitude}) in the weather store")
+        self.raddatabase = tmy_df['raddatabase'].iloc[0]
+        return tmy_df
+
+    def get_monthly_soiling_loss(self):
+        """
+        Returns the monthly soiling loss of the system.
+
+        Returns
+        -------
+        numpy.ndarray
+            Soiling loss in percentage for each month, January first.
+        """
+        return self.__get_system_loss_soiling()
+
+    def get_system_simulation_data(self, PVparams=default_PVmodel_parameters, weather=None, columns=None,
+                                   compact=False):
         """
         Simulates the FPV system and returns hourly data.
 
@@ -255,11 +469,19 @@ class PVsystem():
             Parameters for the PV model (default is default_PVmodel_parameters).
         weather : pandas.DataFrame, optional
             DataFrame containing weather data (default is None).
+        columns : list of str, optional
+            Columns to return, in this order (default is None, all columns).
+        compact : bool, optional
+            If True, the numeric columns are float32 and the radiation database is stored in
+            the `attrs` of the DataFrame instead of a column, or as a categorical column if it
+            is selected in `columns`. This takes less than half the memory (default is False).
 
         Returns
         -------
         pandas.DataFrame
-            DataFrame containing simulated system performance data with the following columns:
+            DataFrame containing simulated system performance data, with the area of the system
+            after scaling to the maximum power and whether it was scaled in its `attrs` as
+            'effective_area' and 'clipped', and with the following columns:
             - poa_global_W/m2: Plane of array irradiance in W/m^2.
             - T2m: Ambient temperature at 2 meters in degrees Celsius.
             - WS10m: Wind speed at 10 meters in m/s.
@@ -274,18 +496,117 @@ class PVsystem():
             - Power_out_W: Total power output in Watts.
             - energy_yield_kWh: Energy yield in kilowatt-hours.
         """
+        return self.__memoize('hourly', PVparams, weather,
+                              lambda: self.__get_simulation_data(PVparams, weather, columns, compact),
+                              (columns, compact))
+
+    def __get_simulation_data(self, PVparams, weather, columns, compact):
+        """
+        Simulates the FPV system and returns hourly data, see get_system_simulation_data.
+        """
         # Get POA irradiance profile
         G_poa_df = self.__get_G_POA_profile(PVparams, weather)
         # Get system performance metrics
         perf_df = self.__get_system_performance(PVparams, G_poa_df)
         # Get power output profiles
-        power_df = self.__get_power_profiles(G_poa_df, perf_df, PVparams)
-        simulated_data = pd.concat([G_poa_df, perf_df, power_df], axis=1)
+        with instrumentation.stage('power'):
+            power_df, effective_area = self.__get_power_profiles(G_poa_df, perf_df, PVparams)
+        with instrumentation.stage('dataframe'):
+            simulated_data = {}
+            for frame in (G_poa_df, perf_df, power_df):
+                simulated_data.update((column, frame[column].to_numpy()) for column in frame.columns)
+            # Calculate energy yield
+            simulated_data['energy_yield_kWh'] = simulated_data['Power_out_W']/1_000
+            simulated_df = _get_simulation_frame(simulated_data, G_poa_df.index, columns, compact)
+        simulated_df.attrs['effective_area'] = effective_area
+        simulated_df.attrs['clipped'] = bool(effective_area < self.system_area)
+        return simulated_df
+
+    def __memoize(self, kind, PVparams, weather, compute, options=()):
+        """
+        Returns a result from the result cache of the system, or computes it without a cache.
 
-        # Calculate energy yield
-        simulated_data['energy_yield_kWh'] = simulated_data['Power_out_W']/1_000
-        return simulated_data
+        The radiation database of the system is stored with the result and restored on a hit.
+        """
+        result_cache = self.result_cache
+        if result_cache is None:
+            return compute()
+
+        def compute_entry():
+            return compute(), self.raddatabase
+        result, raddatabase = result_cache.get(get_result_key(kind, self, PVparams, weather, options), compute_entry)
+        self.raddatabase = raddatabase
+        return result
     
+    def __get_power_arrays(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Simulates the power output on arrays, without building the hourly DataFrame.
+
+        With a stage cache and without explicit weather data, the weather, solar position,
+        plane of array irradiance, module performance and soiling stages are reused from the
+        previous run when their inputs did not change, see stages.StageCache.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : pandas.DataFrame, optional
+            DataFrame containing weather data (default is None).
+
+        Returns
+        -------
+        tuple
+            Hourly power output in Watts, the time index of the weather data and the area of
+            the system after scaling to the maximum power.
+        """
+        stage_cache = self.stage_cache if weather is None else None
+        # Single column arrays of shape hours x 1 for the batch engine
+        columns = get_stage(stage_cache, 'weather', PVparams, lambda: self.__get_weather_columns(weather),
+                            (self.weather_store, self.weather_cache, self.client))
+        self.raddatabase = columns['raddatabase']
+        solar_position = get_stage(stage_cache, 'solar_position', PVparams,
+                                   lambda: self.__get_solar_position_columns(columns['times']),
+                                   (get_solar_position_method(),))
+
+        def get_poa():
+            with instrumentation.stage('poa'):
+                return get_poa_arrays(columns, solar_position, PVparams['tilt'], PVparams['azimuth'])
+        poa, aoi = get_stage(stage_cache, 'poa', PVparams, get_poa)
+
+        def get_module_performance():
+            with instrumentation.stage('pvmodel'):
+                return dict(PVmodel(PVparams).get_module_performance_arrays(poa, columns['T2m'], aoi))
+        module_performance = get_stage(stage_cache, 'module_performance', PVparams, get_module_performance)
+        monthly_soiling = get_stage(stage_cache, 'soiling', PVparams,
+                                    lambda: self.__get_system_loss_soiling()[:, np.newaxis], (self.soiling_lookup,))
+
+        max_power_MW = np.nan if self.max_power_MW is None else self.max_power_MW
+        data = get_power_arrays(poa, columns['T2m'], aoi, columns['months'], monthly_soiling,
+                                np.array([self.system_area]), np.array([max_power_MW]), PVparams,
+                                module_performance=module_performance)
+        return data['Power_out_W'], columns['times'], data['effective_area'][0]
+
+    def __get_weather_columns(self, weather=None):
+        """
+        Returns the weather data as single column arrays, with its time index, months and radiation database.
+        """
+        if weather is None:
+            weather = self.get_tmy_profile()
+        columns = {column: weather[column].to_numpy(dtype=float)[:, np.newaxis]
+                   for column in ('G(h)', 'Gb(n)', 'Gd(h)', 'T2m')}
+        columns['times'] = weather.index
+        columns['months'] = weather.index.month.to_numpy()
+        columns['raddatabase'] = self.raddatabase
+        return columns
+
+    def __get_solar_position_columns(self, times):
+        """
+        Returns the solar position as single column arrays, shared with every system at the same location.
+        """
+        solar_position = get_solar_position(self.latitude, self.longitude, times)
+        return {column: solar_position[column].to_numpy()[:, np.newaxis]
+                for column in ('zenith', 'apparent_zenith', 'azimuth')}
+
     def get_annual_energy_yield(self,PVparams=default_PVmodel_parameters, weather=None):
         """
         Calculates the annual energy yield of the PV system.
@@ -302,10 +623,76 @@ class PVsystem():
         float
             Total annual energy yield in kilowatt-hours (kWh).
         """
-        # Simulate the system performance and calculate the total annual energy yield
-        simulated_data = self.get_system_simulation_data(PVparams, weather)
-        return simulated_data['energy_yield_kWh'].sum()
-    
+        return self.get_annual_results(PVparams, weather)['annual_energy_yield_kWh']
+
+    def get_annual_results(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Calculates the annual energy yield, the effective area and the clipping of the system.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : pandas.DataFrame, optional
+            DataFrame containing weather data (default is None).
+
+        Returns
+        -------
+        dict
+            Annual results of the system with the following keys:
+            - annual_energy_yield_kWh: Total annual energy yield in kilowatt-hours (kWh).
+            - effective_area: Area of the system after scaling to the maximum power.
+            - clipped: True if the peak power exceeded the maximum power and the system was scaled.
+        """
+        def get_annual_results():
+            # Sum the hourly power output without building the hourly DataFrame
+            power_W, _, effective_area = self.__get_power_arrays(PVparams, weather)
+            return {'annual_energy_yield_kWh': power_W.sum() / 1_000,
+                    'effective_area': effective_area,
+                    'clipped': bool(effective_area < self.system_area)}
+        return self.__memoize('annual', PVparams, weather, get_annual_results)
+
+    def get_energy_summary(self, PVparams=default_PVmodel_parameters, weather=None):
+        """
+        Calculates the annual, monthly and daily peak summaries of the system in one pass.
+
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather : pandas.DataFrame, optional
+            DataFrame containing weather data (default is None).
+
+        Returns
+        -------
+        dict
+            Summary of the system with the following keys:
+            - annual_energy_yield_kWh: Total energy yield in kilowatt-hours (kWh).
+            - monthly_energy_yield_kWh: Energy yield of each month, January first, NaN for missing months.
+            - monthly_max_energy_yield_kWh: Maximum hourly energy yield of each month.
+            - monthly_max_power_W: Maximum power output in Watts of each month.
+            - monthly_avg_daily_peak_W: Average daily peak power output in Watts of each month.
+            - daily_peak: pandas.Series of the peak power output in Watts of each day.
+            - effective_area: Area of the system after scaling to the maximum power.
+            - clipped: True if the peak power exceeded the maximum power and the system was scaled.
+        """
+        return self.__memoize('summary', PVparams, weather, lambda: self.__get_energy_summary(PVparams, weather))
+
+    def __get_energy_summary(self, PVparams, weather):
+        """
+        Calculates the annual, monthly and daily peak summaries of the system, see get_energy_summary.
+        """
+        power_W, times, effective_area = self.__get_power_arrays(PVparams, weather)
+        with instrumentation.stage('aggregation'):
+            summary = get_summary_arrays(power_W, times.month.to_numpy(), get_day_keys(times))
+        days = summary.pop('days')
+        summary = {name: values[..., 0] for name, values in summary.items()}
+        summary['daily_peak'] = pd.Series(summary.pop('daily_peak_W'), name='Power_out_W',
+                                          index=pd.to_datetime(days.astype(str), format='%Y%m%d'))
+        summary['effective_area'] = effective_area
+        summary['clipped'] = bool(effective_area < self.system_area)
+        return summary
+
     def get_montly_aggragates(self, PVparams=default_PVmodel_parameters, weather=None):
         """
         Calculates the monthly aggregates of the system energy yield.
@@ -322,22 +709,119 @@ class PVsystem():
         pandas.DataFrame
             DataFrame containing monthly aggregates with the following columns:
             - ('energy_yield_kWh', 'sum'): Total energy yield in kilowatt-hours (kWh) for the month.
-            - ('energy_yield_kWh', 'max'): Maximum daily energy yield in kilowatt-hours (kWh) for the month.
+            - ('energy_yield_kWh', 'max'): Maximum hourly energy yield in kilowatt-hours (kWh) for the month.
             - ('Power_out_W', 'max'): Maximum power output in Watts for the month.
             - ('Power_out_W', 'avg_Ppeak'): Average daily peak power output in Watts for the month.
         """
-        if weather is None:
-            weather = self.__get_G_POA_profile(PVparams=PVparams)
-        
-        # Get hourly simulation data
-        hourly_df = self.get_system_simulation_data(weather=weather, PVparams=PVparams)
+        summary = self.get_energy_summary(PVparams, weather)
+        monthly_df = pd.DataFrame({('energy_yield_kWh', 'sum'): summary['monthly_energy_yield_kWh'],
+                                   ('energy_yield_kWh', 'max'): summary['monthly_max_energy_yield_kWh'],
+                                   ('Power_out_W', 'max'): summary['monthly_max_power_W'],
+                                   ('Power_out_W', 'avg_Ppeak'): summary['monthly_avg_daily_peak_W']},
+                                  index=pd.Index(np.arange(1, 13, dtype=np.int32), name='Month'))
+        # Keep only the months with data
+        return monthly_df[~np.isnan(summary['monthly_energy_yield_kWh'])]
+
+    def get_multiyear_energy_yield(self, PVparams=default_PVmodel_parameters, series=None,
+                                   reuse_solar_position=True):
+        """
+        Calculates the yearly and monthly energy yield and the P50 and P90 over a multi-year series.
 
-        # Calculate daily maximum power output
-        daily_max_power = hourly_df['Power_out_W'].resample('D').max()
+        The series is simulated one year at a time, see multiyear.get_multiyear_arrays. The
+        system is scaled to its maximum power with the peak of the whole series.
 
-        # Aggregate monthly data for energy yield and power output
-        monthly_df = hourly_df.groupby(hourly_df.index.month).agg({'energy_yield_kWh': ['sum', 'max'], 
-                                                                   'Power_out_W': 'max'})
-        monthly_df['Power_out_W', 'avg_Ppeak'] = daily_max_power.groupby(daily_max_power.index.month).mean()                                           
-        return monthly_df.rename_axis('Month')
-    
+        Parameters
+        ----------
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        series : pandas.DataFrame, optional
+            Hourly series of the system, as returned by PVGISclient.get_hourly_series
+            (default is None, download the 2005 to 2020 series from PVGIS).
+        reuse_solar_position : bool, optional
+            If True, reuse the solar position of the reference years across the years
+            (default is True).
+
+        Returns
+        -------
+        dict
+            Multi-year results of the system with the following keys:
+            - annual_energy_yield_kWh: pandas.Series of the energy yield of each year.
+            - monthly_energy_yield_kWh: pandas.DataFrame of the energy yield of each year and month,
+              NaN for missing months.
+            - hours: pandas.Series of the number of hours of each year.
+            - n_years: Number of complete years in the statistics.
+            - mean_energy_yield_kWh, std_energy_yield_kWh: Mean and standard deviation of the
+              energy yield of the complete years.
+            - P50_energy_yield_kWh, P90_energy_yield_kWh: Energy yield exceeded in 50 % and 90 %
+              of the complete years.
+            - effective_area: Area of the system after scaling to the maximum power.
+        """
+        if series is None:
+            series = self.get_client().get_hourly_series(self.latitude, self.longitude)
+        self.raddatabase = series['raddatabase'].iloc[0]
+        latitude = np.array([self.latitude])
+        longitude = np.array([self.longitude])
+        max_power_MW = np.nan if self.max_power_MW is None else self.max_power_MW
+        data = get_multiyear_arrays(iter_series_years([series]), latitude, longitude,
+                                    self.__get_system_loss_soiling()[:, np.newaxis], np.array([self.system_area]),
+                                    np.array([max_power_MW]), PVparams, reuse_solar_position)
+        statistics = get_exceedance_statistics(data['annual_energy_yield_kWh'], data['hours'])
+
+        years = pd.Index(data['years'], name='Year')
+        result = {'annual_energy_yield_kWh': pd.Series(data['annual_energy_yield_kWh'][:, 0], index=years,
+                                                       name='energy_yield_kWh'),
+                  'monthly_energy_yield_kWh': pd.DataFrame(data['monthly_energy_yield_kWh'][..., 0], index=years,
+                                                           columns=pd.Index(np.arange(1, 13), name='Month')),
+                  'hours': pd.Series(data['hours'], index=years, name='hours'),
+                  'n_years': statistics['n_years']}
+        for name in ('mean', 'std', 'P50', 'P90'):
+            result[f'{name}_energy_yield_kWh'] = statistics[name][0]
+        result['effective_area'] = data['effective_area'][0]
+        return result
+
+
+def _get_simulation_frame(simulated_data, index, columns=None, compact=False):
+    """
+    Builds the hourly DataFrame of get_system_simulation_data in one step.
+
+    Parameters
+    ----------
+    simulated_data : dict
+        Array of each column, including 'raddatabase'.
+    index : pandas.DatetimeIndex
+        Time index of the arrays.
+    columns : list of str, optional
+        Columns to return, in this order (default is None, all columns).
+    compact : bool, optional
+        If True, use float32 and store the radiation database in `attrs` (default is False).
+
+    Returns
+    -------
+    pandas.DataFrame
+        The hourly simulation data.
+    """
+    raddatabase = simulated_data['raddatabase'][0] if len(index) else None
+    if columns is None:
+        columns = [column for column in simulated_data if not (compact and column == 'raddatabase')]
+    frame = {}
+    for column in columns:
+        values = simulated_data[column]
+        if compact:
+            values = (pd.Categorical(values) if column == 'raddatabase' else
+                      values.astype(np.float32))
+        frame[column] = values
+    simulated_df = pd.DataFrame(frame, index=index, copy=False)
+    if compact:
+        simulated_df.attrs['raddatabase'] = raddatabase
+    return simulated_df
+
+
+def _unpickle_pvsystem(system, raddatabase, result_cache=None, client=None):
+    """
+    Recreates a pickled PVsystem in its own registry.
+    """
+    pv_system = PVsystem(*system)
+    pv_system.raddatabase = raddatabase
+    pv_system.result_cache = result_cache
+    pv_system.client = client
+    return pv_system
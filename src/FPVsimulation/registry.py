@@ -0,0 +1,353 @@
+from collections.abc import Mapping
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+# Columns of the lake and system tables, with their data types
+lake_columns = {'lake_id': object, 'lake_area': float, 'covered_area': float}
+system_columns = {'lake': np.int64, 'latitude': float, 'longitude': float, 'system_area': float,
+                  'max_power_MW': float, 'raddatabase': object, 'weather_cache': object,
+                  'soiling_lookup': object, 'weather_store': object, 'stage_cache': object,
+                  'result_cache': object, 'client': object}
+
+
+class SystemRegistry():
+    """
+    A class to store lakes and PV systems in columns of NumPy arrays.
+
+    Lake and PVsystem objects are lightweight views holding only the registry and their
+    row index, so registering many systems creates no Python object per system.
+
+    Attributes
+    ----------
+    n_lakes : int
+        Number of registered lakes.
+    n_systems : int
+        Number of registered systems.
+
+    Methods
+    -------
+    get_lake_column(name):
+        Returns a column of the lake table.
+    get_system_column(name):
+        Returns a column of the system table.
+    get_lake_index(lake_id):
+        Returns the row of a lake, or None if it is not registered.
+    add_lake(lake_id, lake_area):
+        Registers a lake, unless it is already registered.
+    add_system(lake, latitude, longitude, system_area, max_power_MW, weather_cache=None, soiling_lookup=None,
+               weather_store=None):
+        Registers a PV system.
+    add_systems(dataframe, weather_cache=None, soiling_lookup=None, weather_store=None):
+        Registers the lakes and PV systems of a DataFrame in bulk.
+    get_lake_systems(lake):
+        Returns the rows of the systems on a lake.
+    subset(lakes):
+        Returns a new registry holding a copy of some lakes and their systems.
+    """
+    def __init__(self):
+        """
+        Constructs an empty SystemRegistry.
+        """
+        self.n_lakes = 0
+        self.n_systems = 0
+        self.__lakes = {name: np.empty(0, dtype=dtype) for name, dtype in lake_columns.items()}
+        self.__systems = {name: np.empty(0, dtype=dtype) for name, dtype in system_columns.items()}
+        self.__lake_index = {}
+        self.__lake_order = None
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the SystemRegistry instance.
+        """
+        return f"SystemRegistry(n_lakes={self.n_lakes}, n_systems={self.n_systems})"
+
+    @staticmethod
+    def __reserve(columns, size, extra):
+        """
+        Grows the columns, doubling their capacity, to hold extra rows.
+        """
+        capacity = len(next(iter(columns.values())))
+        if size + extra <= capacity:
+            return
+        capacity = max(2*capacity, size + extra, 16)
+        for name, column in columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:size] = column[:size]
+            columns[name] = grown
+
+    def get_lake_column(self, name):
+        """
+        Returns a column of the lake table.
+
+        Parameters
+        ----------
+        name : str
+            Name of the column, one of 'lake_id', 'lake_area' and 'covered_area'.
+
+        Returns
+        -------
+        numpy.ndarray
+            Writeable view of the column, one row per lake.
+        """
+        return self.__lakes[name][:self.n_lakes]
+
+    def get_system_column(self, name):
+        """
+        Returns a column of the system table.
+
+        Parameters
+        ----------
+        name : str
+            Name of the column, one of 'lake', 'latitude', 'longitude', 'system_area',
+            'max_power_MW', 'raddatabase', 'weather_cache', 'soiling_lookup', 'weather_store',
+            'stage_cache', 'result_cache' and 'client'.
+
+        Returns
+        -------
+        numpy.ndarray
+            Writeable view of the column, one row per system.
+        """
+        return self.__systems[name][:self.n_systems]
+
+    def get_lake_index(self, lake_id):
+        """
+        Returns the row of a lake.
+
+        Parameters
+        ----------
+        lake_id : str
+            Identifier of the lake.
+
+        Returns
+        -------
+        int or None
+            Row of the lake, or None if it is not registered.
+        """
+        return self.__lake_index.get(lake_id)
+
+    def add_lake(self, lake_id, lake_area):
+        """
+        Registers a lake, unless it is already registered.
+
+        Parameters
+        ----------
+        lake_id : str
+            Identifier of the lake.
+        lake_area : float
+            Area of the lake.
+
+        Returns
+        -------
+        int
+            Row of the lake.
+        """
+        if lake_id in self.__lake_index:
+            return self.__lake_index[lake_id]
+        self.__reserve(self.__lakes, self.n_lakes, 1)
+        index = self.n_lakes
+        self.__lakes['lake_id'][index] = lake_id
+        self.__lakes['lake_area'][index] = lake_area
+        self.__lakes['covered_area'][index] = 0
+        self.__lake_index[lake_id] = index
+        self.n_lakes += 1
+        return index
+
+    def add_system(self, lake, latitude, longitude, system_area, max_power_MW, weather_cache=None,
+                   soiling_lookup=None, weather_store=None):
+        """
+        Registers a PV system.
+
+        Parameters
+        ----------
+        lake : int
+            Row of the lake of the system, -1 for a system without a lake.
+        latitude : float
+            Latitude of the PV system.
+        longitude : float
+            Longitude of the PV system.
+        system_area : float
+            Area covered by the PV system.
+        max_power_MW : float or None
+            Maximum power output of the PV system in megawatts.
+        weather_cache : WeatherCache, optional
+            Persistent cache for the TMY data (default is None).
+        soiling_lookup : SoilingLookup, optional
+            Soiling table of the system (default is None, use the built-in NS3031 table).
+        weather_store : WeatherStore, optional
+            Memory-mapped store of the TMY data, used instead of the cache and the online API
+            (default is None).
+
+        Returns
+        -------
+        int
+            Row of the system.
+        """
+        self.__reserve(self.__systems, self.n_systems, 1)
+        index = self.n_systems
+        row = {'lake': lake, 'latitude': latitude, 'longitude': longitude, 'system_area': system_area,
+               'max_power_MW': np.nan if max_power_MW is None else max_power_MW, 'raddatabase': None,
+               'weather_cache': weather_cache, 'soiling_lookup': soiling_lookup, 'weather_store': weather_store,
+               'stage_cache': None, 'result_cache': None, 'client': None}
+        for name, value in row.items():
+            self.__systems[name][index] = value
+        if lake >= 0:
+            self.__lakes['covered_area'][lake] += system_area
+        self.n_systems += 1
+        self.__lake_order = None
+        return index
+
+    def add_systems(self, dataframe, weather_cache=None, soiling_lookup=None, weather_store=None):
+        """
+        Registers the lakes and PV systems of a DataFrame in bulk.
+
+        A lake is created the first time its lake_id appears, with the lake_area of that row.
+
+        Parameters
+        ----------
+        dataframe : pd.DataFrame
+            DataFrame with the columns 'lake_id', 'lake_area', 'latitude', 'longitude',
+            'selected_area' and 'max_power_MW', one row per system.
+        weather_cache : WeatherCache, optional
+            Persistent cache for the TMY data of the systems (default is None).
+        soiling_lookup : SoilingLookup, optional
+            Soiling table of the systems (default is None, use the built-in NS3031 table).
+        weather_store : WeatherStore, optional
+            Memory-mapped store of the TMY data of the systems (default is None).
+        """
+        n = len(dataframe)
+        if n == 0:
+            return
+        # Factorize before converting to str, so only the unique ids are converted
+        codes, lake_ids = pd.factorize(dataframe['lake_id'], use_na_sentinel=False)
+        lake_ids = pd.Index(lake_ids).astype(str).to_numpy(dtype=object)
+        # The codes are numbered in order of appearance, so a row is the first of its
+        # lake when its code exceeds all codes before it
+        running_max = np.maximum.accumulate(codes)
+        first_rows = np.flatnonzero(np.concatenate(([True], codes[1:] > running_max[:-1])))
+        lake_area = dataframe['lake_area'].to_numpy(dtype=float)
+
+        # Find or create the lake of every unique lake_id, in order of appearance
+        lakes = np.empty(len(lake_ids), dtype=np.int64)
+        new = []
+        for code, lake_id in enumerate(lake_ids):
+            index = self.__lake_index.get(lake_id)
+            if index is None:
+                index = self.n_lakes + len(new)
+                self.__lake_index[lake_id] = index
+                new.append(code)
+            lakes[code] = index
+        if new:
+            self.__reserve(self.__lakes, self.n_lakes, len(new))
+            rows = slice(self.n_lakes, self.n_lakes + len(new))
+            self.__lakes['lake_id'][rows] = lake_ids[new]
+            self.__lakes['lake_area'][rows] = lake_area[first_rows[new]]
+            self.__lakes['covered_area'][rows] = 0
+            self.n_lakes += len(new)
+
+        system_area = dataframe['selected_area'].to_numpy(dtype=float)
+        self.__reserve(self.__systems, self.n_systems, n)
+        rows = slice(self.n_systems, self.n_systems + n)
+        self.__systems['lake'][rows] = lakes[codes]
+        self.__systems['latitude'][rows] = dataframe['latitude'].to_numpy(dtype=float)
+        self.__systems['longitude'][rows] = dataframe['longitude'].to_numpy(dtype=float)
+        self.__systems['system_area'][rows] = system_area
+        self.__systems['max_power_MW'][rows] = dataframe['max_power_MW'].to_numpy(dtype=float, na_value=np.nan)
+        self.__systems['raddatabase'][rows] = None
+        self.__systems['weather_cache'][rows] = weather_cache
+        self.__systems['soiling_lookup'][rows] = soiling_lookup
+        self.__systems['weather_store'][rows] = weather_store
+        self.__systems['stage_cache'][rows] = None
+        self.__systems['result_cache'][rows] = None
+        self.__systems['client'][rows] = None
+        self.__lakes['covered_area'][:self.n_lakes] += np.bincount(lakes[codes], weights=system_area,
+                                                                    minlength=self.n_lakes)
+        self.n_systems += n
+        self.__lake_order = None
+
+    def get_lake_systems(self, lake):
+        """
+        Returns the rows of the systems on a lake, in order of registration.
+
+        Parameters
+        ----------
+        lake : int
+            Row of the lake.
+
+        Returns
+        -------
+        numpy.ndarray
+            Rows of the systems on the lake.
+        """
+        if self.__lake_order is None:
+            # Group the systems by lake once, until the next registration
+            lake_column = self.get_system_column('lake')
+            order = np.argsort(lake_column, kind='stable')
+            bounds = np.searchsorted(lake_column[order], np.arange(self.n_lakes + 1))
+            self.__lake_order = (order, bounds)
+        order, bounds = self.__lake_order
+        return order[bounds[lake]:bounds[lake + 1]]
+
+    def subset(self, lakes):
+        """
+        Returns a new registry holding a copy of some lakes and their systems.
+
+        The stage caches of the systems are not copied, so the copy stays small to pickle.
+
+        Parameters
+        ----------
+        lakes : array-like
+            Rows of the lakes to copy.
+
+        Returns
+        -------
+        SystemRegistry
+            Registry with the lakes, in the given order, and their systems.
+        """
+        lakes = np.asarray(lakes, dtype=np.int64)
+        systems = (np.concatenate([self.get_lake_systems(lake) for lake in lakes])
+                   if len(lakes) else np.empty(0, dtype=np.int64))
+        registry = SystemRegistry()
+        registry.__lakes = {name: self.get_lake_column(name)[lakes] for name in lake_columns}
+        registry.__systems = {name: self.get_system_column(name)[systems] for name in system_columns}
+        # Renumber the lakes of the copied systems
+        new_lake = np.full(self.n_lakes, -1, dtype=np.int64)
+        new_lake[lakes] = np.arange(len(lakes))
+        registry.__systems['lake'] = new_lake[registry.__systems['lake']]
+        registry.__systems['stage_cache'][:] = None
+        registry.__lake_index = {lake_id: index for index, lake_id in enumerate(registry.__lakes['lake_id'])}
+        registry.n_lakes = len(lakes)
+        registry.n_systems = len(systems)
+        return registry
+
+
+class LakeMapping(Mapping):
+    """
+    A read-only mapping from lake_id to Lake views of a registry.
+    """
+    def __init__(self, registry):
+        self.__registry = registry
+
+    def __getitem__(self, lake_id):
+        from FPVsimulation.lake import Lake
+        index = self.__registry.get_lake_index(lake_id)
+        if index is None:
+            raise KeyError(lake_id)
+        return Lake.from_registry(self.__registry, index)
+
+    def __contains__(self, lake_id):
+        return self.__registry.get_lake_index(lake_id) is not None
+
+    def __iter__(self):
+        return iter(self.__registry.get_lake_column('lake_id'))
+
+    def __len__(self):
+        return self.__registry.n_lakes
+
+    def values(self):
+        from FPVsimulation.lake import Lake
+        return [Lake.from_registry(self.__registry, index) for index in range(self.__registry.n_lakes)]
+
+    def __repr__(self):
+        return f"LakeMapping({list(self)!r})"
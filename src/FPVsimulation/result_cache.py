@@ -0,0 +1,341 @@
+from collections import OrderedDict
+from copy import deepcopy
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from FPVsimulation.soiling_loss_NS3031 import get_default_soiling_lookup
+from FPVsimulation.solar_position import get_solar_position_method
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+# Version of the simulation results, part of every key so that results stored on disk by an
+# older version of the model are not reused
+result_cache_version = 1
+
+
+class ResultCache():
+    """
+    A class to represent a memory-bounded cache of simulation results, optionally backed by disk.
+
+    The simulation of a system is a pure function of its inputs, the PV model parameters, its
+    weather and its soiling table, so its results are memoized on a content hash of these, see
+    get_result_key. The least recently used results are evicted from memory when they exceed
+    `max_size_MB`. With a cache directory, every result is also stored in a pickle file, read
+    back by later runs and by worker processes, and the least recently used files are removed
+    when the directory exceeds `max_disk_MB`.
+
+    The results are returned as copies, so modifying them does not modify the cache. Only
+    use cache directories written by trusted runs, as their files are unpickled.
+
+    Attributes
+    ----------
+    max_size_MB : float
+        Maximum memory used by the cached results in megabytes.
+    cache_dir : str or None
+        Directory holding the cache files, None to keep the results in memory only.
+    max_disk_MB : float or None
+        Maximum total size of the cache files in megabytes, None for no limit.
+    hits : int
+        Number of lookups served from memory or disk.
+    misses : int
+        Number of lookups that computed the result.
+
+    Methods
+    -------
+    get(key, compute):
+        Returns a cached result, computing and storing it on a miss.
+    get_size():
+        Returns the memory used by the cached results in bytes.
+    clear():
+        Removes all results from memory and disk.
+    """
+    def __init__(self, max_size_MB=256, cache_dir=None, max_disk_MB=1000):
+        """
+        Constructs all the necessary attributes for the ResultCache object.
+
+        Parameters
+        ----------
+        max_size_MB : float, optional
+            Maximum memory used by the cached results in megabytes (default is 256).
+        cache_dir : str, optional
+            Directory holding the cache files, created if it does not exist (default is None,
+            memory only).
+        max_disk_MB : float or None, optional
+            Maximum total size of the cache files in megabytes (default is 1000).
+        """
+        self.max_size_MB = max_size_MB
+        self.cache_dir = cache_dir
+        self.max_disk_MB = max_disk_MB
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.__disk_size = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.__disk_size = sum(size for _, size, _ in self.__get_files())
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the ResultCache instance.
+        """
+        return (f"ResultCache(max_size_MB={self.max_size_MB}, cache_dir={self.cache_dir!r}, "
+                f"entries={len(self.__entries)})")
+
+    def __reduce__(self):
+        # Worker processes start with an empty memory and share the cache directory
+        return (ResultCache, (self.max_size_MB, self.cache_dir, self.max_disk_MB))
+
+    def get(self, key, compute):
+        """
+        Returns a cached result, computing and storing it on a miss.
+
+        Parameters
+        ----------
+        key : str
+            Key of the result, see get_result_key.
+        compute : callable
+            Function without arguments computing the result.
+
+        Returns
+        -------
+        object
+            A copy of the result.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            instrumentation.count('result_cache_hits')
+            return deepcopy(entry[0])
+
+        value = self.__read(key)
+        if value is not None:
+            instrumentation.count('result_cache_disk_hits')
+            with self.__lock:
+                self.hits += 1
+        else:
+            instrumentation.count('result_cache_misses')
+            value = compute()
+            with self.__lock:
+                self.misses += 1
+            self.__write(key, value)
+        self.__store(key, value)
+        return deepcopy(value)
+
+    def __store(self, key, value):
+        """
+        Stores a result in memory and evicts the least recently used results if needed.
+        """
+        size = _get_size(value)
+        with self.__lock:
+            if key in self.__entries:
+                return
+            self.__entries[key] = (value, size)
+            self.__size += size
+            while self.__size > self.max_size_MB * 1024**2 and len(self.__entries) > 1:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__size -= evicted_size
+
+    def __get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def __read(self, key):
+        """
+        Returns a result stored on disk, or None if it is not stored.
+        """
+        if self.cache_dir is None:
+            return None
+        path = self.__get_path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except (FileNotFoundError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # Mark the file as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def __write(self, key, value):
+        """
+        Stores a result on disk and evicts old files if needed.
+        """
+        if self.cache_dir is None:
+            return
+        # Write to a temporary file first so concurrent readers never see a partial result
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.__get_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.__disk_size += size
+        if self.max_disk_MB is not None and self.__disk_size > self.max_disk_MB * 1024**2:
+            self.__evict()
+
+    def __get_files(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def __evict(self):
+        """
+        Removes the least recently used files until the cache directory fits within max_disk_MB.
+        """
+        files = sorted(self.__get_files())
+        total_size = sum(size for _, size, _ in files)
+        max_size = self.max_disk_MB * 1024**2
+        for _, size, path in files:
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self.__disk_size = total_size
+
+    def get_size(self):
+        """
+        Returns the memory used by the cached results.
+
+        Returns
+        -------
+        int
+            Memory used by the cached results in bytes.
+        """
+        return self.__size
+
+    def clear(self):
+        """
+        Removes all results from memory and disk and resets the hit and miss counters.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+            self.hits = 0
+            self.misses = 0
+        if self.cache_dir is not None:
+            for _, _, path in self.__get_files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.__disk_size = 0
+
+
+def get_result_key(kind, system, PVparams, weather=None, options=()):
+    """
+    Returns a key identifying the result of a simulation by the content of its inputs.
+
+    The key covers the coordinates, area and maximum power of the system, the PV model
+    parameters, the identity of its weather, the solar position method and the content of its
+    soiling table. The weather is identified by the content of the given DataFrame, or else by
+    the weather store it is read from and the time the store was written, or by the weather
+    cache or online API it is retrieved from with the requested radiation databases and
+    horizon setting.
+
+    Parameters
+    ----------
+    kind : str
+        Kind of result, for example 'annual', 'summary' or 'hourly'.
+    system : PVsystem
+        The simulated system.
+    PVparams : dict
+        Parameters for the PV model.
+    weather : pandas.DataFrame, optional
+        Weather data given to the simulation (default is None, the weather of the system).
+    options : tuple, optional
+        Other arguments changing the result, such as the returned columns (default is ()).
+
+    Returns
+    -------
+    str
+        Hex digest of the inputs.
+    """
+    soiling_lookup = system.soiling_lookup
+    if soiling_lookup is None:
+        soiling_lookup = get_default_soiling_lookup()
+    max_power_MW = system.max_power_MW
+    inputs = [result_cache_version, kind, list(options), system.latitude, system.longitude, system.system_area,
+              max_power_MW, PVparams, _get_weather_identity(system, weather), get_solar_position_method()]
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=float).encode())
+    for array in (soiling_lookup.latitude, soiling_lookup.longitude, soiling_lookup.soiling):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def _get_weather_identity(system, weather):
+    """
+    Returns a JSON serializable identity of the weather of a system.
+    """
+    if weather is not None:
+        digest = hashlib.sha256(pd.util.hash_pandas_object(weather, index=True).to_numpy().tobytes())
+        digest.update('\0'.join(map(str, weather.columns)).encode())
+        return ['DataFrame', digest.hexdigest()]
+    return get_weather_identity(system.weather_store, system.weather_cache, system.get_client())
+
+
+def get_weather_identity(weather_store, weather_cache, client):
+    """
+    Returns a JSON serializable identity of the weather source of a system.
+
+    Parameters
+    ----------
+    weather_store : WeatherStore or None
+        Memory-mapped store of the TMY data, identified by its directory and write time.
+    weather_cache : WeatherCache or None
+        Persistent cache for the TMY data, identified by its directory and grid.
+    client : PVGISclient
+        Client for the PVGIS API, identified by its radiation databases and horizon setting.
+
+    Returns
+    -------
+    list
+        Identity of the store, or else of the cache, or else of the online API.
+    """
+    if weather_store is not None:
+        store_dir = weather_store.store_dir
+        return ['WeatherStore', os.path.realpath(store_dir),
+                os.stat(os.path.join(store_dir, 'index.json')).st_mtime_ns]
+    if weather_cache is not None:
+        return ['WeatherCache', os.path.realpath(weather_cache.cache_dir), weather_cache.grid_resolution,
+                list(client.raddatabases), client.usehorizon]
+    return ['PVGIS', client.api_url, list(client.raddatabases), client.usehorizon]
+
+
+def _get_size(value):
+    """
+    Estimates the memory used by a result in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True)))
+    if isinstance(value, (dict, list, tuple)):
+        items = value.values() if isinstance(value, dict) else value
+        return sys.getsizeof(value) + sum(_get_size(item) for item in items)
+    return sys.getsizeof(value)
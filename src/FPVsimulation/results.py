@@ -0,0 +1,350 @@
+import hashlib
+import json
+import os
+from FPVsimulation.pvgis import get_default_client
+from FPVsimulation.result_cache import get_weather_identity
+from FPVsimulation.soiling_loss_NS3031 import get_default_soiling_lookup
+from FPVsimulation.solar_position import get_solar_position_method
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+
+class CSVResultSink():
+    """
+    A class to append simulation results to a CSV file in batches.
+
+    Attributes
+    ----------
+    path : str
+        Path of the CSV file.
+
+    Methods
+    -------
+    write(result_df):
+        Appends a batch of results to the file.
+    get_position():
+        Returns the current end of the written results.
+    truncate(position):
+        Discards the results written after a position.
+    read():
+        Reads all written results.
+    """
+    def __init__(self, path):
+        """
+        Constructs all the necessary attributes for the CSVResultSink object.
+
+        Parameters
+        ----------
+        path : str
+            Path of the CSV file, appended to if it exists.
+        """
+        self.path = path
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the CSVResultSink instance.
+        """
+        return f"CSVResultSink(path={self.path!r})"
+
+    def write(self, result_df):
+        """
+        Appends a batch of results to the file, writing the header if the file is empty.
+
+        Parameters
+        ----------
+        result_df : pd.DataFrame
+            Batch of results.
+        """
+        header = self.get_position() == 0
+        with open(self.path, 'a', newline='') as file:
+            result_df.to_csv(file, header=header, index=False)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def get_position(self):
+        """
+        Returns the current end of the written results.
+
+        Returns
+        -------
+        int
+            Size of the file in bytes.
+        """
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def truncate(self, position):
+        """
+        Discards the results written after a position.
+
+        Parameters
+        ----------
+        position : int
+            Position returned by get_position.
+        """
+        if os.path.exists(self.path):
+            os.truncate(self.path, position)
+
+    def read(self):
+        """
+        Reads all written results.
+
+        Returns
+        -------
+        pd.DataFrame
+            The written results, with the lake_id read as str and the floats read back exactly.
+        """
+        return pd.read_csv(self.path, dtype={'lake_id': str}, float_precision='round_trip')
+
+
+class ParquetResultSink():
+    """
+    A class to write simulation results to a directory of Parquet files, one file per batch.
+
+    Writing Parquet requires pyarrow or fastparquet.
+
+    Attributes
+    ----------
+    directory : str
+        Directory of the Parquet files.
+
+    Methods
+    -------
+    write(result_df):
+        Writes a batch of results to a new file.
+    get_position():
+        Returns the number of written files.
+    truncate(position):
+        Discards the files written after a position.
+    read():
+        Reads all written results.
+    """
+    def __init__(self, directory):
+        """
+        Constructs all the necessary attributes for the ParquetResultSink object.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the Parquet files, created if it does not exist.
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the ParquetResultSink instance.
+        """
+        return f"ParquetResultSink(directory={self.directory!r})"
+
+    def __get_parts(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('part-') and name.endswith('.parquet'))
+
+    def write(self, result_df):
+        """
+        Writes a batch of results to a new file.
+
+        Parameters
+        ----------
+        result_df : pd.DataFrame
+            Batch of results.
+        """
+        path = os.path.join(self.directory, f'part-{self.get_position():06d}.parquet')
+        result_df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def get_position(self):
+        """
+        Returns the number of written files.
+
+        Returns
+        -------
+        int
+            Number of Parquet files in the directory.
+        """
+        return len(self.__get_parts())
+
+    def truncate(self, position):
+        """
+        Discards the files written after a position.
+
+        Parameters
+        ----------
+        position : int
+            Position returned by get_position.
+        """
+        for name in self.__get_parts()[position:]:
+            os.remove(os.path.join(self.directory, name))
+
+    def read(self):
+        """
+        Reads all written results.
+
+        Returns
+        -------
+        pd.DataFrame
+            The written results.
+        """
+        parts = [pd.read_parquet(os.path.join(self.directory, name)) for name in self.__get_parts()]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+class Checkpoint():
+    """
+    A class to record which lakes of a run are completed, for resuming an interrupted run.
+
+    The manifest is a JSON-lines file. The first line holds a fingerprint of the run inputs,
+    and every following line lists the lakes of one batch together with the position of the
+    result sink after the batch was written. A run with other inputs refuses to resume from
+    the manifest.
+
+    Attributes
+    ----------
+    path : str
+        Path of the manifest file.
+    fingerprint : str
+        Fingerprint of the run inputs.
+    completed_lakes : set
+        Identifiers of the completed lakes.
+    sink_position : int
+        Position of the result sink after the last completed batch.
+
+    Methods
+    -------
+    mark_completed(lake_ids, sink_position):
+        Records a batch of completed lakes.
+    """
+    def __init__(self, path, fingerprint):
+        """
+        Loads the manifest, or creates it if it does not exist.
+
+        The manifest is created atomically, and an empty manifest or one with an unreadable
+        header, as left by an older interrupted run, is created again.
+
+        Parameters
+        ----------
+        path : str
+            Path of the manifest file.
+        fingerprint : str
+            Fingerprint of the run inputs, see get_fingerprint.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.completed_lakes = set()
+        self.sink_position = 0
+
+        lines = []
+        if os.path.exists(path):
+            with open(path) as file:
+                lines = file.readlines()
+        header = self.__read_header(lines)
+        if header is None:
+            # A missing, empty or torn manifest has no completed lakes
+            self.__write_header()
+            return
+
+        if header.get('fingerprint') != fingerprint:
+            raise ValueError(f"The checkpoint {path} was written by a run with other inputs")
+        for line in lines[1:]:
+            try:
+                batch = json.loads(line)
+            except json.JSONDecodeError:
+                # A batch interrupted while being recorded is not completed
+                break
+            self.completed_lakes.update(batch['lakes'])
+            self.sink_position = batch['sink_position']
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the Checkpoint instance.
+        """
+        return f"Checkpoint(path={self.path!r}, completed_lakes={len(self.completed_lakes)})"
+
+    @staticmethod
+    def __read_header(lines):
+        """
+        Returns the header of the manifest, or None if it is missing or unreadable.
+        """
+        if not lines or not lines[0].endswith('\n'):
+            return None
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError:
+            return None
+        return header if isinstance(header, dict) else None
+
+    def __write_header(self):
+        """
+        Writes a new manifest holding only the fingerprint, atomically.
+        """
+        with open(self.path + '.tmp', 'w') as file:
+            file.write(json.dumps({'fingerprint': self.fingerprint}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.path + '.tmp', self.path)
+
+    def mark_completed(self, lake_ids, sink_position):
+        """
+        Records a batch of completed lakes.
+
+        Parameters
+        ----------
+        lake_ids : list
+            Identifiers of the completed lakes.
+        sink_position : int
+            Position of the result sink after the results of the lakes were written.
+        """
+        with open(self.path, 'a') as file:
+            file.write(json.dumps({'lakes': list(lake_ids), 'sink_position': sink_position}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.completed_lakes.update(lake_ids)
+        self.sink_position = sink_position
+
+
+def get_fingerprint(registry, PVparams):
+    """
+    Returns a fingerprint of the inputs of a run.
+
+    Parameters
+    ----------
+    registry : SystemRegistry
+        Registry of the lakes and PV systems.
+    PVparams : dict
+        Parameters for the PV model.
+
+    Returns
+    -------
+    str
+        Hex digest of the lakes, the systems, the parameters, the solar position method, and
+        the weather source and soiling table of every system, hashed like
+        result_cache.get_result_key.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([PVparams, get_solar_position_method()], sort_keys=True, default=float).encode())
+    digest.update('\0'.join(map(str, registry.get_lake_column('lake_id'))).encode())
+    digest.update(np.ascontiguousarray(registry.get_lake_column('lake_area')).tobytes())
+    for name in ('lake', 'latitude', 'longitude', 'system_area', 'max_power_MW'):
+        digest.update(np.ascontiguousarray(registry.get_system_column(name)).tobytes())
+
+    # The weather sources and soiling tables are shared by many systems, so each distinct
+    # combination is hashed once and the systems by the number of their combination
+    sources = {}
+    codes = np.empty(registry.n_systems, dtype=np.int64)
+    columns = [registry.get_system_column(name) for name in ('weather_store', 'weather_cache', 'client',
+                                                              'soiling_lookup')]
+    for row, source in enumerate(zip(*columns)):
+        codes[row] = sources.setdefault(tuple(map(id, source)), (len(sources), source))[0]
+    digest.update(codes.tobytes())
+    for _, (weather_store, weather_cache, client, soiling_lookup) in sources.values():
+        if client is None:
+            client = get_default_client()
+        if soiling_lookup is None:
+            soiling_lookup = get_default_soiling_lookup()
+        identity = get_weather_identity(weather_store, weather_cache, client)
+        digest.update(json.dumps(identity, sort_keys=True, default=float).encode())
+        for array in (soiling_lookup.latitude, soiling_lookup.longitude, soiling_lookup.soiling):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
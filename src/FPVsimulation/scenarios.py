@@ -0,0 +1,165 @@
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.batch import PVsystemBatch
+from FPVsimulation.registry import SystemRegistry
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+# Columns of a scenario input, as for FPVsimulation.register_lakes
+scenario_columns = ('lake_id', 'lake_area', 'latitude', 'longitude', 'selected_area', 'max_power_MW')
+
+
+def get_unique_locations(scenarios):
+    """
+    Finds the unique coordinates of the systems of several scenarios.
+
+    Parameters
+    ----------
+    scenarios : dict
+        DataFrame of the systems of each scenario, with 'latitude' and 'longitude' columns.
+
+    Returns
+    -------
+    tuple
+        Latitude and longitude of each unique location, and the location of every system of
+        each scenario as a dict of arrays.
+    """
+    coordinates = np.concatenate([np.column_stack((scenario_df['latitude'].to_numpy(dtype=float),
+                                                   scenario_df['longitude'].to_numpy(dtype=float)))
+                                  for scenario_df in scenarios.values()]) if scenarios else np.empty((0, 2))
+    locations, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    bounds = np.cumsum([0] + [len(scenario_df) for scenario_df in scenarios.values()])
+    system_locations = {name: inverse[start:stop] for name, start, stop in zip(scenarios, bounds[:-1], bounds[1:])}
+    return locations[:, 0], locations[:, 1], system_locations
+
+
+def get_location_arrays(latitudes, longitudes, PVparams=default_PVmodel_parameters, weather_cache=None,
+                        soiling_lookup=None, weather_store=None, max_batch_elements=2*10**7):
+    """
+    Simulates one square meter without power limit at each location.
+
+    Parameters
+    ----------
+    latitudes : numpy.ndarray
+        Latitude of each location.
+    longitudes : numpy.ndarray
+        Longitude of each location.
+    PVparams : dict, optional
+        Parameters for the PV model (default is default_PVmodel_parameters).
+    weather_cache : WeatherCache, optional
+        Persistent cache for the TMY data (default is None).
+    soiling_lookup : SoilingLookup, optional
+        Soiling table (default is None, use the built-in NS3031 table).
+    weather_store : WeatherStore, optional
+        Memory-mapped store of the TMY data (default is None).
+    max_batch_elements : int, optional
+        Maximum number of elements of the hours x locations arrays evaluated at once,
+        bounding the memory use (default is 2*10**7).
+
+    Returns
+    -------
+    dict
+        'annual_energy_yield_kWh' and 'peak_power_W' of one square meter and 'raddatabase' at
+        each location.
+    """
+    n_locations = len(latitudes)
+    locations = SystemRegistry()
+    for latitude, longitude in zip(latitudes, longitudes):
+        locations.add_system(-1, latitude, longitude, 1.0, None, weather_cache, soiling_lookup, weather_store)
+    instrumentation.count('locations', n_locations)
+
+    annual_yield_m2 = np.empty(n_locations)
+    peak_power_m2 = np.empty(n_locations)
+    raddatabase = np.empty(n_locations, dtype=object)
+    batch_size = max(1, max_batch_elements // 8760)
+    for start in range(0, n_locations, batch_size):
+        batch = PVsystemBatch([PVsystem.from_registry(locations, i)
+                               for i in range(start, min(start + batch_size, n_locations))])
+        stop = start + len(batch.systems)
+        weather = batch.get_weather_arrays()
+        power_m2 = batch.get_simulation_arrays(PVparams, weather)['Power_out_W']
+        annual_yield_m2[start:stop] = power_m2.sum(axis=0) / 1_000
+        peak_power_m2[start:stop] = power_m2.max(axis=0)
+        raddatabase[start:stop] = weather['raddatabase']
+    return {'annual_energy_yield_kWh': annual_yield_m2,
+            'peak_power_W': peak_power_m2,
+            'raddatabase': raddatabase}
+
+
+def get_scenario_energy_yield(scenarios, PVparams=default_PVmodel_parameters, weather_cache=None,
+                              soiling_lookup=None, weather_store=None, max_batch_elements=2*10**7):
+    """
+    Calculates the annual energy yield of the systems of several scenarios, sharing the work across them.
+
+    The scenarios of the area selection cover heavily overlapping lakes, so the systems of all
+    scenarios are gathered by their coordinates. The weather, solar position, plane of array
+    irradiance, PV model, soiling and derate stages are evaluated once per unique location for
+    one square meter, see get_location_arrays, and only the area scaling and the maximum power
+    clipping are evaluated per system and scenario. The results equal those of a separate
+    FPVsimulation per scenario up to floating point rounding.
+
+    Parameters
+    ----------
+    scenarios : dict
+        DataFrame of the systems of each scenario, keyed by the scenario name, with the columns
+        of FPVsimulation.register_lakes.
+    PVparams : dict, optional
+        Parameters for the PV model (default is default_PVmodel_parameters).
+    weather_cache : WeatherCache, optional
+        Persistent cache for the TMY data (default is None).
+    soiling_lookup : SoilingLookup, optional
+        Soiling table (default is None, use the built-in NS3031 table).
+    weather_store : WeatherStore, optional
+        Memory-mapped store of the TMY data (default is None).
+    max_batch_elements : int, optional
+        Maximum number of elements of the hours x locations arrays evaluated at once,
+        bounding the memory use (default is 2*10**7).
+
+    Returns
+    -------
+    dict
+        DataFrame of each scenario, in the order of its rows, with the columns of
+        FPVsimulation.get_annual_energy_yield.
+
+    Raises
+    ------
+    KeyError
+        If a scenario misses some of the scenario_columns.
+    """
+    for name, scenario_df in scenarios.items():
+        missing = [column for column in scenario_columns if column not in scenario_df.columns]
+        if missing:
+            raise KeyError(f"The scenario {name} misses the columns {missing}")
+
+    latitudes, longitudes, system_locations = get_unique_locations(scenarios)
+    locations = get_location_arrays(latitudes, longitudes, PVparams, weather_cache, soiling_lookup, weather_store,
+                                    max_batch_elements)
+
+    result_dfs = {}
+    with instrumentation.stage('scenarios'):
+        for name, scenario_df in scenarios.items():
+            location = system_locations[name]
+            # Scale every system to its area and clip it to its maximum power
+            system_area = scenario_df['selected_area'].to_numpy(dtype=float)
+            max_power_W = scenario_df['max_power_MW'].to_numpy(dtype=float, na_value=np.nan) * 10**6
+            P_peak = system_area * locations['peak_power_W'][location]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scale = np.where(P_peak > max_power_W, max_power_W / P_peak, 1.0)
+            effective_area = system_area * scale
+            # The lake ids are strings, as in the registry of an FPVsimulation
+            result_dfs[name] = pd.DataFrame({'lake_id': scenario_df['lake_id'].astype(str).to_numpy(dtype=object),
+                                             'lake_area': scenario_df['lake_area'].to_numpy(),
+                                             'system_area': system_area,
+                                             'latitude': latitudes[location],
+                                             'longitude': longitudes[location],
+                                             'annual_energy_yield_kWh':
+                                                 effective_area * locations['annual_energy_yield_kWh'][location],
+                                             'raddata': locations['raddatabase'][location],
+                                             'effective_area': effective_area,
+                                             'clipped': scale < 1})
+            instrumentation.count('systems', len(scenario_df))
+    return result_dfs
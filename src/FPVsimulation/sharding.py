@@ -0,0 +1,487 @@
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.results import CSVResultSink
+from FPVsimulation.solar_position import set_solar_position_method
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import numpy as np
+
+pd = lazy_import('pandas')
+
+# Version of the manifest format
+manifest_version = 1
+
+
+def get_shards(lake_ids, n_shards):
+    """
+    Assigns lakes to shards by a hash of their lake_id.
+
+    The hash does not depend on the process, the host or the order of the lakes, so every
+    node assigns a lake to the same shard.
+
+    Parameters
+    ----------
+    lake_ids : array-like
+        Identifiers of the lakes, compared as str.
+    n_shards : int
+        Number of shards.
+
+    Returns
+    -------
+    numpy.ndarray
+        Shard of each lake, between 0 and n_shards - 1.
+    """
+    codes, unique_ids = pd.factorize(pd.Index(lake_ids).astype(str), use_na_sentinel=False)
+    shards = np.array([int.from_bytes(hashlib.md5(lake_id.encode()).digest()[:8], 'big') % n_shards
+                       for lake_id in unique_ids], dtype=np.int64)
+    return shards[codes]
+
+
+class ShardManifest():
+    """
+    A class to split the simulation of the lakes of a CSV file into shards run on several nodes.
+
+    The manifest is a JSON file holding the path of the lakes file, the number of shards, the
+    PV model parameters, the weather sources and a fingerprint of these inputs. It is written
+    once on a shared filesystem, and every node then opens it and runs shards: it claims a shard
+    by creating its claim file, simulates the lakes of the shard, see get_shards, and streams the
+    results to a partial CSV file with a checkpoint, so an interrupted shard resumes where it
+    stopped. A completed shard is recorded in a done file. Once all shards are done, merge checks
+    the partial results against the manifest and combines them in the order of the lakes file.
+
+    Paths in the manifest are stored relative to its directory, so the nodes may mount the
+    shared filesystem at different places.
+
+    Attributes
+    ----------
+    path : str
+        Path of the manifest file.
+    directory : str
+        Directory of the manifest and of the partial results.
+    lakes_path : str
+        Path of the CSV file of the lakes, with the columns of FPVsimulation.register_lakes.
+    n_shards : int
+        Number of shards.
+    PVparams : dict
+        Parameters for the PV model.
+    weather_cache_dir : str or None
+        Directory of the persistent TMY cache.
+    weather_store_dir : str or None
+        Directory of the memory-mapped weather store.
+    offline : bool
+        If True, the weather cache never falls back to the network.
+    batch_size : int
+        Number of lakes written to a partial result file at a time.
+    solar_position_method : str
+        Solar position algorithm, 'spa' or 'meeus'.
+    fingerprint : str
+        Hex digest of the lakes file, the number of shards, the PV model parameters and the
+        solar position algorithm.
+
+    Methods
+    -------
+    create(path, lakes_path, n_shards, PVparams=default_PVmodel_parameters, weather_cache_dir=None,
+           weather_store_dir=None, offline=False, batch_size=100, solar_position_method='spa'):
+        Writes a manifest and opens it.
+    get_partial_path(shard):
+        Returns the path of the partial result file of a shard.
+    get_status():
+        Returns the state of every shard.
+    claim_shard():
+        Claims a shard that is neither claimed nor done.
+    run_shard(shard, n_workers=1, progress_callback=None):
+        Simulates the lakes of a shard.
+    run_node(n_workers=1, progress_callback=None):
+        Claims and runs shards until none is left.
+    merge():
+        Checks and combines the partial results of all shards.
+    """
+    def __init__(self, path):
+        """
+        Opens a manifest.
+
+        Parameters
+        ----------
+        path : str
+            Path of the manifest file.
+
+        Raises
+        ------
+        ValueError
+            If the manifest was written by another version of the format.
+        """
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        with open(path) as file:
+            manifest = json.load(file)
+        if manifest.get('version') != manifest_version:
+            raise ValueError(f"Unsupported shard manifest version: {manifest.get('version')}")
+        self.lakes_path = self.__resolve(manifest['lakes_path'])
+        self.n_shards = manifest['n_shards']
+        self.PVparams = manifest['PVparams']
+        self.weather_cache_dir = self.__resolve(manifest['weather_cache_dir'])
+        self.weather_store_dir = self.__resolve(manifest['weather_store_dir'])
+        self.offline = manifest['offline']
+        self.batch_size = manifest['batch_size']
+        self.solar_position_method = manifest['solar_position_method']
+        self.fingerprint = manifest['fingerprint']
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the ShardManifest instance.
+        """
+        return f"ShardManifest(path={self.path!r}, n_shards={self.n_shards})"
+
+    def __resolve(self, path):
+        return None if path is None else os.path.normpath(os.path.join(self.directory, path))
+
+    @classmethod
+    def create(cls, path, lakes_path, n_shards, PVparams=default_PVmodel_parameters, weather_cache_dir=None,
+               weather_store_dir=None, offline=False, batch_size=100, solar_position_method='spa'):
+        """
+        Writes a manifest and opens it.
+
+        Parameters
+        ----------
+        path : str
+            Path of the manifest file. Its directory holds the partial results and is created
+            if it does not exist.
+        lakes_path : str
+            Path of the CSV file of the lakes, on the shared filesystem.
+        n_shards : int
+            Number of shards.
+        PVparams : dict, optional
+            Parameters for the PV model (default is default_PVmodel_parameters).
+        weather_cache_dir : str, optional
+            Directory of the persistent TMY cache (default is None).
+        weather_store_dir : str, optional
+            Directory of the memory-mapped weather store (default is None).
+        offline : bool, optional
+            If True, never fetch missing TMY data from the network (default is False).
+        batch_size : int, optional
+            Number of lakes written to a partial result file at a time (default is 100).
+        solar_position_method : str, optional
+            Solar position algorithm of the nodes, 'spa' or 'meeus' (default is 'spa').
+
+        Returns
+        -------
+        ShardManifest
+            The opened manifest.
+
+        Raises
+        ------
+        ValueError
+            If the number of shards is not positive, or a manifest with other inputs exists at
+            `path`, as its partial results would be mixed with the new ones.
+        """
+        if n_shards < 1:
+            raise ValueError(f"The number of shards must be positive, not {n_shards}")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        def relative(other):
+            return None if other is None else os.path.relpath(os.path.abspath(other), directory)
+        PVparams = dict(PVparams)
+        manifest = {'version': manifest_version,
+                    'lakes_path': relative(lakes_path),
+                    'n_shards': n_shards,
+                    'PVparams': PVparams,
+                    'weather_cache_dir': relative(weather_cache_dir),
+                    'weather_store_dir': relative(weather_store_dir),
+                    'offline': offline,
+                    'batch_size': batch_size,
+                    'solar_position_method': solar_position_method,
+                    'fingerprint': _get_fingerprint(lakes_path, n_shards, PVparams, solar_position_method)}
+        if os.path.exists(path):
+            with open(path) as file:
+                if json.load(file) != manifest:
+                    raise ValueError(f"A shard manifest with other inputs exists at {path}")
+            return cls(path)
+        _write_json(path, manifest)
+        return cls(path)
+
+    def __get_shard_path(self, shard, suffix):
+        return os.path.join(self.directory, f"shard-{shard:05d}-of-{self.n_shards:05d}{suffix}")
+
+    def get_partial_path(self, shard):
+        """
+        Returns the path of the partial result file of a shard.
+
+        Parameters
+        ----------
+        shard : int
+            The shard.
+
+        Returns
+        -------
+        str
+            Path of the CSV file of the results of the shard.
+        """
+        return self.__get_shard_path(shard, '.csv')
+
+    def __read_done(self, shard):
+        try:
+            with open(self.__get_shard_path(shard, '.done.json')) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get_status(self):
+        """
+        Returns the state of every shard.
+
+        Returns
+        -------
+        list of str
+            'done', 'claimed' or 'pending' for each shard.
+        """
+        status = []
+        for shard in range(self.n_shards):
+            if self.__read_done(shard) is not None:
+                status.append('done')
+            elif os.path.exists(self.__get_shard_path(shard, '.claim')):
+                status.append('claimed')
+            else:
+                status.append('pending')
+        return status
+
+    def claim_shard(self):
+        """
+        Claims a shard that is neither claimed nor done.
+
+        The claim file is created atomically, so two nodes never claim the same shard. The
+        claim of a node that stopped is not released: run its shard with run_shard, which
+        resumes from the checkpoint of the shard.
+
+        Returns
+        -------
+        int or None
+            The claimed shard, None if every shard is claimed or done.
+        """
+        for shard, status in enumerate(self.get_status()):
+            if status != 'pending':
+                continue
+            try:
+                fd = os.open(self.__get_shard_path(shard, '.claim'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'w') as file:
+                file.write(json.dumps({'host': os.uname().nodename if hasattr(os, 'uname') else None,
+                                       'pid': os.getpid()}))
+            return shard
+        return None
+
+    def __read_lakes(self):
+        """
+        Reads the lakes file and checks that it did not change since the manifest was written.
+        """
+        if (_get_fingerprint(self.lakes_path, self.n_shards, self.PVparams, self.solar_position_method) !=
+                self.fingerprint):
+            raise ValueError(f"The lakes file {self.lakes_path} changed since the manifest was written")
+        return pd.read_csv(self.lakes_path, dtype={'lake_id': str})
+
+    def run_shard(self, shard, n_workers=1, progress_callback=None):
+        """
+        Simulates the lakes of a shard and writes them to its partial result file.
+
+        The solar position algorithm of the manifest is selected for this process, see
+        solar_position.set_solar_position_method.
+
+        Parameters
+        ----------
+        shard : int
+            The shard, between 0 and n_shards - 1.
+        n_workers : int or None, optional
+            Number of worker processes of this node, see FPVsimulation.get_annual_energy_yield
+            (default is 1).
+        progress_callback : callable, optional
+            Function called with a progress dictionary after each lake (default is None).
+
+        Returns
+        -------
+        int
+            Number of systems of the shard.
+
+        Raises
+        ------
+        ValueError
+            If the lakes file changed since the manifest was written.
+        """
+        from FPVsimulation.simulation import FPVsimulation
+        from FPVsimulation.weather_cache import WeatherCache
+        from FPVsimulation.weather_store import WeatherStore
+
+        lakes_df = self.__read_lakes()
+        shard_df = lakes_df[get_shards(lakes_df['lake_id'], self.n_shards) == shard]
+        weather_cache = (None if self.weather_cache_dir is None else
+                         WeatherCache(self.weather_cache_dir, offline=self.offline))
+        weather_store = None if self.weather_store_dir is None else WeatherStore(self.weather_store_dir)
+        set_solar_position_method(self.solar_position_method)
+        simulation = FPVsimulation(weather_cache=weather_cache, weather_store=weather_store)
+        simulation.set_PVmodel_parameters(self.PVparams)
+        simulation.register_lakes(shard_df)
+
+        with instrumentation.stage('shard'):
+            simulation.run_to_sink(CSVResultSink(self.get_partial_path(shard)),
+                                   self.__get_shard_path(shard, '.checkpoint.jsonl'), self.batch_size,
+                                   n_workers, progress_callback=progress_callback)
+        _write_json(self.__get_shard_path(shard, '.done.json'),
+                    {'shard': shard, 'fingerprint': self.fingerprint,
+                     'n_lakes': simulation.registry.n_lakes, 'n_systems': simulation.registry.n_systems,
+                     'sha256': _get_file_digest(self.get_partial_path(shard))})
+        instrumentation.count('shards')
+        return simulation.registry.n_systems
+
+    def run_node(self, n_workers=1, progress_callback=None):
+        """
+        Claims and runs shards until every shard is claimed or done.
+
+        Parameters
+        ----------
+        n_workers : int or None, optional
+            Number of worker processes of this node (default is 1).
+        progress_callback : callable, optional
+            Function called with a progress dictionary after each lake (default is None).
+
+        Returns
+        -------
+        list of int
+            The shards run by this node.
+        """
+        shards = []
+        shard = self.claim_shard()
+        while shard is not None:
+            self.run_shard(shard, n_workers, progress_callback)
+            shards.append(shard)
+            shard = self.claim_shard()
+        return shards
+
+    def merge(self):
+        """
+        Checks and combines the partial results of all shards.
+
+        Every shard must be done with the inputs of the manifest, its partial result file must
+        be unchanged since the shard was done, and hold exactly the systems of the lakes
+        assigned to it. The results are returned in the order of get_annual_energy_yield of
+        one FPVsimulation of the whole lakes file.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The annual energy yield of every system, with the columns of
+            FPVsimulation.get_annual_energy_yield.
+
+        Raises
+        ------
+        ValueError
+            If some shards are not done, were run with other inputs, or their partial results
+            are missing, changed or do not match the lakes assigned to them.
+        """
+        lakes_df = self.__read_lakes()
+        shards = get_shards(lakes_df['lake_id'], self.n_shards)
+        not_done = []
+        partial_dfs = []
+        for shard in range(self.n_shards):
+            done = self.__read_done(shard)
+            if done is None:
+                not_done.append(shard)
+                continue
+            if done['fingerprint'] != self.fingerprint:
+                raise ValueError(f"Shard {shard} was run with other inputs than the manifest")
+            partial_path = self.get_partial_path(shard)
+            if done['n_systems'] and not os.path.exists(partial_path):
+                raise ValueError(f"The partial results of shard {shard} are missing")
+            if done['n_systems'] and _get_file_digest(partial_path) != done.get('sha256'):
+                raise ValueError(f"The partial results of shard {shard} changed since the shard was done")
+            partial_df = (CSVResultSink(partial_path).read() if done['n_systems']
+                          else pd.DataFrame(columns=['lake_id']))
+            expected = lakes_df['lake_id'][shards == shard]
+            if len(partial_df) != len(expected) or len(partial_df) != done['n_systems']:
+                raise ValueError(f"Shard {shard} holds {len(partial_df)} systems instead of {len(expected)}")
+            if set(partial_df['lake_id']) != set(expected):
+                raise ValueError(f"Shard {shard} does not hold the lakes assigned to it")
+            partial_dfs.append(partial_df)
+        if not_done:
+            raise ValueError(f"The shards {not_done} are not done")
+
+        result_df = pd.concat([partial_df for partial_df in partial_dfs if len(partial_df)], ignore_index=True)
+        # Sort the lakes in order of appearance, keeping the order of the systems of each lake
+        lake_order = {lake_id: i for i, lake_id in enumerate(pd.unique(lakes_df['lake_id']))}
+        order = np.argsort(result_df['lake_id'].map(lake_order).to_numpy(), kind='stable')
+        return result_df.iloc[order].reset_index(drop=True)
+
+
+def run_local(manifest_path, n_nodes, n_workers=1):
+    """
+    Runs all shards of a manifest on this machine, with worker processes acting as nodes.
+
+    Every process opens the manifest and runs ShardManifest.run_node, as a separate host would.
+
+    Parameters
+    ----------
+    manifest_path : str
+        Path of the manifest file.
+    n_nodes : int
+        Number of node processes.
+    n_workers : int, optional
+        Number of worker processes of each node (default is 1).
+
+    Returns
+    -------
+    list of list of int
+        The shards run by each node.
+    """
+    with ProcessPoolExecutor(max_workers=n_nodes) as executor:
+        return list(executor.map(_run_node, [manifest_path]*n_nodes, [n_workers]*n_nodes))
+
+
+def _run_node(manifest_path, n_workers):
+    """
+    Runs the shards claimed by one node process.
+    """
+    return ShardManifest(manifest_path).run_node(n_workers)
+
+
+def _get_fingerprint(lakes_path, n_shards, PVparams, solar_position_method):
+    """
+    Returns the hex digest of the lakes file, the number of shards, the PV model parameters and
+    the solar position algorithm.
+    """
+    digest = hashlib.sha256()
+    _update_digest(digest, lakes_path)
+    digest.update(json.dumps([n_shards, PVparams, solar_position_method], sort_keys=True, default=float).encode())
+    return digest.hexdigest()
+
+
+def _get_file_digest(path):
+    """
+    Returns the hex digest of a file, None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    _update_digest(digest, path)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, path):
+    """
+    Adds the content of a file to a digest, in blocks.
+    """
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            digest.update(block)
+
+
+def _write_json(path, data):
+    """
+    Writes a JSON file atomically, so other nodes never read a partial file.
+    """
+    with open(path + '.tmp', 'w') as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
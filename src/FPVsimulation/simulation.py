@@ -1,7 +1,24 @@
-from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.pvmodel import default_PVmodel_parameters, get_module_performance_buffers
 from FPVsimulation.lake import Lake
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.clustering import cluster_systems, get_distance_km
+from FPVsimulation.batch import PVsystemBatch, get_poa_arrays, get_power_arrays
+from FPVsimulation.multiyear import get_exceedance_statistics, get_multiyear_arrays, iter_store_years
+from FPVsimulation.registry import LakeMapping, SystemRegistry
+from FPVsimulation.pvgis import get_default_client
+from FPVsimulation.results import Checkpoint, CSVResultSink, get_fingerprint
+from FPVsimulation.soiling_loss_NS3031 import SoilingLookup, get_default_soiling_lookup
+from FPVsimulation.stages import StageCache
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
-import pandas as pd
+from itertools import product
+import os
+import time
+import numpy as np
+
+pd = lazy_import('pandas')
 
 
 class FPVsimulation():
@@ -10,33 +27,101 @@ class FPVsimulation():
 
     Attributes
     ----------
-    lakes : dict
-        Dictionary to store Lake objects, keyed by lake ID.
+    registry : SystemRegistry
+        Columnar storage of the registered lakes and PV systems.
+    lakes : Mapping
+        Read-only mapping of Lake views of the registry, keyed by lake ID.
     PVmodel_parameters : dict
         Dictionary to store parameters for the PV model, initialized with default values.
+    weather_cache : WeatherCache or None
+        Persistent cache for the TMY data shared by all registered systems.
+    soiling_lookup : SoilingLookup or None
+        Soiling table shared by all registered systems, None for the built-in NS3031 table.
+    weather_store : WeatherStore or None
+        Memory-mapped store of the TMY data shared by all registered systems.
+    stage_caching : bool
+        Whether the registered systems keep their intermediate results between runs.
+    result_cache : ResultCache or None
+        Cache of the simulation results shared by all registered systems.
+    client : PVGISclient or None
+        Client for the PVGIS API shared by all registered systems, None for the shared default client.
 
     Methods
     -------
     set_PVmodel_parameters(params)
         Update the default parameters for the PV model.
+    set_stage_caching(enabled)
+        Keep the intermediate results of every system between runs, for incremental recomputation.
+    set_result_cache(result_cache)
+        Set the cache memoizing the simulation results of all registered systems.
+    set_weather_cache(weather_cache)
+        Set the persistent TMY cache used by all registered systems.
+    set_weather_store(weather_store)
+        Set the memory-mapped TMY store used by all registered systems.
+    set_soiling_table(soiling_table)
+        Set the soiling table used by all registered systems.
+    set_client(client)
+        Set the PVGIS client used by all registered systems.
+    prefetch_weather(client=None)
+        Download the TMY data of all registered systems concurrently into the weather cache.
     register_lakes(dataframe)
         Register lakes from a given dataframe.
-    get_annual_energy_yield()
-        Calculate the annual energy yield for all registered lakes.
+    get_annual_energy_yield(n_workers=1, chunksize=1, progress_callback=None)
+        Calculate the annual energy yield for all registered lakes, optionally in parallel.
+    run_to_sink(sink, checkpoint_path=None, batch_size=100, n_workers=1, chunksize=1, progress_callback=None)
+        Calculate the annual energy yield, streaming the results to a sink with an optional checkpoint.
+    get_annual_energy_yield_xlsx(filename)
+        Calculate the annual energy yield and save it to an Excel file, resuming interrupted runs.
+    get_annual_energy_yield_clustered(grid_resolution=None, tolerance_km=None, validate=0)
+        Calculate the annual energy yield, simulating nearby systems once per cluster.
+    run_parameter_sweep(param_grid)
+        Calculate the annual energy yield of all systems for every combination of parameters.
+    get_multiyear_energy_yield(series_store, reuse_solar_position=True, distribution='empirical')
+        Calculate the yearly and monthly energy yield and the P50 and P90 of all systems over multi-year series.
     """
-    def __init__(self):
+    def __init__(self, weather_cache=None, weather_store=None):
         """
         Initialize the FPVsimulation class.
 
+        Parameters
+        ----------
+        weather_cache : WeatherCache, optional
+            Persistent cache for the TMY data (default is None, always use the online API).
+        weather_store : WeatherStore, optional
+            Memory-mapped store of the TMY data, used instead of the cache and the online API
+            (default is None).
+
         Attributes
         ----------
-        lakes : dict
-            Dictionary to store Lake objects, keyed by lake ID.
+        registry : SystemRegistry
+            Columnar storage of the registered lakes and PV systems.
+        lakes : Mapping
+            Read-only mapping of Lake views of the registry, keyed by lake ID.
         PVmodel_parameters : dict
             Dictionary to store parameters for the PV model, initialized with default values.
+        weather_cache : WeatherCache or None
+            Persistent cache for the TMY data shared by all registered systems.
+        soiling_lookup : SoilingLookup or None
+            Soiling table shared by all registered systems, None for the built-in NS3031 table.
+        weather_store : WeatherStore or None
+            Memory-mapped store of the TMY data shared by all registered systems.
+        stage_caching : bool
+            Whether the registered systems keep their intermediate results between runs.
+        result_cache : ResultCache or None
+            Cache of the simulation results shared by all registered systems.
+        client : PVGISclient or None
+            Client for the PVGIS API shared by all registered systems, None for the shared
+            default client.
         """
-        self.lakes={}
+        self.registry = SystemRegistry()
+        self.lakes = LakeMapping(self.registry)
         self.PVmodel_parameters = deepcopy(default_PVmodel_parameters)
+        self.weather_cache = weather_cache
+        self.soiling_lookup = None
+        self.weather_store = weather_store
+        self.stage_caching = False
+        self.result_cache = None
+        self.client = None
     
     def set_PVmodel_parameters(self, params):
         """
@@ -55,7 +140,164 @@ class FPVsimulation():
         """
         for param, value in params.items():
             self.PVmodel_parameters[param] = value
+
+    def set_stage_caching(self, enabled=True):
+        """
+        Keep the intermediate results of every system between runs, for incremental recomputation.
+
+        Every registered system, and every system registered later, gets a StageCache. A run
+        after set_PVmodel_parameters then only evaluates the stages depending on the changed
+        parameters: a new derate factor only evaluates the power output, a new efficiency also
+        the module performance, and a new tilt or azimuth also the plane of array irradiance.
+        The weather, solar position and soiling are kept until the weather store, weather cache,
+        PVGIS client or soiling table changes. The caches take about 1 MB per system and are only used by
+        runs in this process, with n_workers=1.
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            True to keep the intermediate results, False to remove them (default is True).
+        """
+        self.stage_caching = enabled
+        self.registry.get_system_column('stage_cache')[:] = [StageCache() if enabled else None
+                                                             for _ in range(self.registry.n_systems)]
+
+    def set_result_cache(self, result_cache):
+        """
+        Set the cache memoizing the simulation results of all registered systems.
+
+        The annual results, energy summaries and hourly data of a system are then keyed on
+        the content of its inputs, the PV model parameters and its weather and soiling table,
+        see result_cache.get_result_key, so repeated runs and queries with the same inputs are
+        served from the cache. With several worker processes, every worker starts with an
+        empty memory and shares the cache directory.
+
+        Parameters
+        ----------
+        result_cache : ResultCache or None
+            Cache of the results, None to always simulate.
+        """
+        self.result_cache = result_cache
+        self.registry.get_system_column('result_cache')[:] = result_cache
+
+    def set_weather_cache(self, weather_cache):
+        """
+        Set the persistent TMY cache used by all registered systems.
+
+        Parameters
+        ----------
+        weather_cache : WeatherCache or None
+            Cache for the TMY data, None to always use the online API.
+        """
+        self.weather_cache = weather_cache
+        self.registry.get_system_column('weather_cache')[:] = weather_cache
+
+    def set_weather_store(self, weather_store):
+        """
+        Set the memory-mapped TMY store used by all registered systems.
+
+        The systems then read their weather from the store, as views of the memory-mapped
+        file, instead of the weather cache or the online API. With several worker processes,
+        the store is opened again in every worker, sharing one copy in the page cache.
+
+        Parameters
+        ----------
+        weather_store : WeatherStore or None
+            Store of the TMY data, None to use the weather cache or the online API.
+        """
+        self.weather_store = weather_store
+        self.registry.get_system_column('weather_store')[:] = weather_store
             
+    def set_soiling_table(self, soiling_table):
+        """
+        Set the soiling table used by all registered systems.
+
+        Parameters
+        ----------
+        soiling_table : SoilingLookup, pd.DataFrame, geopandas.GeoDataFrame or None
+            Soiling table with 12 monthly soiling losses per location in a 'soiling' column.
+            A DataFrame needs 'latitude' and 'longitude' columns in degrees, a GeoDataFrame
+            needs point geometries. None restores the built-in NS3031 table.
+        """
+        if soiling_table is None or isinstance(soiling_table, SoilingLookup):
+            soiling_lookup = soiling_table
+        elif hasattr(soiling_table, 'geometry'):
+            soiling_lookup = SoilingLookup.from_geodataframe(soiling_table)
+        else:
+            soiling_lookup = SoilingLookup.from_dataframe(soiling_table)
+
+        self.soiling_lookup = soiling_lookup
+        self.registry.get_system_column('soiling_lookup')[:] = soiling_lookup
+
+    def set_client(self, client):
+        """
+        Set the PVGIS client used by all registered systems.
+
+        The systems download their weather through the client, and key their weather cache
+        entries and cached results on its radiation databases and horizon setting. The client
+        is passed to the worker processes with the systems, each worker opening its own
+        connection pool.
+
+        Parameters
+        ----------
+        client : PVGISclient or None
+            Client for the PVGIS API, None to use the shared default client.
+        """
+        self.client = client
+        self.registry.get_system_column('client')[:] = client
+
+    def prefetch_weather(self, client=None):
+        """
+        Download the TMY data of all registered systems concurrently into the weather cache.
+
+        The unique cache locations of all registered lakes are collected, and the ones missing
+        from the cache are downloaded through the pooled, rate limited PVGIS client. Locations
+        that fail are reported and retried by the systems themselves when they are simulated.
+        A given client is set as the client of this simulation, see set_client, so the systems
+        read the cache entries written with its radiation database and horizon setting.
+
+        Parameters
+        ----------
+        client : PVGISclient, optional
+            Client used for the downloads, set as the client of this simulation (default is
+            None, use the client of this simulation).
+
+        Returns
+        -------
+        dict
+            Summary of the prefetch with the keys 'locations', 'cached', 'downloaded' and
+            'failed', where 'failed' maps each failed location to its exception.
+        """
+        if self.weather_cache is None:
+            raise ValueError("prefetch_weather requires a weather cache, see set_weather_cache")
+        if self.weather_cache.offline:
+            raise ValueError("prefetch_weather cannot download into an offline weather cache")
+        if client is None:
+            client = get_default_client() if self.client is None else self.client
+        else:
+            self.set_client(client)
+        raddatabase = client.raddatabases[0]
+
+        # Collect the unique cache locations of all registered systems
+        locations = set(map(self.weather_cache.snap,
+                            self.registry.get_system_column('latitude'),
+                            self.registry.get_system_column('longitude')))
+
+        missing = [location for location in locations
+                   if not self.weather_cache.has(*location, raddatabase, client.usehorizon)]
+
+        failed = {}
+        for (latitude, longitude), tmy_df in client.get_tmy_many(missing).items():
+            if isinstance(tmy_df, Exception):
+                failed[(latitude, longitude)] = tmy_df
+            else:
+                self.weather_cache.put(latitude, longitude, raddatabase, client.usehorizon, tmy_df)
+
+        return {'locations': len(locations),
+                'cached': len(locations) - len(missing),
+                'downloaded': len(missing) - len(failed),
+                'failed': failed}
+
     def register_lakes(self, dataframe):
         """
         Register lakes from a given dataframe.
@@ -71,40 +313,530 @@ class FPVsimulation():
             - 'selected_area': float, Area selected for the PV system
             - 'max_power_MW': float, Maximum power output of the PV system [MW]
         """
-        for index, row in dataframe.iterrows():
-            lake_id = str(row['lake_id'])
-            lake_area = row['lake_area']
-            
-            if lake_id not in self.lakes:
-                self.lakes[lake_id] = Lake(lake_id, lake_area)
-            
-            lake = self.lakes[lake_id]
-            
-            latitude = row['latitude']
-            longitude = row['longitude']
-            system_area = row['selected_area']
-            max_power_MW = row['max_power_MW']
-            
-            lake.register_pvsystem(latitude, longitude, system_area, max_power_MW)
-    
-    def get_annual_energy_yield(self):
+        n_systems = self.registry.n_systems
+        self.registry.add_systems(dataframe, self.weather_cache, self.soiling_lookup, self.weather_store)
+        if self.stage_caching:
+            self.registry.get_system_column('stage_cache')[n_systems:] = [
+                StageCache() for _ in range(self.registry.n_systems - n_systems)]
+        self.registry.get_system_column('result_cache')[n_systems:] = self.result_cache
+        self.registry.get_system_column('client')[n_systems:] = self.client
+
+    def get_annual_energy_yield(self, n_workers=1, chunksize=1, progress_callback=None):
         """
         Calculate the annual energy yield for all systems in registered lakes.
 
+        With more than one worker, the lakes are sharded across a process pool. The results
+        come back in the order the lakes were registered and are identical to the serial run.
+        The systems are not modified when they are scaled to their maximum power, the scaled
+        area is returned as 'effective_area' and the scaled systems are marked as 'clipped', so
+        running again with the same inputs gives the same results.
+
+        Parameters
+        ----------
+        n_workers : int or None, optional
+            Number of worker processes, 1 for a serial run and None for one worker per
+            CPU core (default is 1).
+        chunksize : int, optional
+            Number of lakes sent to a worker at a time (default is 1).
+        progress_callback : callable, optional
+            Function called with a progress dictionary after each lake, see print_progress
+            (default is None, no progress reporting).
+
         Returns
         -------
         pd.DataFrame
-            DataFrame containing annual energy yield data for each PV system on the lakes.
+            DataFrame containing annual energy yield data for each PV system on the lakes,
+            with the columns of Lake.get_annual_energy_yield.
         """
         # Initialize an empty list to store data for each lake
         data = []
-
-        for i, lake in enumerate(self.lakes.values()):
-            print(f'lake {i} of {len(self.lakes)}')
-            data+=lake.get_annual_energy_yield(self.PVmodel_parameters)
+        for _, lake_data in self.__iter_lake_results(range(self.registry.n_lakes), n_workers, chunksize,
+                                                     progress_callback):
+            data += lake_data
 
         # Create a DataFrame from the list of dictionaries
-        result_df = pd.DataFrame(data)
+        with instrumentation.stage('dataframe'):
+            result_df = pd.DataFrame(data)
 
         # Print or return the DataFrame
         return result_df
+
+    def __iter_lake_results(self, lake_indices, n_workers, chunksize, progress_callback):
+        """
+        Yields the lake_id and the list of system results of each lake, in the given order.
+        """
+        lakes = [Lake.from_registry(self.registry, index) for index in lake_indices]
+        progress = {'lakes_done': 0,
+                    'lakes_total': len(lakes),
+                    'systems_done': 0,
+                    'systems_total': sum(len(self.registry.get_lake_systems(index)) for index in lake_indices),
+                    'elapsed_s': 0.0,
+                    'systems_per_s': 0.0}
+        start_time = time.perf_counter()
+
+        if n_workers == 1:
+            lake_results = (lake.get_annual_energy_yield(self.PVmodel_parameters) for lake in lakes)
+            executor = None
+        else:
+            # Submit the chunks as futures, so the pending ones can be cancelled if the
+            # consumer stops early (Executor.shutdown(cancel_futures=True) needs Python 3.9)
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+            futures = [executor.submit(_get_lakes_annual_energy_yield, lakes[start:start + chunksize],
+                                       self.PVmodel_parameters)
+                       for start in range(0, len(lakes), chunksize)]
+            lake_results = (lake_data for future in futures for lake_data in future.result())
+        try:
+            for lake, lake_data in zip(lakes, lake_results):
+                instrumentation.count('lakes')
+                if progress_callback is not None:
+                    progress['lakes_done'] += 1
+                    progress['systems_done'] += len(lake_data)
+                    progress['elapsed_s'] = time.perf_counter() - start_time
+                    progress['systems_per_s'] = progress['systems_done'] / progress['elapsed_s']
+                    progress_callback(dict(progress))
+                yield lake.lake_id, lake_data
+        finally:
+            if executor is not None:
+                for future in futures:
+                    future.cancel()
+                executor.shutdown()
+
+    def run_to_sink(self, sink, checkpoint_path=None, batch_size=100, n_workers=1, chunksize=1,
+                    progress_callback=None):
+        """
+        Calculate the annual energy yield of all systems, streaming the results to a sink.
+
+        The results are written in batches of lakes as they finish, so the memory use does not
+        grow with the number of lakes. With a checkpoint, every written batch is recorded in a
+        manifest of completed lakes. Running again with the same sink, checkpoint and inputs
+        discards any results written after the last recorded batch and skips the completed lakes.
+
+        Parameters
+        ----------
+        sink : CSVResultSink or ParquetResultSink
+            Destination of the results.
+        checkpoint_path : str, optional
+            Path of the checkpoint manifest (default is None, no checkpoint).
+        batch_size : int, optional
+            Number of lakes written to the sink at a time (default is 100).
+        n_workers : int or None, optional
+            Number of worker processes, see get_annual_energy_yield (default is 1).
+        chunksize : int, optional
+            Number of lakes sent to a worker at a time (default is 1).
+        progress_callback : callable, optional
+            Function called with a progress dictionary after each lake, counting only the
+            lakes not completed before (default is None, no progress reporting).
+
+        Returns
+        -------
+        int
+            Number of systems written to the sink by this run.
+
+        Raises
+        ------
+        ValueError
+            If the checkpoint was written by a run with other inputs.
+        """
+        lake_indices = range(self.registry.n_lakes)
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = Checkpoint(checkpoint_path, get_fingerprint(self.registry, self.PVmodel_parameters))
+            # Discard the results of a batch interrupted before it was recorded
+            sink.truncate(checkpoint.sink_position)
+            lake_ids = self.registry.get_lake_column('lake_id')
+            lake_indices = [index for index in lake_indices if lake_ids[index] not in checkpoint.completed_lakes]
+
+        n_written = 0
+        batch_lakes = []
+        batch_data = []
+        lake_results = self.__iter_lake_results(lake_indices, n_workers, chunksize, progress_callback)
+        for i, (lake_id, lake_data) in enumerate(lake_results, start=1):
+            batch_lakes.append(lake_id)
+            batch_data += lake_data
+            if len(batch_lakes) == batch_size or i == len(lake_indices):
+                if batch_data:
+                    with instrumentation.stage('sink_write'):
+                        sink.write(pd.DataFrame(batch_data))
+                if checkpoint is not None:
+                    checkpoint.mark_completed(batch_lakes, sink.get_position())
+                n_written += len(batch_data)
+                batch_lakes = []
+                batch_data = []
+        return n_written
+
+    def get_annual_energy_yield_xlsx(self, filename, batch_size=100, n_workers=1, chunksize=1,
+                                     progress_callback=None):
+        """
+        Calculate the annual energy yield of all systems and save it to an Excel file.
+
+        The results are streamed to the CSV file `filename`.csv with the checkpoint
+        `filename`.checkpoint.jsonl, so an interrupted run resumes where it stopped when called
+        again. Once all lakes are completed, the CSV file is converted to `filename`.xlsx, which
+        holds at most 1048575 systems, and the CSV file and the checkpoint are removed.
+
+        Parameters
+        ----------
+        filename : str
+            Path of the output files, without extension.
+        batch_size : int, optional
+            Number of lakes written to the CSV file at a time (default is 100).
+        n_workers : int or None, optional
+            Number of worker processes, see get_annual_energy_yield (default is 1).
+        chunksize : int, optional
+            Number of lakes sent to a worker at a time (default is 1).
+        progress_callback : callable, optional
+            Function called with a progress dictionary after each lake (default is None).
+
+        Raises
+        ------
+        ModuleNotFoundError
+            If openpyxl is not installed, checked before the simulation starts.
+        ValueError
+            If the checkpoint of an interrupted run was written with other inputs.
+        """
+        lazy_import('openpyxl')
+        sink = CSVResultSink(filename + '.csv')
+        self.run_to_sink(sink, filename + '.checkpoint.jsonl', batch_size, n_workers, chunksize,
+                         progress_callback)
+        sink.read().to_excel(filename + '.xlsx', index=False)
+        os.remove(filename + '.csv')
+        os.remove(filename + '.checkpoint.jsonl')
+
+    def get_annual_energy_yield_clustered(self, grid_resolution=None, tolerance_km=None, validate=0,
+                                          max_batch_elements=2*10**7):
+        """
+        Calculate the annual energy yield of all systems, sharing the computation within clusters.
+
+        Nearby systems are grouped into clusters, see clustering.cluster_systems. The weather,
+        solar position, plane of array irradiance, PV model, soiling and derate stages are
+        evaluated once per cluster center for one square meter, and only the area scaling and
+        the maximum power clipping are evaluated per system.
+
+        Parameters
+        ----------
+        grid_resolution : float, optional
+            Size of the grid cells in degrees, each grid point being a cluster.
+        tolerance_km : float, optional
+            Maximum distance in kilometers between a system and its cluster center.
+        validate : int, optional
+            Number of clusters whose systems are also simulated at their own coordinates to
+            measure the error of the clustering, the clusters with mixed inputs first and then
+            the most spread out ones (default is 0).
+        max_batch_elements : int, optional
+            Maximum number of elements of the hours x clusters arrays evaluated at once,
+            bounding the memory use (default is 2*10**7).
+
+        Returns
+        -------
+        tuple of pd.DataFrame
+            The annual energy yield of every system, with the columns of get_annual_energy_yield
+            and the 'cluster' of each system, and the statistics of every
+            cluster: its center, number of systems, radiation database, the mean and maximum
+            distance of its systems to the center, 'mixed_inputs' if some of its systems lie in
+            another weather cache cell or nearest soiling location than the center, and for
+            validated clusters the mean and maximum relative error of the annual energy yield
+            of its systems.
+        """
+        registry = self.registry
+        clusters, center_latitude, center_longitude = cluster_systems(
+            registry.get_system_column('latitude'), registry.get_system_column('longitude'),
+            grid_resolution, tolerance_km)
+        n_clusters = len(center_latitude)
+        instrumentation.count('clusters', n_clusters)
+
+        # One system of one square meter without power limit per cluster center
+        first_system = np.full(n_clusters, len(clusters), dtype=np.int64)
+        np.minimum.at(first_system, clusters, np.arange(len(clusters)))
+        centers = SystemRegistry()
+        for c in range(n_clusters):
+            centers.add_system(-1, center_latitude[c], center_longitude[c], 1.0, None,
+                               registry.get_system_column('weather_cache')[first_system[c]],
+                               registry.get_system_column('soiling_lookup')[first_system[c]],
+                               registry.get_system_column('weather_store')[first_system[c]])
+        centers.get_system_column('client')[:] = registry.get_system_column('client')[first_system]
+
+        annual_yield_m2 = np.empty(n_clusters)
+        peak_power_m2 = np.empty(n_clusters)
+        raddatabase = np.empty(n_clusters, dtype=object)
+        batch_size = max(1, max_batch_elements // 8760)
+        for start in range(0, n_clusters, batch_size):
+            batch = PVsystemBatch([PVsystem.from_registry(centers, c)
+                                   for c in range(start, min(start + batch_size, n_clusters))])
+            stop = start + len(batch.systems)
+            weather = batch.get_weather_arrays()
+            power_m2 = batch.get_simulation_arrays(self.PVmodel_parameters, weather)['Power_out_W']
+            annual_yield_m2[start:stop] = power_m2.sum(axis=0) / 1_000
+            peak_power_m2[start:stop] = power_m2.max(axis=0)
+            raddatabase[start:stop] = weather['raddatabase']
+
+        # Scale every system to its area and clip it to its maximum power
+        system_area = registry.get_system_column('system_area')
+        max_power_W = registry.get_system_column('max_power_MW') * 10**6
+        P_peak = system_area * peak_power_m2[clusters]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.where(P_peak > max_power_W, max_power_W / P_peak, 1.0)
+        effective_area = system_area * scale
+        annual_yield = effective_area * annual_yield_m2[clusters]
+
+        lakes = registry.get_system_column('lake')
+        result_df = pd.DataFrame({'lake_id': registry.get_lake_column('lake_id')[lakes],
+                                  'lake_area': registry.get_lake_column('lake_area')[lakes],
+                                  'system_area': system_area,
+                                  'latitude': registry.get_system_column('latitude'),
+                                  'longitude': registry.get_system_column('longitude'),
+                                  'annual_energy_yield_kWh': annual_yield,
+                                  'raddata': raddatabase[clusters],
+                                  'effective_area': effective_area,
+                                  'clipped': scale < 1,
+                                  'cluster': clusters})
+
+        distance_km = get_distance_km(result_df['latitude'], result_df['longitude'],
+                                      center_latitude[clusters], center_longitude[clusters])
+        n_systems = np.bincount(clusters, minlength=n_clusters)
+        max_distance_km = np.zeros(n_clusters)
+        np.maximum.at(max_distance_km, clusters, distance_km)
+        cluster_df = pd.DataFrame({'latitude': center_latitude,
+                                   'longitude': center_longitude,
+                                   'n_systems': n_systems,
+                                   'raddata': raddatabase,
+                                   'mean_distance_km': np.bincount(clusters, weights=distance_km,
+                                                                   minlength=n_clusters) / n_systems,
+                                   'max_distance_km': max_distance_km,
+                                   'mean_relative_error': np.nan,
+                                   'max_relative_error': np.nan},
+                                  index=pd.RangeIndex(n_clusters, name='cluster'))
+
+        # Flag the clusters whose systems do not all share the weather cell and soiling table
+        # entry of the center, where the clustering error is largest
+        latitudes = registry.get_system_column('latitude')
+        longitudes = registry.get_system_column('longitude')
+        member_cells = self.__get_input_cells(registry, slice(None), latitudes, longitudes)
+        center_cells = self.__get_input_cells(registry, first_system, center_latitude, center_longitude)
+        mixed_inputs = np.zeros(n_clusters, dtype=bool)
+        for system, c in enumerate(clusters):
+            mixed_inputs[c] |= member_cells[system] != center_cells[c]
+        cluster_df.insert(6, 'mixed_inputs', mixed_inputs)
+
+        # Simulate the systems of the clusters with mixed inputs, then the most spread out ones,
+        # at their own coordinates
+        for c in np.lexsort((-max_distance_km, ~mixed_inputs))[:validate]:
+            members = np.flatnonzero(clusters == c)
+            exact = PVsystemBatch([PVsystem.from_registry(registry, m) for m in members])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                error = np.abs(annual_yield[members] / exact.get_annual_energy_yield(self.PVmodel_parameters) - 1)
+            cluster_df.loc[c, ['mean_relative_error', 'max_relative_error']] = [error.mean(), error.max()]
+
+        return result_df, cluster_df
+
+    @staticmethod
+    def __get_input_cells(registry, systems, latitudes, longitudes):
+        """
+        Returns the weather grid cell and soiling table entry of the systems at some locations.
+        """
+        weather_sources = [weather_cache if weather_store is None else weather_store
+                           for weather_cache, weather_store in zip(registry.get_system_column('weather_cache')[systems],
+                                                                   registry.get_system_column('weather_store')[systems])]
+        soiling_lookups = registry.get_system_column('soiling_lookup')[systems]
+        soiling_index = np.empty(len(latitudes), dtype=np.int64)
+        for soiling_lookup in {id(lookup): lookup for lookup in soiling_lookups}.values():
+            mask = np.array([lookup is soiling_lookup for lookup in soiling_lookups])
+            lookup = get_default_soiling_lookup() if soiling_lookup is None else soiling_lookup
+            soiling_index[mask] = lookup.get_nearest(latitudes[mask], longitudes[mask])
+        return [(None if weather_source is None else weather_source.snap(latitude, longitude), soiling)
+                for weather_source, latitude, longitude, soiling
+                in zip(weather_sources, latitudes, longitudes, soiling_index)]
+
+    def run_parameter_sweep(self, param_grid, max_batch_elements=2*10**7):
+        """
+        Calculate the annual energy yield of all systems for every combination of parameters.
+
+        The weather and solar position are collected once per system, and the plane of array
+        irradiance is calculated once per (tilt, azimuth). The PV model, soiling, derate and
+        maximum power stages are then evaluated for all scenarios sharing that geometry at once.
+        Parameters not in the grid keep their value in PVmodel_parameters.
+
+        Parameters
+        ----------
+        param_grid : dict
+            Values to sweep for each PV model parameter, for example
+            {'tilt': [0, 10, 20], 'eff_nom': [19, 21]}.
+        max_batch_elements : int, optional
+            Maximum number of elements of the scenarios x hours x systems arrays evaluated
+            at once, bounding the memory use (default is 2*10**7).
+
+        Returns
+        -------
+        pd.DataFrame
+            Tidy DataFrame indexed by scenario, with the swept parameters, the system data and
+            the annual energy yield of every system in every scenario.
+        """
+        unknown = set(param_grid) - set(self.PVmodel_parameters)
+        if unknown:
+            raise ValueError(f"Unknown PV model parameters in the grid: {sorted(unknown)}")
+
+        # Expand the grid into one full parameter set per scenario
+        swept = list(param_grid)
+        scenarios = []
+        for values in product(*(param_grid[param] for param in swept)):
+            scenario = deepcopy(self.PVmodel_parameters)
+            scenario.update(zip(swept, values))
+            scenarios.append(scenario)
+
+        systems = [(lake, system) for lake in self.lakes.values() for system in lake.systems]
+        annual_yield = np.empty((len(scenarios), len(systems)))
+        effective_area = np.empty((len(scenarios), len(systems)))
+        raddatabase = np.empty(len(systems), dtype=object)
+
+        # Group the scenarios sharing the same plane of array irradiance
+        geometries = {}
+        for i, scenario in enumerate(scenarios):
+            geometries.setdefault((scenario['tilt'], scenario['azimuth']), []).append(i)
+        max_scenarios = max(len(indices) for indices in geometries.values())
+
+        batch_size = max(1, max_batch_elements // (max_scenarios * 8760))
+        buffers = None
+        for start in range(0, len(systems), batch_size):
+            batch = PVsystemBatch([system for _, system in systems[start:start + batch_size]])
+            stop = start + len(batch.systems)
+            weather = batch.get_weather_arrays()
+            raddatabase[start:stop] = weather['raddatabase']
+
+            for (tilt, azimuth), indices in geometries.items():
+                poa, aoi = get_poa_arrays(weather, weather, tilt, azimuth)
+                # Stack the parameters of the scenarios on a leading axis
+                params = {param: np.array([scenarios[i][param] for i in indices], dtype=float)[:, None, None]
+                          for param in ('eff_nom', 'beta', 'U', 'b0', 'system_derate_factor')}
+                # Reuse the module performance buffers while the scenarios x hours x systems shape is unchanged
+                shape = (len(indices),) + poa.shape
+                if buffers is None or buffers['IAM'].shape != shape:
+                    buffers = get_module_performance_buffers(shape)
+                data = get_power_arrays(poa, weather['T2m'], aoi, weather['months'], weather['monthly_soiling'],
+                                        batch.system_area, batch.max_power_MW, params, buffers)
+                annual_yield[indices, start:stop] = data['energy_yield_kWh'].sum(axis=-2)
+                effective_area[indices, start:stop] = data['effective_area']
+
+        system_df = pd.DataFrame({'lake_id': [lake.lake_id for lake, _ in systems],
+                                  'lake_area': [lake.lake_area for lake, _ in systems],
+                                  'system_area': [system.system_area for _, system in systems],
+                                  'latitude': [system.latitude for _, system in systems],
+                                  'longitude': [system.longitude for _, system in systems]})
+        result_dfs = []
+        for i, scenario in enumerate(scenarios):
+            scenario_df = system_df.copy()
+            scenario_df.insert(0, 'scenario', i)
+            for j, param in enumerate(swept):
+                scenario_df.insert(1 + j, param, scenario[param])
+            scenario_df['effective_area'] = effective_area[i]
+            scenario_df['annual_energy_yield_kWh'] = annual_yield[i]
+            scenario_df['raddata'] = raddatabase
+            result_dfs.append(scenario_df)
+        return pd.concat(result_dfs, ignore_index=True).set_index('scenario')
+
+    def get_multiyear_energy_yield(self, series_store, reuse_solar_position=True, distribution='empirical',
+                                   max_batch_elements=2*10**7):
+        """
+        Calculate the yearly and monthly energy yield and the P50 and P90 of all systems over multi-year series.
+
+        The systems are simulated in batches, and the series of each batch is read from the
+        memory-mapped store and simulated one year at a time, see multiyear.get_multiyear_arrays.
+        The memory use is therefore bounded by max_batch_elements whatever the length of the
+        series. The soiling loss of each batch is looked up once and the solar position is
+        reused across the years. The systems are scaled to their maximum power with the peak
+        of the whole series.
+
+        Parameters
+        ----------
+        series_store : WeatherStore
+            Store of the hourly series of the systems, covering the same hours, see
+            WeatherStore.from_series_files and WeatherStore.from_pvgis_series.
+        reuse_solar_position : bool, optional
+            If True, reuse the solar position of the reference years across the years
+            (default is True).
+        distribution : str, optional
+            'empirical' or 'normal', see multiyear.get_exceedance_statistics (default is 'empirical').
+        max_batch_elements : int, optional
+            Maximum number of elements of the hours x systems arrays of one year evaluated
+            at once, bounding the memory use (default is 2*10**7).
+
+        Returns
+        -------
+        tuple of pd.DataFrame
+            The statistics of every system indexed by 'system': the columns of
+            get_annual_energy_yield without the annual energy yield, the 'effective_area', the
+            number of complete years 'n_years' and the mean, standard deviation, P50 and P90
+            energy yield over the complete years. The energy yield of every system and year,
+            with the number of hours of the year, and of every system, year and month with data.
+        """
+        registry = self.registry
+        latitudes = registry.get_system_column('latitude')
+        longitudes = registry.get_system_column('longitude')
+        n_systems = len(latitudes)
+        batch_size = max(1, max_batch_elements // 8784)
+        years = hours = None
+        annual_yield = monthly_yield = None
+        effective_area = np.empty(n_systems)
+        raddatabase = np.empty(n_systems, dtype=object)
+        for start in range(0, n_systems, batch_size):
+            batch = PVsystemBatch([PVsystem.from_registry(registry, i)
+                                   for i in range(start, min(start + batch_size, n_systems))])
+            stop = start + len(batch.systems)
+            data = get_multiyear_arrays(iter_store_years(series_store, batch.latitude, batch.longitude),
+                                        batch.latitude, batch.longitude, batch.get_monthly_soiling(),
+                                        batch.system_area, batch.max_power_MW, self.PVmodel_parameters,
+                                        reuse_solar_position)
+            if years is None:
+                years, hours = data['years'], data['hours']
+                annual_yield = np.empty((len(years), n_systems))
+                monthly_yield = np.empty((len(years), 12, n_systems))
+            annual_yield[:, start:stop] = data['annual_energy_yield_kWh']
+            monthly_yield[..., start:stop] = data['monthly_energy_yield_kWh']
+            effective_area[start:stop] = data['effective_area']
+            raddatabase[start:stop] = data['raddatabase']
+        statistics = get_exceedance_statistics(annual_yield, hours, distribution)
+
+        lakes = registry.get_system_column('lake')
+        systems = pd.RangeIndex(n_systems, name='system')
+        stats_df = pd.DataFrame({'lake_id': registry.get_lake_column('lake_id')[lakes],
+                                 'lake_area': registry.get_lake_column('lake_area')[lakes],
+                                 'system_area': registry.get_system_column('system_area'),
+                                 'latitude': latitudes,
+                                 'longitude': longitudes,
+                                 'raddata': raddatabase,
+                                 'effective_area': effective_area,
+                                 'n_years': statistics['n_years'],
+                                 'mean_energy_yield_kWh': statistics['mean'],
+                                 'std_energy_yield_kWh': statistics['std'],
+                                 'P50_energy_yield_kWh': statistics['P50'],
+                                 'P90_energy_yield_kWh': statistics['P90']},
+                                index=systems)
+        yearly_df = pd.DataFrame({'system': np.tile(systems, len(years)),
+                                  'year': np.repeat(years, n_systems),
+                                  'hours': np.repeat(hours, n_systems),
+                                  'energy_yield_kWh': annual_yield.ravel()})
+        monthly_df = pd.DataFrame({'system': np.tile(systems, 12*len(years)),
+                                   'year': np.repeat(years, 12*n_systems),
+                                   'month': np.tile(np.repeat(np.arange(1, 13), n_systems), len(years)),
+                                   'energy_yield_kWh': monthly_yield.ravel()})
+        return stats_df, yearly_df, monthly_df.dropna(subset=['energy_yield_kWh'], ignore_index=True)
+
+
+def _get_lakes_annual_energy_yield(lakes, PVparams):
+    """
+    Calculates the annual energy yield of a chunk of lakes in a worker process.
+    """
+    return [lake.get_annual_energy_yield(PVparams) for lake in lakes]
+
+
+def print_progress(progress):
+    """
+    Prints the progress of a simulation, for use as progress_callback.
+
+    Parameters
+    ----------
+    progress : dict
+        Progress of the simulation with the keys 'lakes_done', 'lakes_total', 'systems_done',
+        'systems_total', 'elapsed_s' and 'systems_per_s'.
+    """
+    print(f"lake {progress['lakes_done']} of {progress['lakes_total']}, "
+          f"{progress['systems_done']} of {progress['systems_total']} systems, "
+          f"{progress['systems_per_s']:.1f} systems/s")
@@ -1,22 +1,26 @@
-import geopandas as gpd
-from shapely.geometry import Point
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+scipy_spatial = lazy_import('scipy.spatial')
 
 # Municipality centers is sourced from https://www.kartverket.no/til-lands/fakta-om-norge/noregs-midtpunkt
-soiling_data = {
+# The centers are in UTM zone 33N (EPSG:32633), as (x, y)
+soiling_table = {
     'municipality' : ['Stavanger', 'Oslo', 'Trondheim', 'Tromsø', 
                       'Bergen', 'Kristiansand', 'Lillehammer', 'Drammen', 
                       'Skien', 'Tønsberg', 'Fredrikstad'],
-    'geometry' : [Point(25308.63,6589396.19), 
-                  Point(262335.42,6656953.39), 
-                  Point(271498.57,7031656.93),
-                  Point(658360.12,7730850.47),
-                  Point(-28836.01,6730622.71),
-                  Point(80506.37,6471393.70),
-                  Point(251868.28,6785781.36),
-                  Point(227320.62,6629577.22),
-                  Point(185790.29,6581475.50),
-                  Point(232453.14,6590090.30),
-                  Point(267715.29,6572429.07)],
+    'utm33' : [(25308.63,6589396.19), 
+               (262335.42,6656953.39), 
+               (271498.57,7031656.93),
+               (658360.12,7730850.47),
+               (-28836.01,6730622.71),
+               (80506.37,6471393.70),
+               (251868.28,6785781.36),
+               (227320.62,6629577.22),
+               (185790.29,6581475.50),
+               (232453.14,6590090.30),
+               (267715.29,6572429.07)],
     'soiling' : [[15,15,2,2,2,2,2,2,2,2,2,15], # Stavanger
                  [60,75,60,2,2,2,2,2,2,2,15,45], # Oslo
                  [60,75,45,8,2,2,2,2,2,2,15,54], # Trondheim
@@ -31,4 +35,195 @@ soiling_data = {
                  ]
 }
 
-soiling_loss_NS3031_gdf = gpd.GeoDataFrame(soiling_data, geometry='geometry', crs='EPSG:32633').to_crs('EPSG:4326')
+# soiling_data and soiling_loss_NS3031_gdf need shapely and geopandas, and are built on first access
+_lazy_attributes = {}
+
+
+def __getattr__(name):
+    """
+    Builds the shapely and geopandas versions of the soiling table on first access.
+    """
+    if name not in ('soiling_data', 'soiling_loss_NS3031_gdf'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name not in _lazy_attributes:
+        from shapely.geometry import Point
+        import geopandas as gpd
+        soiling_data = {'municipality': soiling_table['municipality'],
+                        'geometry': [Point(x, y) for x, y in soiling_table['utm33']],
+                        'soiling': soiling_table['soiling']}
+        _lazy_attributes['soiling_data'] = soiling_data
+        _lazy_attributes['soiling_loss_NS3031_gdf'] = gpd.GeoDataFrame(
+            soiling_data, geometry='geometry', crs='EPSG:32633').to_crs('EPSG:4326')
+    return _lazy_attributes[name]
+
+# Municipality centers in WGS84 (EPSG:4326), converted from the UTM33 coordinates above
+soiling_locations = {
+    'latitude' : [59.176659, 59.981017, 63.340357, 69.638502, 60.363911, 58.183437,
+                  61.127913, 59.714377, 59.25517, 59.364332, 59.227038],
+    'longitude' : [6.681117, 10.739551, 10.432734, 19.080734, 5.39022, 7.858315,
+                   10.391072, 10.150188, 9.486057, 10.290781, 10.928455]
+}
+
+
+def _to_unit_vectors(latitudes, longitudes):
+    """
+    Converts coordinates in degrees to points on the unit sphere.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)])
+
+
+class SoilingLookup():
+    """
+    A class to look up the monthly soiling loss of the nearest location in a soiling table.
+
+    The table locations are indexed in a KD-tree on the unit sphere, where the nearest
+    point by straight-line distance is also the nearest by great-circle distance.
+
+    Attributes
+    ----------
+    latitude : numpy.ndarray
+        Latitude of each table location.
+    longitude : numpy.ndarray
+        Longitude of each table location.
+    soiling : numpy.ndarray
+        Monthly soiling loss in percentage of each table location, of shape locations x 12.
+
+    Methods
+    -------
+    from_dataframe(dataframe, latitude='latitude', longitude='longitude', soiling='soiling'):
+        Creates a lookup from a table with coordinates in degrees.
+    from_geodataframe(gdf, soiling='soiling'):
+        Creates a lookup from a GeoDataFrame of points.
+    get_nearest(latitudes, longitudes):
+        Returns the index of the nearest table location of each coordinate.
+    get_soiling(latitudes, longitudes):
+        Returns the monthly soiling loss of the nearest table location of each coordinate.
+    """
+    def __init__(self, latitudes, longitudes, soiling):
+        """
+        Constructs all the necessary attributes for the SoilingLookup object.
+
+        Parameters
+        ----------
+        latitudes : array-like
+            Latitude of each table location.
+        longitudes : array-like
+            Longitude of each table location.
+        soiling : array-like
+            Monthly soiling loss in percentage of each table location, 12 values per location.
+        """
+        self.latitude = np.asarray(latitudes, dtype=float)
+        self.longitude = np.asarray(longitudes, dtype=float)
+        self.soiling = np.asarray([list(values) for values in soiling], dtype=float)
+        if self.soiling.shape != (len(self.latitude), 12):
+            raise ValueError("The soiling table must have 12 monthly values for each location")
+        self.__tree = scipy_spatial.cKDTree(_to_unit_vectors(self.latitude, self.longitude))
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the SoilingLookup instance.
+        """
+        return f"SoilingLookup(n_locations={len(self.latitude)})"
+
+    @classmethod
+    def from_dataframe(cls, dataframe, latitude='latitude', longitude='longitude', soiling='soiling'):
+        """
+        Creates a lookup from a table with coordinates in degrees.
+
+        Parameters
+        ----------
+        dataframe : pandas.DataFrame
+            Table with a latitude and longitude column and a column of 12 monthly soiling losses.
+        latitude : str, optional
+            Name of the latitude column (default is 'latitude').
+        longitude : str, optional
+            Name of the longitude column (default is 'longitude').
+        soiling : str, optional
+            Name of the soiling column (default is 'soiling').
+
+        Returns
+        -------
+        SoilingLookup
+            The lookup of the table.
+        """
+        return cls(dataframe[latitude], dataframe[longitude], dataframe[soiling])
+
+    @classmethod
+    def from_geodataframe(cls, gdf, soiling='soiling'):
+        """
+        Creates a lookup from a GeoDataFrame of points, reprojected to EPSG:4326 if needed.
+
+        Parameters
+        ----------
+        gdf : geopandas.GeoDataFrame
+            Table with point geometries and a column of 12 monthly soiling losses.
+        soiling : str, optional
+            Name of the soiling column (default is 'soiling').
+
+        Returns
+        -------
+        SoilingLookup
+            The lookup of the table.
+        """
+        if gdf.crs is not None and not gdf.crs.equals('EPSG:4326'):
+            gdf = gdf.to_crs('EPSG:4326')
+        return cls(gdf.geometry.y, gdf.geometry.x, gdf[soiling])
+
+    def get_nearest(self, latitudes, longitudes):
+        """
+        Returns the index of the nearest table location of each coordinate.
+
+        Parameters
+        ----------
+        latitudes : float or array-like
+            Latitudes of the points to look up.
+        longitudes : float or array-like
+            Longitudes of the points to look up.
+
+        Returns
+        -------
+        numpy.ndarray
+            Index of the nearest table location of each point.
+        """
+        _, index = self.__tree.query(_to_unit_vectors(np.atleast_1d(latitudes), np.atleast_1d(longitudes)))
+        return index
+
+    def get_soiling(self, latitudes, longitudes):
+        """
+        Returns the monthly soiling loss of the nearest table location of each coordinate.
+
+        Parameters
+        ----------
+        latitudes : float or array-like
+            Latitudes of the points to look up.
+        longitudes : float or array-like
+            Longitudes of the points to look up.
+
+        Returns
+        -------
+        numpy.ndarray
+            Monthly soiling loss in percentage, of shape points x 12.
+        """
+        with instrumentation.stage('soiling'):
+            return self.soiling[self.get_nearest(latitudes, longitudes)]
+
+
+_default_soiling_lookup = None
+
+
+def get_default_soiling_lookup():
+    """
+    Returns the lookup of the built-in NS3031 soiling table, created on first use.
+
+    Returns
+    -------
+    SoilingLookup
+        The lookup of the NS3031 municipality centers.
+    """
+    global _default_soiling_lookup
+    if _default_soiling_lookup is None:
+        _default_soiling_lookup = SoilingLookup(soiling_locations['latitude'], soiling_locations['longitude'],
+                                                soiling_table['soiling'])
+    return _default_soiling_lookup
@@ -0,0 +1,140 @@
+from FPVsimulation.instrumentation import instrumentation
+from itertools import count
+
+# PV model parameters and upstream stages each stage of the simulation of a system depends on.
+# The power stage at the end of the pipeline is cheap and always evaluated.
+stage_dependencies = {
+    'weather': ((), ()),
+    'solar_position': ((), ('weather',)),
+    'poa': (('tilt', 'azimuth'), ('weather', 'solar_position')),
+    'module_performance': (('eff_nom', 'beta', 'U', 'b0'), ('weather', 'poa')),
+    'soiling': ((), ()),
+}
+
+# Versions of the stage results, unique across all caches
+_versions = count()
+
+
+class StageCache():
+    """
+    A class to keep the intermediate results of the simulation of one system between runs.
+
+    Every stage result is stored with a key made of the values of the PV model parameters the
+    stage depends on, its other inputs such as the weather store, and the versions of the
+    results of its upstream stages, see stage_dependencies. A stage is evaluated again only
+    when its key changes, which gives it a new version and so invalidates the stages
+    downstream. Changing the derate factor then only evaluates the power stage, and changing
+    the efficiency also the module performance, but not the weather, solar position, plane of
+    array irradiance or soiling.
+
+    Attributes
+    ----------
+    hits : int
+        Number of stage results reused.
+    misses : int
+        Number of stages evaluated.
+
+    Methods
+    -------
+    get(stage, PVparams, compute, inputs=()):
+        Returns the result of a stage, evaluating it only if its inputs changed.
+    get_stages():
+        Returns the names of the stored stages.
+    clear():
+        Removes all stage results.
+    """
+    def __init__(self):
+        """
+        Constructs all the necessary attributes for the StageCache object.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.__entries = {}
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the StageCache instance.
+        """
+        return f"StageCache(stages={self.get_stages()!r})"
+
+    def get(self, stage, PVparams, compute, inputs=()):
+        """
+        Returns the result of a stage, evaluating it only if its inputs changed.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage, a key of stage_dependencies.
+        PVparams : dict
+            Parameters for the PV model.
+        compute : callable
+            Function without arguments evaluating the stage.
+        inputs : tuple, optional
+            Other inputs of the stage, compared by equality, for example the weather store
+            of the system (default is ()).
+
+        Returns
+        -------
+        object
+            The result of the stage, shared with later calls, so it must not be modified.
+        """
+        parameters, upstream = stage_dependencies[stage]
+        key = (tuple(PVparams[parameter] for parameter in parameters),
+               tuple(inputs),
+               tuple(self.__entries[name][1] if name in self.__entries else None for name in upstream))
+        entry = self.__entries.get(stage)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            instrumentation.count('stage_cache_hits')
+            return entry[2]
+        self.misses += 1
+        instrumentation.count('stage_cache_misses')
+        result = compute()
+        self.__entries[stage] = (key, next(_versions), result)
+        return result
+
+    def get_stages(self):
+        """
+        Returns the names of the stored stages.
+
+        Returns
+        -------
+        list of str
+            Names of the stages with a stored result.
+        """
+        return list(self.__entries)
+
+    def clear(self):
+        """
+        Removes all stage results and resets the hit and miss counters.
+        """
+        self.__entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def get_stage(stage_cache, stage, PVparams, compute, inputs=()):
+    """
+    Returns the result of a stage through a stage cache, or evaluates it without a cache.
+
+    Parameters
+    ----------
+    stage_cache : StageCache or None
+        Stage cache of the system, None to always evaluate the stage.
+    stage : str
+        Name of the stage, a key of stage_dependencies.
+    PVparams : dict
+        Parameters for the PV model.
+    compute : callable
+        Function without arguments evaluating the stage.
+    inputs : tuple, optional
+        Other inputs of the stage, see StageCache.get (default is ()).
+
+    Returns
+    -------
+    object
+        The result of the stage.
+    """
+    if stage_cache is None:
+        return compute()
+    return stage_cache.get(stage, PVparams, compute, inputs)
@@ -0,0 +1,315 @@
+import os
+import tempfile
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+
+class WeatherCache():
+    """
+    A class to represent a persistent on-disk cache of TMY weather data.
+
+    Every entry holds one 8760-hour TMY profile, stored column by column in a
+    compressed ``.npz`` file. Entries are keyed on the coordinates snapped to a
+    regular grid, the requested radiation database and the horizon setting, so
+    nearby systems within one grid cell share the same download.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Directory holding the cache files.
+    grid_resolution : float
+        Size of the grid cells in degrees used to snap the coordinates.
+    max_size_MB : float or None
+        Maximum total size of the cache in megabytes. The least recently used
+        entries are evicted when the limit is exceeded. None means no limit.
+    offline : bool
+        If True, the cache never falls back to the network. A cache miss
+        raises a LookupError instead.
+
+    Methods
+    -------
+    snap(latitude, longitude):
+        Snaps the coordinates to the cache grid.
+    get_key(latitude, longitude, raddatabase, usehorizon):
+        Returns the cache key of a location.
+    get_path(latitude, longitude, raddatabase, usehorizon):
+        Returns the path of the cache file of a location.
+    has(latitude, longitude, raddatabase, usehorizon):
+        Checks whether the TMY profile of a location is cached.
+    get(latitude, longitude, raddatabase, usehorizon):
+        Returns the cached TMY profile, or None on a cache miss.
+    put(latitude, longitude, raddatabase, usehorizon, tmy_df):
+        Stores a TMY profile in the cache.
+    get_locations(raddatabase, usehorizon):
+        Returns the grid points of the cached entries.
+    get_size():
+        Returns the total size of the cache in bytes.
+    clear():
+        Removes all entries from the cache.
+    """
+    def __init__(self, cache_dir, grid_resolution=0.01, max_size_MB=1000, offline=False):
+        """
+        Constructs all the necessary attributes for the WeatherCache object.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory holding the cache files, created if it does not exist.
+        grid_resolution : float, optional
+            Size of the grid cells in degrees (default is 0.01).
+        max_size_MB : float or None, optional
+            Maximum total size of the cache in megabytes (default is 1000).
+        offline : bool, optional
+            If True, never fetch missing data from the network (default is False).
+        """
+        self.cache_dir = cache_dir
+        self.grid_resolution = grid_resolution
+        self.max_size_MB = max_size_MB
+        self.offline = offline
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the WeatherCache instance.
+        """
+        return (f"WeatherCache(cache_dir={self.cache_dir!r}, grid_resolution={self.grid_resolution}, "
+                f"max_size_MB={self.max_size_MB}, offline={self.offline})")
+
+    def snap(self, latitude, longitude):
+        """
+        Snaps the coordinates to the center of the cache grid.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        tuple
+            Latitude and longitude of the grid point.
+        """
+        latitude = round(round(latitude / self.grid_resolution) * self.grid_resolution, 6)
+        longitude = round(round(longitude / self.grid_resolution) * self.grid_resolution, 6)
+        return latitude, longitude
+
+    def get_key(self, latitude, longitude, raddatabase, usehorizon):
+        """
+        Returns the cache key of a location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        raddatabase : str
+            Requested radiation database.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+
+        Returns
+        -------
+        str
+            Cache key, also used as file name of the entry.
+        """
+        latitude, longitude = self.snap(latitude, longitude)
+        return f"{raddatabase}_h{int(usehorizon)}_{latitude:.6f}_{longitude:.6f}"
+
+    def get_path(self, latitude, longitude, raddatabase, usehorizon):
+        """
+        Returns the path of the cache file of a location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        raddatabase : str
+            Requested radiation database.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+
+        Returns
+        -------
+        str
+            Path of the cache file, which may not exist yet.
+        """
+        return os.path.join(self.cache_dir, self.get_key(latitude, longitude, raddatabase, usehorizon) + '.npz')
+
+    def has(self, latitude, longitude, raddatabase, usehorizon):
+        """
+        Checks whether the TMY profile of a location is cached.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        raddatabase : str
+            Requested radiation database.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+
+        Returns
+        -------
+        bool
+            True if the entry is cached.
+        """
+        return os.path.exists(self.get_path(latitude, longitude, raddatabase, usehorizon))
+
+    def get(self, latitude, longitude, raddatabase, usehorizon):
+        """
+        Returns the cached TMY profile of a location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        raddatabase : str
+            Requested radiation database.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+
+        Returns
+        -------
+        pandas.DataFrame or None
+            TMY data indexed by 'time(UTC)', or None if the entry is not cached.
+        """
+        path = self.get_path(latitude, longitude, raddatabase, usehorizon)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                columns = [str(column) for column in entry['columns']]
+                tmy_df = pd.DataFrame({column: entry[f'col{i}'] for i, column in enumerate(columns)},
+                                      index=pd.DatetimeIndex(entry['time'].astype('datetime64[ns]'),
+                                                             name='time(UTC)'))
+                tmy_df['raddatabase'] = str(entry['raddatabase'])
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            instrumentation.count('weather_cache_misses')
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        instrumentation.count('weather_cache_hits')
+        return tmy_df
+
+    def put(self, latitude, longitude, raddatabase, usehorizon, tmy_df):
+        """
+        Stores a TMY profile in the cache and evicts old entries if needed.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+        raddatabase : str
+            Requested radiation database, used in the key.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+        tmy_df : pandas.DataFrame
+            TMY data indexed by 'time(UTC)', with a 'raddatabase' column holding
+            the database the data was retrieved from.
+        """
+        path = self.get_path(latitude, longitude, raddatabase, usehorizon)
+        columns = [column for column in tmy_df.columns if column != 'raddatabase']
+        arrays = {f'col{i}': tmy_df[column].to_numpy(dtype=float) for i, column in enumerate(columns)}
+        arrays['columns'] = np.array(columns)
+        arrays['time'] = tmy_df.index.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        arrays['raddatabase'] = np.array(tmy_df['raddatabase'].iloc[0])
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.__evict()
+
+    def __get_entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get_locations(self, raddatabase, usehorizon):
+        """
+        Returns the grid points of the cached entries of a radiation database and horizon setting.
+
+        Parameters
+        ----------
+        raddatabase : str
+            Requested radiation database.
+        usehorizon : int
+            1 if the horizon is taken into account, otherwise 0.
+
+        Returns
+        -------
+        list of tuple
+            Latitude and longitude of each cached grid point, in sorted order.
+        """
+        prefix = f"{raddatabase}_h{int(usehorizon)}_"
+        locations = []
+        for _, _, path in self.__get_entries():
+            name = os.path.basename(path)[:-len('.npz')]
+            if name.startswith(prefix):
+                latitude, longitude = name[len(prefix):].split('_')
+                locations.append((float(latitude), float(longitude)))
+        return sorted(locations)
+
+    def get_size(self):
+        """
+        Returns the total size of the cache.
+
+        Returns
+        -------
+        int
+            Total size of the cache files in bytes.
+        """
+        return sum(size for _, size, _ in self.__get_entries())
+
+    def __evict(self):
+        """
+        Removes the least recently used entries until the cache fits within max_size_MB.
+        """
+        if self.max_size_MB is None:
+            return
+        entries = sorted(self.__get_entries())
+        total_size = sum(size for _, size, _ in entries)
+        max_size = self.max_size_MB * 1024**2
+        for _, size, path in entries:
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        for _, _, path in self.__get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
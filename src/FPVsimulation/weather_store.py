@@ -0,0 +1,524 @@
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import json
+import os
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.lazy import lazy_import
+import numpy as np
+
+pd = lazy_import('pandas')
+
+# Hourly variables of a PVGIS TMY profile
+tmy_variables = ('T2m', 'RH', 'G(h)', 'Gb(n)', 'Gd(h)', 'IR(h)', 'WS10m', 'WD10m', 'SP')
+
+# Variables used by the simulation
+simulation_variables = ('G(h)', 'Gb(n)', 'Gd(h)', 'T2m', 'WS10m')
+
+
+class WeatherStore():
+    """
+    A class to read the TMY weather data of many locations from one memory-mapped binary store.
+
+    The store is a directory holding 'weather.npy', an array of shape locations x hours x
+    variables, 'time.npy' with the timestamps of every location and 'index.json' with the
+    coordinates, radiation databases and variable names. A store may also hold multi-year
+    hourly series instead of TMY profiles, see `from_series_files`, `from_pvgis_series` and the
+    multiyear module. The arrays are memory-mapped
+    read-only, so the TMY profiles are views of the file without parsing or copying, and the
+    worker processes of a run share one copy of the store in the page cache.
+
+    Locations are looked up on their coordinates snapped to a regular grid, as in WeatherCache,
+    so every system within a grid cell gets the same data. A store is built once with
+    `from_tmy_files`, `from_weather_cache` or `create`, and opened for reading by path.
+
+    Attributes
+    ----------
+    store_dir : str
+        Directory holding the store files.
+    grid_resolution : float
+        Size of the grid cells in degrees used to snap the coordinates.
+    variables : tuple of str
+        Names of the hourly variables, in the order of the last axis of the store.
+    latitudes : numpy.ndarray
+        Latitude of the grid point of each location.
+    longitudes : numpy.ndarray
+        Longitude of the grid point of each location.
+    raddatabases : numpy.ndarray
+        Radiation database of each location.
+
+    Methods
+    -------
+    create(store_dir, profiles, grid_resolution=0.01, variables=tmy_variables, dtype=numpy.float64):
+        Writes a store from TMY profiles and opens it.
+    from_tmy_files(store_dir, source_dir, grid_resolution=0.01, raddatabase=None, variables=tmy_variables,
+                   dtype=numpy.float64):
+        Writes a store from a directory of PVGIS TMY json or csv files and opens it.
+    from_weather_cache(store_dir, weather_cache, raddatabase=None, usehorizon=None, variables=tmy_variables,
+                       dtype=numpy.float64):
+        Writes a store from the entries of a weather cache and opens it.
+    from_series_files(store_dir, source_dir, grid_resolution=0.01, raddatabase=None, dtype=numpy.float64):
+        Writes a store from a directory of PVGIS hourly series files and opens it.
+    from_pvgis_series(store_dir, locations, startyear=2005, endyear=2020, client=None, grid_resolution=0.01,
+                      dtype=numpy.float64):
+        Downloads the hourly series of many locations from PVGIS into a store and opens it.
+    snap(latitude, longitude):
+        Snaps the coordinates to the store grid.
+    has(latitude, longitude):
+        Checks whether the store holds the TMY profile of a location.
+    get(latitude, longitude):
+        Returns the TMY profile of a location as a view of the store, or None if it is missing.
+    get_times(latitude, longitude):
+        Returns the timestamps of a location.
+    get_weather_arrays(latitudes, longitudes, variables=simulation_variables, hours=None):
+        Gathers the hourly variables of many locations into arrays of shape hours x locations.
+    """
+    def __init__(self, store_dir):
+        """
+        Opens a store for reading.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory holding the store files.
+        """
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'index.json')) as file:
+            index = json.load(file)
+        self.grid_resolution = index['grid_resolution']
+        self.variables = tuple(index['variables'])
+        self.latitudes = np.array(index['latitude'], dtype=float)
+        self.longitudes = np.array(index['longitude'], dtype=float)
+        self.raddatabases = np.array(index['raddatabase'], dtype=object)
+        self.__data = np.load(os.path.join(store_dir, 'weather.npy'), mmap_mode='r')
+        self.__time = np.load(os.path.join(store_dir, 'time.npy'), mmap_mode='r')
+        self.__rows = {location: row for row, location in enumerate(zip(self.latitudes, self.longitudes))}
+        self.__columns = {variable: i for i, variable in enumerate(self.variables)}
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the WeatherStore instance.
+        """
+        return (f"WeatherStore(store_dir={self.store_dir!r}, locations={len(self.latitudes)}, "
+                f"grid_resolution={self.grid_resolution})")
+
+    def __reduce__(self):
+        # Worker processes open the store again, mapping the same files
+        return (WeatherStore, (self.store_dir,))
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @classmethod
+    def create(cls, store_dir, profiles, grid_resolution=0.01, variables=tmy_variables, dtype=np.float64):
+        """
+        Writes a store from TMY profiles and opens it.
+
+        The profiles are written one by one into temporary memory-mapped arrays, so only one
+        profile is held in memory at a time. An existing store is only replaced once all the
+        profiles are written, and the index is written last, so a failed creation keeps the
+        existing store and an interrupted replacement leaves a store that cannot be opened.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory of the store, created if it does not exist. An existing store is replaced
+            once the new profiles are all written.
+        profiles : sequence of tuple
+            Latitude, longitude and TMY DataFrame of each location, the DataFrames as returned
+            by PVGISclient.get_tmy. A sequence of known length, items may be computed lazily.
+        grid_resolution : float, optional
+            Size of the grid cells in degrees (default is 0.01).
+        variables : tuple of str, optional
+            Hourly variables to store (default is tmy_variables).
+        dtype : numpy.dtype, optional
+            Data type of the stored values, numpy.float32 halves the size of the store
+            (default is numpy.float64).
+
+        Returns
+        -------
+        WeatherStore
+            The new store, opened for reading.
+
+        Raises
+        ------
+        ValueError
+            If there are no profiles, if two profiles snap to the same grid point, or if the
+            profiles do not have the same number of hours.
+        """
+        if len(profiles) == 0:
+            raise ValueError("A weather store needs at least one TMY profile")
+        os.makedirs(store_dir, exist_ok=True)
+        index_path = os.path.join(store_dir, 'index.json')
+        tmp_paths = [os.path.join(store_dir, name) for name in ('weather.npy.tmp', 'time.npy.tmp', 'index.json.tmp')]
+
+        variables = tuple(variables)
+        index = {'grid_resolution': grid_resolution, 'variables': list(variables),
+                 'latitude': [], 'longitude': [], 'raddatabase': []}
+        rows = {}
+        data = time = None
+        try:
+            for row, (latitude, longitude, tmy_df) in enumerate(profiles):
+                location = _snap(latitude, longitude, grid_resolution)
+                if location in rows:
+                    raise ValueError(f"The profiles of ({latitude}, {longitude}) and of row {rows[location]} snap "
+                                     f"to the same grid point {location}, use a finer grid_resolution")
+                rows[location] = row
+                if data is None:
+                    shape = (len(profiles), len(tmy_df), len(variables))
+                    data = np.lib.format.open_memmap(tmp_paths[0], mode='w+', dtype=dtype, shape=shape)
+                    time = np.lib.format.open_memmap(tmp_paths[1], mode='w+', dtype='datetime64[ns]',
+                                                     shape=shape[:2])
+                if len(tmy_df) != data.shape[1]:
+                    raise ValueError(f"The profile of ({latitude}, {longitude}) has {len(tmy_df)} hours "
+                                     f"instead of {data.shape[1]}")
+                data[row] = tmy_df[list(variables)].to_numpy(dtype=dtype)
+                time[row] = tmy_df.index.to_numpy(dtype='datetime64[ns]')
+                index['latitude'].append(location[0])
+                index['longitude'].append(location[1])
+                index['raddatabase'].append(str(tmy_df['raddatabase'].iloc[0]))
+            data.flush()
+            time.flush()
+            del data, time
+            with open(tmp_paths[2], 'w') as file:
+                json.dump(index, file)
+        except BaseException:
+            # Keep the existing store, and remove the partial files of the new one
+            data = time = None
+            for path in tmp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        # The new arrays are complete: remove the old index while the arrays are replaced
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        os.replace(tmp_paths[0], os.path.join(store_dir, 'weather.npy'))
+        os.replace(tmp_paths[1], os.path.join(store_dir, 'time.npy'))
+        os.replace(tmp_paths[2], index_path)
+        return cls(store_dir)
+
+    @classmethod
+    def from_tmy_files(cls, store_dir, source_dir, grid_resolution=0.01, raddatabase=None,
+                       variables=tmy_variables, dtype=np.float64):
+        """
+        Writes a store from a directory of PVGIS TMY files and opens it.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory of the store.
+        source_dir : str
+            Directory holding the TMY files downloaded from PVGIS in json or csv format,
+            optionally gzipped, see pvgis.read_tmy_file.
+        grid_resolution : float, optional
+            Size of the grid cells in degrees (default is 0.01).
+        raddatabase : str, optional
+            Radiation database of the files (default is None, see pvgis.read_tmy_file).
+        variables : tuple of str, optional
+            Hourly variables to store (default is tmy_variables).
+        dtype : numpy.dtype, optional
+            Data type of the stored values (default is numpy.float64).
+
+        Returns
+        -------
+        WeatherStore
+            The new store, opened for reading.
+        """
+        from FPVsimulation.pvgis import read_tmy_file
+
+        return cls.create(store_dir, _LazyProfiles(_get_pvgis_files(source_dir),
+                                                   lambda path: read_tmy_file(path, raddatabase)),
+                          grid_resolution, variables, dtype)
+
+    @classmethod
+    def from_weather_cache(cls, store_dir, weather_cache, raddatabase=None, usehorizon=None,
+                           variables=tmy_variables, dtype=np.float64):
+        """
+        Writes a store from the entries of a weather cache and opens it.
+
+        The store gets the grid resolution of the cache, so the systems are snapped to the
+        same grid points as with the cache.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory of the store.
+        weather_cache : WeatherCache
+            Cache holding the TMY profiles.
+        raddatabase : str, optional
+            Requested radiation database of the entries (default is None, the first database
+            of the default client).
+        usehorizon : int, optional
+            Horizon setting of the entries (default is None, the setting of the default client).
+        variables : tuple of str, optional
+            Hourly variables to store (default is tmy_variables).
+        dtype : numpy.dtype, optional
+            Data type of the stored values (default is numpy.float64).
+
+        Returns
+        -------
+        WeatherStore
+            The new store, opened for reading.
+        """
+        from FPVsimulation.pvgis import get_default_client
+
+        client = get_default_client()
+        if raddatabase is None:
+            raddatabase = client.raddatabases[0]
+        if usehorizon is None:
+            usehorizon = client.usehorizon
+
+        def load(location):
+            tmy_df = weather_cache.get(*location, raddatabase, usehorizon)
+            if tmy_df is None:
+                raise LookupError(f"The weather cache entry of {location} could not be read")
+            return (*location, tmy_df)
+        return cls.create(store_dir, _LazyProfiles(weather_cache.get_locations(raddatabase, usehorizon), load),
+                          weather_cache.grid_resolution, variables, dtype)
+
+    @classmethod
+    def from_series_files(cls, store_dir, source_dir, grid_resolution=0.01, raddatabase=None, dtype=np.float64):
+        """
+        Writes a store from a directory of PVGIS hourly series files and opens it.
+
+        The series must cover the same hours at every location. Only one series is held in
+        memory at a time, so stores much larger than the memory can be written.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory of the store.
+        source_dir : str
+            Directory holding the series downloaded from the PVGIS seriescalc API in json or
+            csv format, optionally gzipped, see pvgis.read_series_file.
+        grid_resolution : float, optional
+            Size of the grid cells in degrees (default is 0.01).
+        raddatabase : str, optional
+            Radiation database of the files (default is None, see pvgis.read_series_file).
+        dtype : numpy.dtype, optional
+            Data type of the stored values (default is numpy.float64).
+
+        Returns
+        -------
+        WeatherStore
+            The new store with the simulation_variables, opened for reading.
+        """
+        from FPVsimulation.pvgis import read_series_file
+
+        return cls.create(store_dir, _LazyProfiles(_get_pvgis_files(source_dir),
+                                                   lambda path: read_series_file(path, raddatabase)),
+                          grid_resolution, simulation_variables, dtype)
+
+    @classmethod
+    def from_pvgis_series(cls, store_dir, locations, startyear=2005, endyear=2020, client=None,
+                          grid_resolution=0.01, dtype=np.float64):
+        """
+        Downloads the hourly series of many locations from PVGIS into a store and opens it.
+
+        The series are downloaded concurrently by the client workers and written as they
+        arrive, so at most `client.max_workers` series are held in memory at a time.
+
+        Parameters
+        ----------
+        store_dir : str
+            Directory of the store.
+        locations : list of tuple
+            Latitude and longitude of each location, at most one per grid cell.
+        startyear : int, optional
+            First year of the series (default is 2005).
+        endyear : int, optional
+            Last year of the series (default is 2020).
+        client : PVGISclient, optional
+            Client used for the requests (default is None, the default client).
+        grid_resolution : float, optional
+            Size of the grid cells in degrees (default is 0.01).
+        dtype : numpy.dtype, optional
+            Data type of the stored values (default is numpy.float64).
+
+        Returns
+        -------
+        WeatherStore
+            The new store with the simulation_variables, opened for reading.
+        """
+        from FPVsimulation.pvgis import get_default_client
+
+        if client is None:
+            client = get_default_client()
+
+        def load(location):
+            return (*location, client.get_hourly_series(*location, startyear, endyear))
+        return cls.create(store_dir, _LazyProfiles(locations, load, client.max_workers),
+                          grid_resolution, simulation_variables, dtype)
+
+    def snap(self, latitude, longitude):
+        """
+        Snaps the coordinates to the store grid.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        tuple
+            Latitude and longitude of the grid point.
+        """
+        return _snap(latitude, longitude, self.grid_resolution)
+
+    def has(self, latitude, longitude):
+        """
+        Checks whether the store holds the TMY profile of a location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        bool
+            True if the grid point of the location is in the store.
+        """
+        return self.snap(latitude, longitude) in self.__rows
+
+    def get(self, latitude, longitude):
+        """
+        Returns the TMY profile of a location as a view of the store.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        pandas.DataFrame or None
+            TMY data indexed by 'time(UTC)' with a 'raddatabase' column, as returned by
+            WeatherCache.get. The numeric columns are read-only views of the memory-mapped
+            store. None if the location is not in the store.
+        """
+        row = self.__rows.get(self.snap(latitude, longitude))
+        if row is None:
+            instrumentation.count('weather_store_misses')
+            return None
+        instrumentation.count('weather_store_hits')
+        tmy_df = pd.DataFrame(self.__data[row], columns=list(self.variables), copy=False,
+                              index=pd.DatetimeIndex(self.__time[row], name='time(UTC)'))
+        tmy_df['raddatabase'] = self.raddatabases[row]
+        return tmy_df
+
+    def get_times(self, latitude, longitude):
+        """
+        Returns the timestamps of a location.
+
+        Parameters
+        ----------
+        latitude : float
+            Latitude of the location.
+        longitude : float
+            Longitude of the location.
+
+        Returns
+        -------
+        pandas.DatetimeIndex or None
+            Timestamps of the hourly values named 'time(UTC)', None if the location is not in
+            the store.
+        """
+        row = self.__rows.get(self.snap(latitude, longitude))
+        if row is None:
+            return None
+        return pd.DatetimeIndex(self.__time[row], name='time(UTC)')
+
+    def get_weather_arrays(self, latitudes, longitudes, variables=simulation_variables, hours=None):
+        """
+        Gathers the hourly variables of many locations into arrays of shape hours x locations.
+
+        Only the pages of the selected hours are read from the store, so a multi-year series
+        can be processed in chunks of hours with bounded memory.
+
+        Parameters
+        ----------
+        latitudes : array-like
+            Latitude of each location.
+        longitudes : array-like
+            Longitude of each location.
+        variables : tuple of str, optional
+            Hourly variables to gather (default is simulation_variables).
+        hours : slice, optional
+            Hours to gather (default is None, all hours).
+
+        Returns
+        -------
+        dict
+            An array of shape hours x locations for each variable, 'times' with the time
+            index of each location and 'raddatabase' with the radiation database of each location.
+
+        Raises
+        ------
+        LookupError
+            If some locations are not in the store.
+        """
+        rows = np.array([self.__rows.get(self.snap(latitude, longitude), -1)
+                         for latitude, longitude in zip(latitudes, longitudes)], dtype=np.int64)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            instrumentation.count('weather_store_misses', len(missing))
+            raise LookupError(f"{len(missing)} locations are not in the weather store, the first is "
+                              f"({latitudes[missing[0]]}, {longitudes[missing[0]]})")
+        instrumentation.count('weather_store_hits', len(rows))
+        if hours is None:
+            hours = slice(None)
+        weather = {variable: self.__data[rows, hours, self.__columns[variable]].T for variable in variables}
+        # Systems at the same location share one time index
+        times = {row: pd.DatetimeIndex(self.__time[row, hours], name='time(UTC)') for row in np.unique(rows)}
+        weather['times'] = [times[row] for row in rows]
+        weather['raddatabase'] = self.raddatabases[rows]
+        return weather
+
+
+class _LazyProfiles():
+    """
+    Sequence loading the TMY profile of each item on access, for WeatherStore.create.
+
+    With max_workers, up to max_workers items are loaded concurrently ahead of the consumer.
+    """
+    def __init__(self, items, load, max_workers=None):
+        self.__items = list(items)
+        self.__load = load
+        self.__max_workers = max_workers
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __iter__(self):
+        if not self.__max_workers or self.__max_workers <= 1:
+            yield from (self.__load(item) for item in self.__items)
+            return
+        with ThreadPoolExecutor(self.__max_workers) as executor:
+            # Load one window of items at a time to bound the memory
+            for start in range(0, len(self.__items), self.__max_workers):
+                yield from executor.map(self.__load, self.__items[start:start + self.__max_workers])
+
+
+def _get_pvgis_files(source_dir):
+    """
+    Returns the paths of the PVGIS json and csv files of a directory, optionally gzipped.
+    """
+    return sorted(path for pattern in ('*.json', '*.csv', '*.json.gz', '*.csv.gz')
+                  for path in glob.glob(os.path.join(source_dir, pattern)))
+
+
+def _snap(latitude, longitude, grid_resolution):
+    """
+    Snaps the coordinates to the center of a grid cell, as WeatherCache.snap.
+    """
+    latitude = round(round(latitude / grid_resolution) * grid_resolution, 6)
+    longitude = round(round(longitude / grid_resolution) * grid_resolution, 6)
+    return latitude, longitude
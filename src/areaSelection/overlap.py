@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+def get_overlapping_pairs(geometries):
+    """
+    Finds every pair of intersecting geometries with a spatial index.
+
+    The STR tree of the geometries is queried with all of them at once, so only the pairs
+    whose bounding boxes overlap are tested, instead of every pair.
+
+    Parameters
+    ----------
+    geometries : geopandas.GeoSeries
+        The geometries.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Row pointers and neighbours in compressed sparse row format: the positions of the
+        geometries intersecting the geometry at position i are
+        neighbours[pointers[i]:pointers[i + 1]], in increasing order and without i itself.
+    """
+    left, right = geometries.sindex.query(geometries.values, predicate='intersects')
+    other = left != right
+    left, right = left[other], right[other]
+    order = np.lexsort((right, left))
+    pointers = np.zeros(len(geometries) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(left, minlength=len(geometries)), out=pointers[1:])
+    return pointers, right[order]
+
+
+def remove_overlapping_polygons(gdf, random_state=42):
+    """
+    Removes the smaller polygon of every pair of overlapping polygons.
+
+    The polygons are visited in a random order. Each polygon that is still kept is compared
+    with the kept polygons it intersects, in the order of the rows: the other polygon is removed
+    if it is smaller, otherwise the visited polygon is removed and the next one is visited. This
+    is the greedy selection of the area selection notebook, where polygons that only touch also
+    count as overlapping, but the intersecting pairs are found with a spatial index, so
+    hundreds of thousands of polygons take minutes instead of hours.
+
+    Parameters
+    ----------
+    gdf : geopandas.GeoDataFrame
+        Candidate polygons, one per row.
+    random_state : int, optional
+        Seed of the order in which the polygons are visited, as in
+        `gdf.sample(frac=1, random_state=random_state)` (default is 42).
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        The rows of the polygons that are kept, in their original order.
+    """
+    n = len(gdf)
+    # Same permutation as gdf.sample(frac=1, random_state=random_state), on the positions of the rows
+    order = pd.Series(np.arange(n)).sample(frac=1, random_state=random_state).to_numpy()
+    pointers, neighbours = get_overlapping_pairs(gdf.geometry)
+    area = gdf.geometry.area.to_numpy()
+
+    removed = np.zeros(n, dtype=bool)
+    for i in order:
+        if removed[i]:
+            continue
+        for j in neighbours[pointers[i]:pointers[i + 1]]:
+            if removed[j]:
+                continue
+            if area[i] > area[j]:
+                removed[j] = True
+            else:
+                removed[i] = True
+                break
+    return gdf[~removed]
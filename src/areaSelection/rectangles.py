@@ -0,0 +1,287 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon, box
+
+# Version of the rectangles, part of every key so that rectangles cached by an older version
+# are not reused
+rectangle_version = 2
+
+
+class RectangleCache():
+    """
+    A class to keep the largest interior rectangles of polygons between runs.
+
+    The rectangles are stored in a JSON-lines file, every line mapping the keys of a batch of
+    polygons, see get_geometry_key, to their rectangles. Batches are appended as they are
+    computed, so an interrupted run keeps the rectangles computed so far, and a re-run only
+    computes the rectangles of new or changed polygons.
+
+    Attributes
+    ----------
+    path : str
+        Path of the cache file.
+
+    Methods
+    -------
+    get(key):
+        Returns the rectangle of a polygon, or None if it is not cached.
+    put(rectangles):
+        Appends a batch of rectangles to the cache.
+    """
+    def __init__(self, path):
+        """
+        Loads the cache file if it exists.
+
+        Parameters
+        ----------
+        path : str
+            Path of the cache file, created on the first put.
+        """
+        self.path = path
+        self.__rectangles = {}
+        if not os.path.exists(path):
+            return
+        with open(path) as file:
+            for line in file:
+                try:
+                    self.__rectangles.update(json.loads(line))
+                except json.JSONDecodeError:
+                    # A batch interrupted while being written is not cached
+                    break
+
+    def __repr__(self):
+        """
+        Returns a formal string representation of the RectangleCache instance.
+        """
+        return f"RectangleCache(path={self.path!r}, entries={len(self.__rectangles)})"
+
+    def __len__(self):
+        return len(self.__rectangles)
+
+    def get(self, key):
+        """
+        Returns the rectangle of a polygon.
+
+        Parameters
+        ----------
+        key : str
+            Key of the polygon, see get_geometry_key.
+
+        Returns
+        -------
+        list or None
+            The x, y, length and width of the rectangle, None if it is not cached.
+        """
+        return self.__rectangles.get(key)
+
+    def put(self, rectangles):
+        """
+        Appends a batch of rectangles to the cache.
+
+        Parameters
+        ----------
+        rectangles : dict
+            Rectangle of each polygon key.
+        """
+        if not rectangles:
+            return
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(rectangles) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.__rectangles.update(rectangles)
+
+
+def get_geometry_key(geometry, resolution=1):
+    """
+    Returns a key identifying a polygon and the resolution of its rectangle.
+
+    Parameters
+    ----------
+    geometry : shapely.geometry.Polygon
+        The polygon.
+    resolution : float, optional
+        Size of the grid cells the rectangle is computed on (default is 1).
+
+    Returns
+    -------
+    str
+        Hex digest of the well-known binary of the polygon, the resolution and rectangle_version.
+    """
+    digest = hashlib.sha256(geometry.wkb)
+    digest.update(repr((resolution, rectangle_version)).encode())
+    return digest.hexdigest()
+
+
+def find_largest_rectangle(geometry, resolution=1):
+    """
+    Finds the largest axis-aligned rectangle inside the exterior of a polygon.
+
+    The exterior is cast to a grid of `resolution` units, and the rectangle is searched on a
+    mask of the cells of the bounding box of the polygon. The cost grows with the number of
+    cells, so a coarser resolution speeds up large lakes, with the edges of the rectangle then
+    placed on the coarser grid. With a resolution above 1, the exterior is shrunk by one cell
+    before it is cast to the grid, and the rectangle is shrunk cell by cell until it lies
+    within the exterior, so it never extends past the shoreline.
+
+    Parameters
+    ----------
+    geometry : shapely.geometry.Polygon
+        The polygon, in a projected coordinate system.
+    resolution : float, optional
+        Size of the grid cells in the units of the coordinates (default is 1, the integer
+        coordinates).
+
+    Returns
+    -------
+    list
+        The x and y of the lower left corner, the length along x and the width along y of the
+        rectangle, in the units of the coordinates.
+    """
+    rectangle = _find_rectangle(_get_polygon_array(geometry, resolution), resolution)
+    return _fit_rectangle(geometry, rectangle, resolution)
+
+
+def get_largest_rectangles(geometries, resolution=1, n_workers=1, chunksize=16, cache=None, batch_size=1000):
+    """
+    Finds the largest interior rectangle of many polygons, in parallel and through a cache.
+
+    Parameters
+    ----------
+    geometries : geopandas.GeoSeries
+        The polygons, in a projected coordinate system.
+    resolution : float, optional
+        Size of the grid cells in the units of the coordinates, see find_largest_rectangle
+        (default is 1).
+    n_workers : int, optional
+        Number of worker processes, 1 to compute in this process (default is 1).
+    chunksize : int, optional
+        Number of polygons sent to a worker process at a time (default is 16).
+    cache : RectangleCache or str, optional
+        Cache of the rectangles, or the path of its file (default is None, no cache).
+    batch_size : int, optional
+        Number of new rectangles appended to the cache at a time (default is 1000).
+
+    Returns
+    -------
+    pandas.Series
+        The x, y, length and width of the rectangle of every polygon, indexed as `geometries`.
+    """
+    if isinstance(cache, str):
+        cache = RectangleCache(cache)
+    keys = [get_geometry_key(geometry, resolution) for geometry in geometries]
+    rectangles = {}
+    if cache is not None:
+        rectangles.update((key, cache.get(key)) for key in keys if cache.get(key) is not None)
+
+    # Compute every missing polygon once, even if it occurs in several rows
+    missing = {}
+    for key, geometry in zip(keys, geometries):
+        if key not in rectangles:
+            missing.setdefault(key, geometry)
+    polygons = (_get_polygon_array(geometry, resolution) for geometry in missing.values())
+
+    batch = {}
+    if n_workers > 1:
+        with ProcessPoolExecutor(n_workers) as executor:
+            results = executor.map(_find_rectangle, polygons, [resolution]*len(missing), chunksize=chunksize)
+            for (key, geometry), rectangle in zip(missing.items(), results):
+                batch[key] = _fit_rectangle(geometry, rectangle, resolution)
+                if len(batch) >= batch_size:
+                    _store(rectangles, batch, cache)
+    else:
+        for (key, geometry), polygon in zip(missing.items(), polygons):
+            batch[key] = _fit_rectangle(geometry, _find_rectangle(polygon, resolution), resolution)
+            if len(batch) >= batch_size:
+                _store(rectangles, batch, cache)
+    _store(rectangles, batch, cache)
+    return pd.Series([rectangles[key] for key in keys], index=geometries.index, dtype=object)
+
+
+def polygon_from_xylw_list(xylw_list):
+    """
+    Returns the polygon of a rectangle.
+
+    Parameters
+    ----------
+    xylw_list : list
+        The x, y, length and width of the rectangle.
+
+    Returns
+    -------
+    shapely.geometry.Polygon
+        The rectangle.
+    """
+    x, y, length, width = xylw_list
+    return Polygon([(x, y), (x + length, y), (x + length, y + width), (x, y + width)])
+
+
+def _get_polygon_array(geometry, resolution):
+    """
+    Casts the exterior of a polygon to the integer grid array of shape 1 x points x 2 used by lir.
+
+    With a resolution above 1, the exterior is first shrunk by one cell, as casting it to the
+    coarser grid moves its edges outward by up to one cell.
+    """
+    exterior = Polygon(geometry.exterior)
+    if resolution > 1:
+        shrunk = exterior.buffer(-resolution)
+        if shrunk.geom_type == 'MultiPolygon':
+            shrunk = max(shrunk.geoms, key=lambda part: part.area)
+        if not shrunk.is_empty:
+            exterior = shrunk
+    x, y = exterior.exterior.xy
+    return np.array(np.dstack((np.asarray(x) / resolution, np.asarray(y) / resolution)), np.int32)
+
+
+def _find_rectangle(polygon, resolution):
+    """
+    Finds the largest interior rectangle of a grid polygon, in a worker process.
+    """
+    import largestinteriorrectangle as lir
+
+    return [int(value) * resolution for value in lir.lir(polygon)]
+
+
+def _fit_rectangle(geometry, rectangle, resolution):
+    """
+    Shrinks a rectangle cell by cell until it lies within the exterior of its polygon.
+
+    The side nearest to the part of the rectangle outside the polygon is moved inward first.
+    At the integer grid of resolution 1, the rectangle is returned unchanged, as computed by
+    the notebook.
+    """
+    if resolution <= 1:
+        return rectangle
+    exterior = Polygon(geometry.exterior)
+    x, y, length, width = rectangle
+    while length > 0 and width > 0:
+        rectangle = box(x, y, x + length, y + width)
+        if exterior.covers(rectangle):
+            break
+        outside = rectangle.difference(exterior)
+        min_x, min_y, max_x, max_y = outside.bounds
+        side = np.argmin([min_x - x, min_y - y, x + length - max_x, y + width - max_y])
+        if side == 0:
+            x += resolution
+        elif side == 1:
+            y += resolution
+        if side in (0, 2):
+            length -= resolution
+        else:
+            width -= resolution
+    return [x, y, max(length, 0), max(width, 0)]
+
+
+def _store(rectangles, batch, cache):
+    """
+    Moves a batch of new rectangles to the results and the cache.
+    """
+    rectangles.update(batch)
+    if cache is not None:
+        cache.put(dict(batch))
+    batch.clear()
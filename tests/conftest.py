@@ -0,0 +1,5 @@
+import os
+
+# largestinteriorrectangle loads the TBB threading layer of numba on import, after which a
+# process that forks workers, as run_local and the simulation do, hangs at exit
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, make_weather_cache
+from FPVsimulation.batch import PVsystemBatch
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.pvsystem import PVsystem
+
+
+@pytest.fixture(scope='module')
+def systems():
+    weather_cache = make_weather_cache()
+    # The last system is clipped to its maximum power
+    parameters = [(0.0, 0.0, 1e4, np.nan), (0.02, 0.05, 3e4, 5.0), (0.5, 0.3, 2.5e4, 1.0)]
+    return [PVsystem(fixture_latitude + dlat, fixture_longitude + dlon, area, max_power_MW, weather_cache)
+            for dlat, dlon, area, max_power_MW in parameters]
+
+
+def test_annual_energy_yield(systems):
+    batch = PVsystemBatch(systems)
+    expected = [system.get_annual_results() for system in systems]
+    assert [result['clipped'] for result in expected] == [False, False, True]
+
+    np.testing.assert_allclose(batch.get_annual_energy_yield(),
+                               [result['annual_energy_yield_kWh'] for result in expected], rtol=1e-12)
+    np.testing.assert_allclose(batch.get_simulation_arrays()['effective_area'],
+                               [result['effective_area'] for result in expected], rtol=1e-12)
+
+
+def test_monthly_energy_yield(systems):
+    batch = PVsystemBatch(systems)
+    expected = np.column_stack([system.get_montly_aggragates()[('energy_yield_kWh', 'sum')].to_numpy()
+                                for system in systems])
+    np.testing.assert_allclose(batch.get_monthly_energy_yield(), expected, rtol=1e-12)
+
+
+def test_hourly_data(systems):
+    arrays = PVsystemBatch(systems).get_simulation_arrays()
+    for i, system in enumerate(systems):
+        data_df = system.get_system_simulation_data()
+        for column in ('poa_global_W/m2', 'T2m', 'WS10m', 'aoi', 'Power_out_W', 'energy_yield_kWh'):
+            np.testing.assert_allclose(arrays[column][:, i], data_df[column].to_numpy(), rtol=1e-10, atol=1e-9,
+                                       err_msg=column)
+
+
+def test_tilted_east_facing(systems):
+    # A tilted, non-south orientation runs the transposition and the ground reflection
+    PVparams = dict(default_PVmodel_parameters, tilt=35, azimuth=120)
+    batch = PVsystemBatch(systems)
+    arrays = batch.get_simulation_arrays(PVparams)
+    for i, system in enumerate(systems):
+        data_df = system.get_system_simulation_data(PVparams)
+        for column in ('poa_global_W/m2', 'aoi', 'Power_out_W', 'energy_yield_kWh'):
+            np.testing.assert_allclose(arrays[column][:, i], data_df[column].to_numpy(), rtol=1e-10, atol=1e-9,
+                                       err_msg=column)
+    np.testing.assert_allclose(batch.get_annual_energy_yield(PVparams),
+                               [system.get_annual_energy_yield(PVparams) for system in systems], rtol=1e-12)
+    assert not np.allclose(arrays['poa_global_W/m2'], batch.get_simulation_arrays()['poa_global_W/m2'])
+
+
+def test_energy_summary_matches_hourly_data(systems):
+    batch_summary = PVsystemBatch(systems).get_energy_summary()
+    for i, system in enumerate(systems):
+        hourly_df = system.get_system_simulation_data()
+        summary = system.get_energy_summary()
+        daily_peak = hourly_df['Power_out_W'].resample('D').max().dropna()
+        monthly = hourly_df.groupby(hourly_df.index.month)
+        expected = {'annual_energy_yield_kWh': hourly_df['energy_yield_kWh'].sum(),
+                    'monthly_energy_yield_kWh': monthly['energy_yield_kWh'].sum(),
+                    'monthly_max_energy_yield_kWh': monthly['energy_yield_kWh'].max(),
+                    'monthly_max_power_W': monthly['Power_out_W'].max(),
+                    'monthly_avg_daily_peak_W': daily_peak.groupby(daily_peak.index.month).mean()}
+        for key, values in expected.items():
+            np.testing.assert_allclose(summary[key], values, rtol=1e-10, err_msg=key)
+            np.testing.assert_allclose(batch_summary[key][..., i], values, rtol=1e-10, err_msg=key)
+        # The daily peaks follow the order of the TMY months, which mixes years
+        np.testing.assert_allclose(summary['daily_peak'].sort_index().to_numpy(), daily_peak.to_numpy(), rtol=1e-12)
+        assert summary['clipped'] == (i == 2)
+
+        monthly_df = system.get_montly_aggragates()
+        np.testing.assert_allclose(monthly_df[('Power_out_W', 'avg_Ppeak')], expected['monthly_avg_daily_peak_W'],
+                                   rtol=1e-10)
@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_cache
+from FPVsimulation.instrumentation import instrumentation
+from FPVsimulation.simulation import FPVsimulation
+
+
+@pytest.fixture
+def recording():
+    events = []
+    instrumentation.reset()
+    instrumentation.enable(events.append)
+    yield events
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def make_simulation():
+    simulation = FPVsimulation(weather_cache=make_weather_cache())
+    simulation.register_lakes(make_lakes_dataframe(12, systems_per_lake=4, n_locations=6))
+    return simulation
+
+
+def test_run_is_recorded_without_changing_the_results(recording):
+    instrumentation.disable()
+    expected_df = make_simulation().get_annual_energy_yield()
+    assert not recording and instrumentation.report() == {'stages': {}, 'counters': {}}
+
+    instrumentation.enable(recording.append)
+    result_df = make_simulation().get_annual_energy_yield()
+    assert result_df.equals(expected_df)
+
+    report = instrumentation.report()
+    assert report['counters']['lakes'] == 3
+    assert report['counters']['systems'] == 12
+    assert report['counters']['weather_cache_hits'] == 12
+    assert report['stages']['lake']['calls'] == 3
+    for name in ('weather', 'solar_position', 'poa', 'pvmodel', 'soiling', 'dataframe'):
+        assert report['stages'][name]['calls'] >= 1
+    # The nested stages run within the lakes
+    assert report['stages']['lake']['total_s'] >= report['stages']['pvmodel']['total_s']
+
+    # Every update is also sent to the callback
+    assert sum(event['value'] for event in recording if event['name'] == 'systems') == 12
+    assert sum(event['type'] == 'stage' and event['name'] == 'lake' for event in recording) == 3
+
+    instrumentation.reset()
+    assert instrumentation.report() == {'stages': {}, 'counters': {}}
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.benchmarks_import import heavy_modules
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, make_weather_cache
+from FPVsimulation.lazy import lazy_import
+from FPVsimulation.pvsystem import PVsystem
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code):
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(root_dir, 'src'), root_dir]))
+    return json.loads(subprocess.check_output([sys.executable, '-c', code], env=environment, cwd=root_dir))
+
+
+def test_import_executes_no_heavy_module():
+    executed = run_python("import json, sys, FPVsimulation.simulation\n"
+                          f"print(json.dumps([name for name in {heavy_modules!r}\n"
+                          "                   if type(sys.modules.get(name)).__name__ == 'module']))")
+    assert executed == []
+
+
+def test_lazy_modules_give_the_same_results():
+    # The whole simulation runs in a fresh interpreter on lazily loaded modules
+    weather_cache = make_weather_cache()
+    code = ("import json\n"
+            "from FPVsimulation.pvsystem import PVsystem\n"
+            "from FPVsimulation.weather_cache import WeatherCache\n"
+            f"weather_cache = WeatherCache({weather_cache.cache_dir!r}, grid_resolution=1.0, offline=True)\n"
+            f"system = PVsystem({fixture_latitude}, {fixture_longitude}, 1e4, None, weather_cache)\n"
+            "print(json.dumps(system.get_annual_energy_yield()))")
+    expected = PVsystem(fixture_latitude, fixture_longitude, 1e4, None, weather_cache).get_annual_energy_yield()
+    assert run_python(code) == pytest.approx(expected, rel=1e-12)
+
+
+def test_lazy_import():
+    assert lazy_import('json') is json
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('FPVsimulation_no_such_module')
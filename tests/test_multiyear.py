@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, load_tmy, make_weather_cache
+from FPVsimulation.multiyear import get_exceedance_statistics
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.weather_store import WeatherStore, simulation_variables
+
+years = [2016, 2017, 2018, 2019]
+
+
+def make_series(irradiance_scale=1.0):
+    """
+    Returns a multi-year hourly series in the format of parse_series_response, with a different
+    irradiance every year and a partial last year.
+    """
+    tmy_df = load_tmy()
+    series_dfs = []
+    for k, year in enumerate(years + [2020]):
+        times = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:00', freq='h', name='time(UTC)')
+        # The TMY hours, with 28 February repeated on the 29th in leap years
+        source = np.arange(8760)
+        if len(times) == 8784:
+            source = np.concatenate([source[:59*24], source[58*24:]])
+        if year == 2020:
+            times, source = times[:24*90], source[:24*90]
+        scale = irradiance_scale * (1 + 0.04*((3*k) % 5))
+        series_dfs.append(pd.DataFrame({'G(h)': scale * tmy_df['G(h)'].to_numpy()[source],
+                                        'Gb(n)': scale * tmy_df['Gb(n)'].to_numpy()[source],
+                                        'Gd(h)': scale * tmy_df['Gd(h)'].to_numpy()[source],
+                                        'T2m': tmy_df['T2m'].to_numpy()[source] + k,
+                                        'WS10m': tmy_df['WS10m'].to_numpy()[source]},
+                                       index=times))
+    series_df = pd.concat(series_dfs)
+    series_df['raddatabase'] = 'PVGIS-SARAH2'
+    return series_df
+
+
+@pytest.fixture(scope='module')
+def series_df():
+    return make_series()
+
+
+@pytest.fixture(scope='module')
+def weather_cache():
+    return make_weather_cache()
+
+
+@pytest.mark.parametrize('max_power_MW', [np.nan, 1.0])
+def test_yearly_yield_matches_annual_simulation(series_df, weather_cache, max_power_MW):
+    system = PVsystem(fixture_latitude, fixture_longitude, 3e4, max_power_MW, weather_cache)
+    result = system.get_multiyear_energy_yield(series=series_df, reuse_solar_position=False)
+
+    assert result['annual_energy_yield_kWh'].index.tolist() == years + [2020]
+    assert result['hours'].tolist() == [8784, 8760, 8760, 8760, 24*90]
+    assert result['n_years'] == 4
+    yearly = [system.get_annual_results(weather=series_df.loc[str(year)]) for year in years + [2020]]
+    # The system is scaled with the peak of the whole series, the lowest area of the single years
+    effective_area = min(annual['effective_area'] for annual in yearly)
+    assert result['effective_area'] == pytest.approx(effective_area, rel=1e-12)
+    if np.isnan(max_power_MW):
+        assert effective_area == 3e4
+    else:
+        assert effective_area < 3e4
+
+    expected = [annual['annual_energy_yield_kWh'] * effective_area / annual['effective_area'] for annual in yearly]
+    np.testing.assert_allclose(result['annual_energy_yield_kWh'], expected, rtol=1e-10)
+    np.testing.assert_allclose(result['monthly_energy_yield_kWh'].sum(axis=1, min_count=1), expected, rtol=1e-10)
+    assert result['monthly_energy_yield_kWh'].loc[2020, 4:].isna().all()
+
+    complete = np.array(expected[:4])
+    assert result['mean_energy_yield_kWh'] == pytest.approx(complete.mean(), rel=1e-10)
+    assert result['std_energy_yield_kWh'] == pytest.approx(complete.std(ddof=1), rel=1e-10)
+    assert result['P50_energy_yield_kWh'] == pytest.approx(np.median(complete), rel=1e-10)
+    assert result['P90_energy_yield_kWh'] == pytest.approx(np.quantile(complete, 0.1), rel=1e-10)
+    assert result['P90_energy_yield_kWh'] < result['P50_energy_yield_kWh']
+
+
+def test_reused_solar_position_is_close(series_df, weather_cache):
+    system = PVsystem(fixture_latitude, fixture_longitude, 3e4, np.nan, weather_cache)
+    reused = system.get_multiyear_energy_yield(series=series_df)
+    computed = system.get_multiyear_energy_yield(series=series_df, reuse_solar_position=False)
+    # The low winter sun of the partial year is the most sensitive to the drift of the calendar
+    np.testing.assert_allclose(reused['annual_energy_yield_kWh'], computed['annual_energy_yield_kWh'], rtol=1e-3)
+    np.testing.assert_allclose(reused['annual_energy_yield_kWh'][:4], computed['annual_energy_yield_kWh'][:4],
+                               rtol=1e-4)
+
+
+def test_exceedance_statistics():
+    rng = np.random.default_rng(1)
+    annual_yield = rng.normal(1e6, 5e4, (6, 3))
+    hours = np.array([8000, 8784, 8760, 8760, 8760, 8784])
+    complete = annual_yield[1:]
+
+    statistics = get_exceedance_statistics(annual_yield, hours)
+    assert statistics['n_years'] == 5
+    np.testing.assert_allclose(statistics['P50'], np.quantile(complete, 0.5, axis=0))
+    np.testing.assert_allclose(statistics['P90'], np.quantile(complete, 0.1, axis=0))
+
+    statistics = get_exceedance_statistics(annual_yield, hours, distribution='normal')
+    np.testing.assert_allclose(statistics['P50'], complete.mean(axis=0))
+    np.testing.assert_allclose(statistics['P90'], complete.mean(axis=0) - 1.2816*complete.std(axis=0, ddof=1))
+
+    statistics = get_exceedance_statistics(annual_yield[:1], hours[:1])
+    assert statistics['n_years'] == 0 and np.isnan(statistics['P90']).all()
+    with pytest.raises(ValueError):
+        get_exceedance_statistics(annual_yield, hours, distribution='lognormal')
+
+
+def test_simulation_from_series_store(tmp_path, series_df, weather_cache):
+    # Two systems at the first location and one at a second location with more irradiance
+    locations = [(fixture_latitude, fixture_longitude, series_df),
+                 (fixture_latitude + 0.5, fixture_longitude, make_series(irradiance_scale=1.1))]
+    store = WeatherStore.create(str(tmp_path / 'series'), locations, variables=simulation_variables)
+    lakes = pd.DataFrame({'lake_id': [1, 1, 2],
+                          'lake_area': 1e6,
+                          'latitude': [fixture_latitude, fixture_latitude, fixture_latitude + 0.5],
+                          'longitude': fixture_longitude,
+                          'selected_area': [1e4, 3e4, 2e4],
+                          'max_power_MW': [np.nan, 1.0, np.nan]})
+    simulation = FPVsimulation(weather_cache=weather_cache)
+    simulation.register_lakes(lakes)
+
+    # A batch per system
+    stats_df, yearly_df, monthly_df = simulation.get_multiyear_energy_yield(store, max_batch_elements=8784)
+    assert len(stats_df) == 3
+    assert len(yearly_df) == 3 * 5
+    for system, lake in lakes.iterrows():
+        series = locations[0 if lake['latitude'] == fixture_latitude else 1][2]
+        expected = PVsystem(lake['latitude'], lake['longitude'], lake['selected_area'], lake['max_power_MW'],
+                            weather_cache).get_multiyear_energy_yield(series=series)
+        system_yearly = yearly_df[yearly_df['system'] == system]
+        assert system_yearly['year'].tolist() == years + [2020]
+        np.testing.assert_allclose(system_yearly['energy_yield_kWh'], expected['annual_energy_yield_kWh'], rtol=1e-10)
+        system_monthly = monthly_df[monthly_df['system'] == system].set_index(['year', 'month'])['energy_yield_kWh']
+        np.testing.assert_allclose(system_monthly, expected['monthly_energy_yield_kWh'].stack().dropna().to_numpy(),
+                                   rtol=1e-10)
+        for name in ('effective_area', 'n_years', 'mean_energy_yield_kWh', 'std_energy_yield_kWh',
+                     'P50_energy_yield_kWh', 'P90_energy_yield_kWh'):
+            assert stats_df.loc[system, name] == pytest.approx(expected[name], rel=1e-10), name
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+gpd = pytest.importorskip('geopandas')
+from areaSelection.overlap import remove_overlapping_polygons
+
+
+def remove_overlapping_polygons_loop(gdf, random_state=42):
+    """
+    The greedy selection of the area selection notebook, intersecting every pair of polygons.
+    """
+    polygons_to_be_removed = []
+    for index, row in gdf.sample(frac=1, random_state=random_state).iterrows():
+        polygon = row['geometry']
+        for other_index, other_row in gdf.iterrows():
+            if index == other_index or other_index in polygons_to_be_removed or index in polygons_to_be_removed:
+                continue
+            other_polygon = other_row['geometry']
+            if polygon.intersection(other_polygon):
+                if polygon.area > other_polygon.area:
+                    polygons_to_be_removed.append(other_index)
+                else:
+                    polygons_to_be_removed.append(index)
+    return gdf.drop(polygons_to_be_removed)
+
+
+def make_candidates(seed, n=60):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 500, n)
+    y = rng.uniform(0, 500, n)
+    size = rng.uniform(10, 60, n)
+    geometries = [box(x0, y0, x0 + s, y0 + s) for x0, y0, s in zip(x, y, size)]
+    # Boxes that only touch, and exact duplicates of equal area
+    geometries += [box(600, 0, 610, 10), box(610, 0, 630, 10), box(600, 100, 620, 120), box(600, 100, 620, 120)]
+    return gpd.GeoDataFrame({'value': np.arange(len(geometries))}, geometry=geometries,
+                            index=np.arange(len(geometries)) * 10)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_the_greedy_loop(seed):
+    gdf = make_candidates(seed)
+    expected = remove_overlapping_polygons_loop(gdf, random_state=seed)
+    kept = remove_overlapping_polygons(gdf, random_state=seed)
+    assert kept.index.tolist() == expected.index.tolist()
+    assert len(kept) < len(gdf)
+    # Of the touching boxes only the larger one is kept, and only one of the duplicates
+    assert 610 in kept.index and 600 not in kept.index
+    assert len(set(kept.index) & {620, 630}) == 1
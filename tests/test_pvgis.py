@@ -0,0 +1,164 @@
+import json
+import pickle
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from FPVsimulation.pvgis import PVGISclient, get_default_client
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.weather_cache import WeatherCache
+
+
+def make_tmy_records():
+    """
+    Returns the hourly records of a synthetic TMY in the format of the PVGIS response.
+    """
+    times = pd.date_range('2019-01-01', periods=8760, freq='h')
+    hours = np.arange(8760)
+    sun = np.clip(np.sin(np.pi*(hours % 24 - 6)/12), 0, None) * (0.6 - 0.4*np.cos(2*np.pi*hours/8760))
+    return pd.DataFrame({'time(UTC)': times.strftime('%Y%m%d:%H%M'),
+                         'T2m': 5 - 10*np.cos(2*np.pi*hours/8760),
+                         'RH': 70.0,
+                         'G(h)': 800*sun,
+                         'Gb(n)': 700*sun,
+                         'Gd(h)': 150*sun,
+                         'IR(h)': 250.0,
+                         'WS10m': 3.0,
+                         'WD10m': 180.0,
+                         'SP': 100000.0}).to_dict('records')
+
+
+class StandInServer():
+    """
+    A local stand-in for the PVGIS TMY API, recording every request.
+
+    Latitudes below 0 are not covered by PVGIS-SARAH2, a latitude of 45 first answers 429 and
+    503 before the data, and a latitude of 50 always answers 500.
+    """
+    def __init__(self):
+        self.payload = json.dumps({'outputs': {'tmy_hourly': make_tmy_records()}}).encode()
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                with server.lock:
+                    server.requests.append((time.monotonic(), self.client_address, params))
+                    attempt = sum(request[2] == params for request in server.requests)
+                status, body = server.respond(params, attempt)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/api/v5_2/tmy?'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def respond(self, params, attempt):
+        latitude = float(params['lat'])
+        if latitude < 0 and params['raddatabase'] == 'PVGIS-SARAH2':
+            return 400, b'{"message": "Location over the sea or outside the database coverage"}'
+        if latitude == 45 and attempt <= 2:
+            return (429, 503)[attempt - 1], b'{"message": "busy"}'
+        if latitude == 50:
+            return 500, b'{"message": "error"}'
+        return 200, self.payload
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+def test_backoff_on_transient_errors(server):
+    client = PVGISclient(api_url=server.url, backoff_factor=0.05)
+    tmy_df = client.get_tmy(45, 10)
+    assert len(tmy_df) == 8760
+    assert (tmy_df['raddatabase'] == 'PVGIS-SARAH2').all()
+
+    times = [request[0] for request in server.requests]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1
+
+
+def test_fallback_to_era5(server):
+    client = PVGISclient(api_url=server.url, backoff_factor=0.01)
+    tmy_df = client.get_tmy(-30, 20)
+    assert (tmy_df['raddatabase'] == 'PVGIS-ERA5').all()
+    assert [request[2]['raddatabase'] for request in server.requests] == ['PVGIS-SARAH2', 'PVGIS-ERA5']
+
+
+def test_get_tmy_many_pools_connections(server):
+    client = PVGISclient(api_url=server.url, max_workers=2, max_retries=1, backoff_factor=0.01)
+    locations = [(60 + 0.01*i, 10) for i in range(8)] + [(50, 10)]
+    results = client.get_tmy_many(locations)
+
+    assert all(isinstance(results[location], pd.DataFrame) for location in locations[:-1])
+    assert isinstance(results[(50, 10)], Exception)
+    connections = {request[1] for request in server.requests}
+    assert len(server.requests) == 8 + 2*2
+    assert len(connections) <= client.max_workers
+
+
+def test_client_pickles_its_settings():
+    client = PVGISclient(api_url='http://127.0.0.1:1/tmy?', raddatabases=('PVGIS-ERA5',), usehorizon=0,
+                         max_workers=2, rate_limit=5, max_retries=1, backoff_factor=0.01, timeout=3)
+    copy = pickle.loads(pickle.dumps(client))
+    for name in ('api_url', 'series_api_url', 'raddatabases', 'usehorizon', 'max_workers', 'rate_limit',
+                 'max_retries', 'backoff_factor', 'timeout'):
+        assert getattr(copy, name) == getattr(client, name)
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_prefetch_with_client_is_used_by_the_systems(server, tmp_path, n_workers):
+    # A horizon setting different from the default client, so the cache keys differ
+    client = PVGISclient(api_url=server.url, usehorizon=0, backoff_factor=0.01)
+    default_client = get_default_client()
+    lakes = pd.DataFrame({'lake_id': [1, 1, 2],
+                          'lake_area': 1e6,
+                          'latitude': [60.0, 60.0, 60.02],
+                          'longitude': 10.0,
+                          'selected_area': [1e4, 2e4, 3e4],
+                          'max_power_MW': [1.0, float('nan'), 5.0]})
+    simulation = FPVsimulation(weather_cache=WeatherCache(str(tmp_path)))
+    simulation.register_lakes(lakes)
+
+    summary = simulation.prefetch_weather(client)
+    assert summary['downloaded'] == 2 and not summary['failed']
+    assert simulation.client is client
+    assert get_default_client() is default_client
+    n_requests = len(server.requests)
+
+    # The workers get the client with the systems, so they read the prefetched entries too,
+    # while a miss under the default client would raise in an offline cache
+    simulation.weather_cache.offline = True
+    result_df = simulation.get_annual_energy_yield(n_workers=n_workers)
+    assert len(result_df) == 3
+    assert len(server.requests) == n_requests
+    if n_workers == 1:
+        result_df, _ = simulation.get_annual_energy_yield_clustered(grid_resolution=0.01)
+        assert len(result_df) == 3
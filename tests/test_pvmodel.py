@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from FPVsimulation.pvmodel import (PVmodel, default_PVmodel_parameters, get_module_performance_buffers,
+                                   module_performance_names)
+
+
+def get_reference_performance(params, poa, T2m, aoi):
+    """
+    Returns the module performance with the formulas of the original pandas implementation.
+    """
+    T_module = T2m + poa / params['U']
+    temperature_eff = 1 - params['beta']*(T_module - 25)
+    with np.errstate(invalid='ignore'):
+        IAM = np.where(aoi < 90, 1 - params['b0'] * (1 / np.cos(aoi*np.pi/180) - 1), 0).clip(min=0)
+    return {'temperature_eff': temperature_eff, 'IAM': IAM, 'T_module': T_module,
+            'module_efficiency': params['eff_nom'] * IAM * temperature_eff}
+
+
+@pytest.fixture
+def weather():
+    rng = np.random.default_rng(0)
+    n_hours = 500
+    aoi = rng.uniform(0, 180, n_hours)
+    aoi[:4] = [0, 89.9, 90, np.nan]
+    return pd.DataFrame({'poa_global_W/m2': rng.uniform(0, 1000, n_hours),
+                         'T2m': rng.uniform(-20, 30, n_hours),
+                         'aoi': aoi},
+                        index=pd.date_range('2019-01-01', periods=n_hours, freq='h'))
+
+
+def test_module_performance(weather):
+    model = PVmodel(dict(default_PVmodel_parameters))
+    expected = get_reference_performance(model.params, weather['poa_global_W/m2'].to_numpy(),
+                                          weather['T2m'].to_numpy(), weather['aoi'].to_numpy())
+    performance_df = model.get_module_performance(weather)
+
+    assert list(performance_df.columns) == list(module_performance_names)
+    assert performance_df.index.equals(weather.index)
+    for name in module_performance_names:
+        np.testing.assert_allclose(performance_df[name], expected[name], rtol=1e-12, atol=1e-15)
+    # No IAM from 90 degrees or for a missing angle
+    np.testing.assert_array_equal(performance_df['IAM'].iloc[2:4], 0)
+    # The temperature efficiency is no longer a copy of the module efficiency
+    assert not np.allclose(performance_df['temperature_eff'], performance_df['module_efficiency'])
+
+
+def test_module_performance_arrays_reuse_buffers(weather):
+    model = PVmodel(dict(default_PVmodel_parameters))
+    inputs = [weather[column].to_numpy() for column in ('poa_global_W/m2', 'T2m', 'aoi')]
+    expected = model.get_module_performance_arrays(*inputs)
+
+    out = get_module_performance_buffers((len(weather),))
+    for _ in range(2):
+        result = model.get_module_performance_arrays(*inputs, out=out)
+        assert all(result[name] is out[name] for name in module_performance_names)
+        for name in module_performance_names:
+            np.testing.assert_array_equal(result[name], expected[name])
+
+
+def test_module_performance_arrays_broadcast_parameters(weather):
+    # Hours x systems, with a parameter value per system
+    params = dict(default_PVmodel_parameters, eff_nom=np.array([17.0, 19.0, 21.0]), U=np.array([30.0, 46.0, 60.0]))
+    inputs = [np.repeat(weather[[column]].to_numpy(), 3, axis=1) for column in ('poa_global_W/m2', 'T2m', 'aoi')]
+    result = PVmodel(params).get_module_performance_arrays(*inputs)
+
+    for system in range(3):
+        system_params = dict(params, eff_nom=params['eff_nom'][system], U=params['U'][system])
+        expected = get_reference_performance(system_params, *(array[:, system] for array in inputs))
+        for name in module_performance_names:
+            assert result[name].shape == (len(weather), 3)
+            np.testing.assert_allclose(result[name][:, system], expected[name], rtol=1e-12, atol=1e-15)
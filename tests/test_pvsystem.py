@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, make_weather_cache
+from FPVsimulation.pvsystem import PVsystem
+
+all_columns = ['poa_global_W/m2', 'T2m', 'WS10m', 'aoi', 'raddatabase', 'temperature_eff', 'IAM', 'T_module',
+               'module_efficiency', 's_soiling', 'syst_perf', 'Power_out_W/m2', 'Power_out_W', 'energy_yield_kWh']
+
+
+@pytest.fixture(scope='module')
+def system():
+    # Clipped to its maximum power
+    return PVsystem(fixture_latitude, fixture_longitude, 3e4, 1.0, make_weather_cache())
+
+
+def test_compact_simulation_data(system):
+    data_df = system.get_system_simulation_data()
+    assert data_df.columns.tolist() == all_columns
+    assert data_df.attrs['clipped'] and data_df.attrs['effective_area'] < system.system_area
+
+    compact_df = system.get_system_simulation_data(compact=True)
+    assert compact_df.columns.tolist() == [column for column in all_columns if column != 'raddatabase']
+    assert (compact_df.dtypes == np.float32).all()
+    assert compact_df.attrs['raddatabase'] == data_df['raddatabase'].iloc[0]
+    assert compact_df.attrs['effective_area'] == data_df.attrs['effective_area']
+    assert compact_df.index.equals(data_df.index)
+    for column in compact_df:
+        np.testing.assert_allclose(compact_df[column], data_df[column], rtol=1e-6, atol=1e-6, err_msg=column)
+    assert compact_df.memory_usage().sum() < 0.6*data_df.memory_usage(deep=True).sum()
+
+
+def test_selected_columns(system):
+    data_df = system.get_system_simulation_data()
+    columns = ['energy_yield_kWh', 'raddatabase', 'aoi']
+    selected_df = system.get_system_simulation_data(columns=columns)
+    assert selected_df.columns.tolist() == columns
+    assert selected_df.equals(data_df[columns])
+
+    compact_df = system.get_system_simulation_data(columns=columns, compact=True)
+    assert compact_df['raddatabase'].dtype == 'category'
+    assert compact_df['raddatabase'].astype(str).equals(data_df['raddatabase'].astype(str))
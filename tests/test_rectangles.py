@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Polygon, box
+
+pytest.importorskip('largestinteriorrectangle')
+from areaSelection.rectangles import RectangleCache, find_largest_rectangle, get_largest_rectangles
+
+
+def make_lake(seed, radius=400):
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, 60, endpoint=False)
+    radii = radius * (1 + 0.3 * rng.uniform(-1, 1, angles.size))
+    x = 500000.3 + radii * np.cos(angles)
+    y = 6000000.7 + radii * np.sin(angles)
+    return Polygon(np.column_stack((x, y))).buffer(0)
+
+
+def assert_within(geometry, rectangle):
+    x, y, length, width = rectangle
+    assert length > 0 and width > 0
+    assert geometry.covers(box(x, y, x + length, y + width))
+
+
+@pytest.mark.parametrize('resolution', [5, 10])
+def test_find_largest_rectangle_within_polygon(resolution):
+    for seed in range(5):
+        geometry = make_lake(seed)
+        rectangle = find_largest_rectangle(geometry, resolution)
+        assert_within(geometry, rectangle)
+        assert all(value % resolution == 0 for value in rectangle[2:])
+
+
+def test_get_largest_rectangles_within_polygon(tmp_path):
+    geometries = pd.Series([make_lake(seed) for seed in range(4)])
+    cache = RectangleCache(str(tmp_path / 'rectangles.jsonl'))
+    rectangles = get_largest_rectangles(geometries, resolution=5, cache=cache)
+    for geometry, rectangle in zip(geometries, rectangles):
+        assert_within(geometry, rectangle)
+    cached = get_largest_rectangles(geometries, resolution=5, cache=str(tmp_path / 'rectangles.jsonl'))
+    assert cached.tolist() == rectangles.tolist()
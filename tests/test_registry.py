@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_cache
+from FPVsimulation.lake import Lake
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.simulation import FPVsimulation
+
+
+@pytest.fixture(scope='module')
+def weather_cache():
+    return make_weather_cache()
+
+
+def test_lake_systems_are_read_only_views(weather_cache):
+    lake = Lake('lake', 1e6)
+    lake.register_pvsystem(60.0, 10.0, 1e4, None, weather_cache)
+    systems = lake.systems
+    assert isinstance(systems, tuple)
+    with pytest.raises(AttributeError):
+        systems.append(PVsystem(60.0, 10.0, 1e4, None, weather_cache))
+
+    lake.register_pvsystem(60.01, 10.0, 2e4, 5.0, weather_cache)
+    assert len(systems) == 1 and len(lake.systems) == 2
+    assert lake.covered_area == 3e4
+
+    # The views read and write the registry
+    lake.systems[1].system_area = 2.5e4
+    assert lake.systems[1].system_area == 2.5e4
+
+
+def test_registered_lakes_match_standalone_systems(weather_cache):
+    lakes_df = make_lakes_dataframe(12, systems_per_lake=4, n_locations=6)
+    simulation = FPVsimulation(weather_cache=weather_cache)
+    simulation.register_lakes(lakes_df)
+    assert sorted(simulation.lakes) == ['0', '1', '2']
+    np.testing.assert_array_equal(simulation.registry.get_system_column('latitude'), lakes_df['latitude'])
+
+    result_df = simulation.get_annual_energy_yield()
+    expected = [PVsystem(row.latitude, row.longitude, row.selected_area, row.max_power_MW,
+                         weather_cache).get_annual_results(default_PVmodel_parameters)
+                for row in lakes_df.itertuples()]
+    np.testing.assert_allclose(result_df['annual_energy_yield_kWh'],
+                               [result['annual_energy_yield_kWh'] for result in expected], rtol=1e-12)
+    assert result_df['clipped'].tolist() == [result['clipped'] for result in expected]
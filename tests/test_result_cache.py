@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import (fixture_latitude, fixture_longitude, load_tmy, make_lakes_dataframe,
+                                 make_weather_cache)
+from FPVsimulation.pvgis import PVGISclient
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.result_cache import ResultCache, get_result_key
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.soiling_loss_NS3031 import SoilingLookup, get_default_soiling_lookup
+
+
+@pytest.fixture(scope='module')
+def weather_cache():
+    return make_weather_cache()
+
+
+def make_simulation(weather_cache, result_cache=None):
+    simulation = FPVsimulation(weather_cache=weather_cache)
+    simulation.register_lakes(make_lakes_dataframe(6, systems_per_lake=3, n_locations=4))
+    if result_cache is not None:
+        simulation.set_result_cache(result_cache)
+    return simulation
+
+
+def test_cached_runs_match_the_simulation(weather_cache):
+    expected_df = make_simulation(weather_cache).get_annual_energy_yield()
+    n_systems = len(expected_df)
+
+    result_cache = ResultCache()
+    simulation = make_simulation(weather_cache, result_cache)
+    pd.testing.assert_frame_equal(simulation.get_annual_energy_yield(), expected_df)
+    assert (result_cache.hits, result_cache.misses) == (0, n_systems)
+    # A second run is served from the cache
+    pd.testing.assert_frame_equal(simulation.get_annual_energy_yield(), expected_df)
+    assert (result_cache.hits, result_cache.misses) == (n_systems, n_systems)
+
+    # Other parameters are other results
+    simulation.set_PVmodel_parameters({'tilt': 20})
+    tilted_df = simulation.get_annual_energy_yield()
+    assert result_cache.misses == 2*n_systems
+    assert not np.allclose(tilted_df['annual_energy_yield_kWh'], expected_df['annual_energy_yield_kWh'])
+
+
+def test_disk_cache_is_reused(tmp_path, weather_cache):
+    cache_dir = str(tmp_path / 'results')
+    expected_df = make_simulation(weather_cache, ResultCache(cache_dir=cache_dir)).get_annual_energy_yield()
+
+    # A new cache on the same directory, as in a later run
+    result_cache = ResultCache(cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(make_simulation(weather_cache, result_cache).get_annual_energy_yield(), expected_df)
+    assert (result_cache.hits, result_cache.misses) == (len(expected_df), 0)
+
+    # Clearing removes the files too
+    result_cache.clear()
+    result_cache = ResultCache(cache_dir=cache_dir)
+    make_simulation(weather_cache, result_cache).get_annual_energy_yield()
+    assert (result_cache.hits, result_cache.misses) == (0, len(expected_df))
+
+
+def test_key_covers_the_inputs(weather_cache):
+    system = PVsystem(fixture_latitude, fixture_longitude, 3e4, 1.0, weather_cache)
+    key = get_result_key('annual', system, default_PVmodel_parameters)
+    assert get_result_key('annual', PVsystem(fixture_latitude, fixture_longitude, 3e4, 1.0, weather_cache),
+                          dict(default_PVmodel_parameters)) == key
+
+    keys = [get_result_key('summary', system, default_PVmodel_parameters),
+            get_result_key('annual', system, dict(default_PVmodel_parameters, eff_nom=20)),
+            get_result_key('annual', PVsystem(fixture_latitude, fixture_longitude, 3e4, 2.0, weather_cache),
+                           default_PVmodel_parameters),
+            get_result_key('annual', system, default_PVmodel_parameters, weather=load_tmy())]
+
+    default_lookup = get_default_soiling_lookup()
+    system.soiling_lookup = SoilingLookup(default_lookup.latitude, default_lookup.longitude, default_lookup.soiling)
+    # The same table under another lookup is the same result
+    assert get_result_key('annual', system, default_PVmodel_parameters) == key
+    system.soiling_lookup = SoilingLookup(default_lookup.latitude, default_lookup.longitude,
+                                          default_lookup.soiling + 1)
+    keys.append(get_result_key('annual', system, default_PVmodel_parameters))
+    system.soiling_lookup = None
+
+    system.client = PVGISclient(usehorizon=0)
+    keys.append(get_result_key('annual', system, default_PVmodel_parameters))
+    assert len(set(keys + [key])) == len(keys) + 1
+
+
+def test_results_are_copies(weather_cache):
+    system = PVsystem(fixture_latitude, fixture_longitude, 3e4, 1.0, weather_cache)
+    system.result_cache = ResultCache()
+    simulated_df = system.get_system_simulation_data()
+    expected_df = simulated_df.copy()
+    simulated_df['Power_out_W'] = 0.0
+    pd.testing.assert_frame_equal(system.get_system_simulation_data(), expected_df)
+
+    results = system.get_annual_results()
+    results['annual_energy_yield_kWh'] = 0.0
+    assert system.get_annual_results()['annual_energy_yield_kWh'] > 0
+    assert system.result_cache.hits == 2
+
+
+def test_memory_is_bounded(weather_cache):
+    result_cache = ResultCache(max_size_MB=2)
+    system = PVsystem(fixture_latitude, fixture_longitude, 3e4, 1.0, weather_cache)
+    system.result_cache = result_cache
+    for tilt in range(0, 40, 10):
+        system.get_system_simulation_data(dict(default_PVmodel_parameters, tilt=tilt))
+    assert result_cache.misses == 4
+    assert result_cache.get_size() <= 2 * 1024**2
+    # The oldest result was evicted
+    system.get_system_simulation_data(default_PVmodel_parameters)
+    assert result_cache.misses == 5
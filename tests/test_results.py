@@ -0,0 +1,91 @@
+import importlib.util
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_cache, make_weather_store
+from FPVsimulation.pvgis import PVGISclient
+from FPVsimulation.results import Checkpoint, get_fingerprint
+from FPVsimulation.simulation import FPVsimulation
+
+
+@pytest.fixture
+def simulation():
+    simulation = FPVsimulation(weather_cache=make_weather_cache())
+    simulation.register_lakes(make_lakes_dataframe(20, systems_per_lake=5, n_locations=4))
+    return simulation
+
+
+@pytest.mark.parametrize('content', ['', '{"fingerpr', '{"fingerprint": "abc"}', '\n'])
+def test_checkpoint_with_unreadable_header_is_fresh(tmp_path, content):
+    path = str(tmp_path / 'run.checkpoint.jsonl')
+    with open(path, 'w') as file:
+        file.write(content)
+
+    checkpoint = Checkpoint(path, 'abc')
+    assert checkpoint.completed_lakes == set()
+    assert checkpoint.sink_position == 0
+    with open(path) as file:
+        assert file.read() == json.dumps({'fingerprint': 'abc'}) + '\n'
+
+
+def test_checkpoint_resumes(tmp_path):
+    path = str(tmp_path / 'run.checkpoint.jsonl')
+    checkpoint = Checkpoint(path, 'abc')
+    checkpoint.mark_completed(['1', '2'], 100)
+    checkpoint.mark_completed(['3'], 150)
+    with open(path, 'a') as file:
+        file.write('{"lakes": ["4"], "sink_pos')
+
+    resumed = Checkpoint(path, 'abc')
+    assert resumed.completed_lakes == {'1', '2', '3'}
+    assert resumed.sink_position == 150
+    with pytest.raises(ValueError):
+        Checkpoint(path, 'other')
+    assert not (tmp_path / 'run.checkpoint.jsonl.tmp').exists()
+
+
+def test_fingerprint_covers_weather_soiling_and_client(simulation):
+    def fingerprint():
+        return get_fingerprint(simulation.registry, simulation.PVmodel_parameters)
+
+    fingerprints = [fingerprint()]
+    assert fingerprint() == fingerprints[0]
+    simulation.set_soiling_table(pd.DataFrame({'latitude': [60.0], 'longitude': [10.0], 'soiling': [[1.0]*12]}))
+    fingerprints.append(fingerprint())
+    simulation.set_weather_cache(make_weather_cache())
+    fingerprints.append(fingerprint())
+    simulation.set_client(PVGISclient(usehorizon=0))
+    fingerprints.append(fingerprint())
+    simulation.set_client(PVGISclient(raddatabases=('PVGIS-ERA5',), usehorizon=0))
+    fingerprints.append(fingerprint())
+    simulation.set_weather_store(make_weather_store())
+    fingerprints.append(fingerprint())
+    simulation.set_PVmodel_parameters({'tilt': 20})
+    fingerprints.append(fingerprint())
+    assert len(set(fingerprints)) == len(fingerprints)
+
+
+def test_xlsx_export_removes_intermediate_files(simulation, tmp_path):
+    pytest.importorskip('openpyxl')
+
+    filename = str(tmp_path / 'yield')
+    simulation.get_annual_energy_yield_xlsx(filename, batch_size=2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['yield.xlsx']
+
+    # A second export with other inputs starts over instead of finding a stale checkpoint
+    simulation.set_PVmodel_parameters({'tilt': 20})
+    simulation.get_annual_energy_yield_xlsx(filename, batch_size=2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['yield.xlsx']
+    expected = simulation.get_annual_energy_yield()
+    result_df = pd.read_excel(filename + '.xlsx')
+    assert result_df['annual_energy_yield_kWh'].to_numpy() == pytest.approx(
+        expected['annual_energy_yield_kWh'].to_numpy(), rel=1e-9)
+
+
+@pytest.mark.skipif(importlib.util.find_spec('openpyxl') is not None, reason='openpyxl is installed')
+def test_xlsx_export_without_openpyxl_fails_before_running(simulation, tmp_path):
+    with pytest.raises(ModuleNotFoundError):
+        simulation.get_annual_energy_yield_xlsx(str(tmp_path / 'yield'))
+    assert not any(tmp_path.iterdir())
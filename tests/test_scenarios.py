@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_cache, make_weather_store
+from FPVsimulation.cli import main
+from FPVsimulation.pvmodel import default_PVmodel_parameters
+from FPVsimulation.scenarios import get_scenario_energy_yield
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.weather_store import WeatherStore
+
+
+@pytest.fixture(scope='module')
+def scenarios():
+    # Overlapping selections of the same lakes, with a different area in the last scenario
+    lakes_df = make_lakes_dataframe(30, systems_per_lake=3, n_locations=8)
+    larger_df = lakes_df.iloc[10:].copy()
+    larger_df['selected_area'] *= 1.5
+    return {'all': lakes_df, 'first': lakes_df.iloc[:18], 'larger': larger_df}
+
+
+def get_expected(scenario_df, PVparams=default_PVmodel_parameters, weather_cache=None, weather_store=None):
+    simulation = FPVsimulation(weather_cache=weather_cache, weather_store=weather_store)
+    simulation.register_lakes(scenario_df)
+    simulation.set_PVmodel_parameters(PVparams)
+    return simulation.get_annual_energy_yield()
+
+
+def assert_results_equal(result_df, expected_df):
+    pd.testing.assert_frame_equal(result_df.reset_index(drop=True), expected_df.reset_index(drop=True),
+                                  check_dtype=False, rtol=1e-10)
+
+
+@pytest.mark.parametrize('tilt', [0, 25])
+def test_scenarios_match_separate_simulations(scenarios, tilt):
+    weather_cache = make_weather_cache()
+    PVparams = dict(default_PVmodel_parameters, tilt=tilt)
+    result_dfs = get_scenario_energy_yield(scenarios, PVparams, weather_cache)
+
+    assert list(result_dfs) == list(scenarios)
+    for name, scenario_df in scenarios.items():
+        assert_results_equal(result_dfs[name], get_expected(scenario_df, PVparams, weather_cache))
+    assert result_dfs['all']['clipped'].any() and not result_dfs['all']['clipped'].all()
+
+
+def test_scenarios_reject_missing_columns(scenarios):
+    with pytest.raises(KeyError, match='max_power_MW'):
+        get_scenario_energy_yield({'partial': scenarios['all'].drop(columns='max_power_MW')})
+
+
+def test_cli_scenarios(tmp_path, scenarios, capsys):
+    weather_store = make_weather_store()
+    paths = []
+    for name, scenario_df in scenarios.items():
+        paths.append(str(tmp_path / f'{name}.csv'))
+        scenario_df.to_csv(paths[-1], index=False)
+    output_dir = tmp_path / 'results'
+
+    status = main(['scenarios', *paths, '-o', str(output_dir), '--weather-store', weather_store.store_dir,
+                   '--offline', '--param', 'tilt=15'])
+    assert status == 0
+    assert len(capsys.readouterr().out.splitlines()) == len(scenarios)
+    PVparams = dict(default_PVmodel_parameters, tilt=15)
+    for name, scenario_df in scenarios.items():
+        result_df = pd.read_csv(output_dir / f'{name}_annual_energy_yield.csv', dtype={'lake_id': str})
+        assert_results_equal(result_df, get_expected(scenario_df, PVparams,
+                                                     weather_store=WeatherStore(weather_store.store_dir)))
+
+
+@pytest.mark.parametrize('arguments', [['--offline'], ['--param', 'efficiency=20']])
+def test_cli_scenarios_reports_errors(tmp_path, scenarios, capsys, arguments):
+    path = str(tmp_path / 'all.csv')
+    scenarios['all'].to_csv(path, index=False)
+    assert main(['scenarios', path, '-o', str(tmp_path), *arguments]) == 1
+    assert capsys.readouterr().err.startswith('fpvsim scenarios: error:')
+    assert not (tmp_path / 'all_annual_energy_yield.csv').exists()
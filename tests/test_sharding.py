@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_store
+from FPVsimulation.sharding import ShardManifest, run_local
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.weather_store import WeatherStore
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('sharding')
+    lakes_path = str(directory / 'lakes.csv')
+    make_lakes_dataframe(40, systems_per_lake=4, n_locations=10).to_csv(lakes_path, index=False)
+    return lakes_path, make_weather_store().store_dir
+
+
+@pytest.fixture(scope='module')
+def expected_df(inputs):
+    lakes_path, weather_store_dir = inputs
+    simulation = FPVsimulation(weather_store=WeatherStore(weather_store_dir))
+    simulation.register_lakes(pd.read_csv(lakes_path, dtype={'lake_id': str}))
+    return simulation.get_annual_energy_yield()
+
+
+@pytest.fixture
+def manifest(inputs, tmp_path):
+    lakes_path, weather_store_dir = inputs
+    manifest = ShardManifest.create(str(tmp_path / 'run' / 'manifest.json'), lakes_path, 3,
+                                    weather_store_dir=weather_store_dir, batch_size=2)
+    shards = run_local(manifest.path, n_nodes=2)
+    assert sorted(shard for node_shards in shards for shard in node_shards) == [0, 1, 2]
+    return manifest
+
+
+def test_merge_equals_single_run(manifest, expected_df):
+    assert manifest.get_status() == ['done'] * 3
+    pd.testing.assert_frame_equal(manifest.merge(), expected_df)
+
+
+def test_merge_rejects_missing_partial(manifest):
+    os.remove(manifest.get_partial_path(1))
+    with pytest.raises(ValueError, match='missing'):
+        manifest.merge()
+
+
+@pytest.mark.parametrize('alteration', ['value', 'row'])
+def test_merge_rejects_altered_partial(manifest, alteration):
+    path = manifest.get_partial_path(0)
+    with open(path) as file:
+        lines = file.readlines()
+    if alteration == 'value':
+        lines[1] = lines[1].replace('1', '2', 1)
+    else:
+        del lines[-1]
+    with open(path, 'w') as file:
+        file.writelines(lines)
+    with pytest.raises(ValueError, match='changed'):
+        manifest.merge()
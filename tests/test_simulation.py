@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_lakes_dataframe, make_weather_cache
+from FPVsimulation.simulation import FPVsimulation
+
+
+@pytest.fixture(scope='module')
+def weather_cache():
+    return make_weather_cache()
+
+
+@pytest.fixture
+def simulation(weather_cache):
+    simulation = FPVsimulation(weather_cache=weather_cache)
+    simulation.register_lakes(make_lakes_dataframe(12, systems_per_lake=4, n_locations=6))
+    return simulation
+
+
+def test_parameter_sweep_matches_separate_runs(simulation):
+    param_grid = {'tilt': [0, 30], 'azimuth': [180, 120], 'eff_nom': [19, 22]}
+    # A small batch limit splits the systems into several batches
+    sweep_df = simulation.run_parameter_sweep(param_grid, max_batch_elements=4*8*8760)
+    assert len(sweep_df) == 8 * 12
+
+    for scenario, scenario_df in sweep_df.groupby(level='scenario'):
+        params = {param: scenario_df[param].iloc[0] for param in param_grid}
+        simulation.set_PVmodel_parameters(params)
+        result_df = simulation.get_annual_energy_yield()
+        for column in ('lake_id', 'latitude', 'longitude', 'system_area', 'raddata'):
+            assert scenario_df[column].tolist() == result_df[column].tolist()
+        np.testing.assert_allclose(scenario_df['annual_energy_yield_kWh'], result_df['annual_energy_yield_kWh'],
+                                   rtol=1e-10, err_msg=str(params))
+        np.testing.assert_allclose(scenario_df['effective_area'], result_df['effective_area'], rtol=1e-12)
+
+
+def test_parameter_sweep_rejects_unknown_parameters(simulation):
+    with pytest.raises(ValueError):
+        simulation.run_parameter_sweep({'tilt': [0], 'efficiency': [19]})
+
+
+def test_clustered_yield_and_validation(simulation):
+    exact_df = simulation.get_annual_energy_yield()
+    result_df, cluster_df = simulation.get_annual_energy_yield_clustered(grid_resolution=0.02, validate=100)
+    assert result_df.columns.tolist() == exact_df.columns.tolist() + ['cluster']
+    assert result_df['clipped'].tolist() == exact_df['clipped'].tolist()
+    assert cluster_df['n_systems'].sum() == len(exact_df)
+
+    # Every cluster is validated against the systems simulated at their own coordinates
+    error = (result_df['annual_energy_yield_kWh'] / exact_df['annual_energy_yield_kWh'] - 1).abs()
+    grouped = error.groupby(result_df['cluster'])
+    np.testing.assert_allclose(cluster_df['mean_relative_error'], grouped.mean(), rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(cluster_df['max_relative_error'], grouped.max(), rtol=1e-9, atol=1e-15)
+    assert 0 < cluster_df['max_relative_error'].max() < 1e-3
+
+    # Without validation the errors are not measured
+    _, cluster_df = simulation.get_annual_energy_yield_clustered(grid_resolution=0.02)
+    assert cluster_df['mean_relative_error'].isna().all()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from FPVsimulation import soiling_loss_NS3031
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.soiling_loss_NS3031 import SoilingLookup, get_default_soiling_lookup
+
+
+def get_haversine_km(latitude1, longitude1, latitude2, longitude2):
+    latitude1, longitude1, latitude2, longitude2 = map(np.radians, (latitude1, longitude1, latitude2, longitude2))
+    a = (np.sin((latitude2 - latitude1)/2)**2 +
+         np.cos(latitude1)*np.cos(latitude2)*np.sin((longitude2 - longitude1)/2)**2)
+    return 2*6371.0*np.arcsin(np.sqrt(a))
+
+
+def make_points(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(57.5, 71.0, n), rng.uniform(4.0, 31.0, n)
+
+
+def test_default_lookup_is_the_nearest_municipality():
+    latitudes, longitudes = make_points()
+    lookup = get_default_soiling_lookup()
+    distance_km = get_haversine_km(latitudes[:, None], longitudes[:, None], lookup.latitude, lookup.longitude)
+    np.testing.assert_array_equal(lookup.get_nearest(latitudes, longitudes), distance_km.argmin(axis=1))
+    np.testing.assert_array_equal(lookup.get_soiling(latitudes, longitudes),
+                                  np.array(soiling_loss_NS3031.soiling_table['soiling'])[distance_km.argmin(axis=1)])
+
+
+def test_default_lookup_matches_the_geodataframe():
+    pytest.importorskip('geopandas')
+    gdf = soiling_loss_NS3031.soiling_loss_NS3031_gdf
+    lookup = get_default_soiling_lookup()
+    np.testing.assert_allclose(lookup.latitude, gdf.geometry.y, atol=1e-5)
+    np.testing.assert_allclose(lookup.longitude, gdf.geometry.x, atol=1e-5)
+
+    # A GeoDataFrame in another projection is reprojected
+    utm_lookup = SoilingLookup.from_geodataframe(gdf.to_crs('EPSG:32633'))
+    latitudes, longitudes = make_points(seed=1)
+    np.testing.assert_array_equal(utm_lookup.get_soiling(latitudes, longitudes),
+                                  lookup.get_soiling(latitudes, longitudes))
+
+
+def test_systems_use_their_soiling_table():
+    table = pd.DataFrame({'latitude': [60.0, 62.0], 'longitude': [10.0, 10.0],
+                          'soiling': [[1.0]*12, list(range(12))]})
+    lookup = SoilingLookup.from_dataframe(table)
+    assert PVsystem(61.9, 10.5, 1e4, None, soiling_lookup=lookup).get_monthly_soiling_loss().tolist() == list(range(12))
+    np.testing.assert_array_equal(PVsystem(59.9, 10.7, 1e4, None).get_monthly_soiling_loss(),
+                                  soiling_loss_NS3031.soiling_table['soiling'][1])
+
+    with pytest.raises(ValueError):
+        SoilingLookup([60.0], [10.0], [[1.0]*11])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pvlib
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, make_weather_cache
+from FPVsimulation import solar_position
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.solar_position import SolarPositionCache, get_solar_position_meeus, set_solar_position_cache
+
+locations = [(-45.5, 170.3), (0.2, -78.5), (35.0, 139.7), (60.0, 10.0), (78.2, 15.6)]
+
+
+@pytest.fixture
+def shared_cache():
+    cache = solar_position.solar_position_cache
+    set_solar_position_cache(SolarPositionCache())
+    yield solar_position.solar_position_cache
+    set_solar_position_cache(cache)
+
+
+def test_cache_matches_pvlib_and_evicts():
+    times = pd.date_range('2019-01-01', periods=8760, freq='h', tz='UTC')
+    # One profile of three float64 columns fits, two do not
+    cache = SolarPositionCache(max_size_MB=1.5*3*8*8760/1024**2)
+    position = cache.get_solar_position(60.00004, 10.0, times)
+    expected = pvlib.location.Location(60.0, 10.0).get_solarposition(times)
+    for column in SolarPositionCache.columns:
+        np.testing.assert_array_equal(position[column].to_numpy(), expected[column].to_numpy())
+        assert not position[column].to_numpy().flags.writeable
+
+    # Coordinates within the resolution share the entry
+    assert cache.get_solar_position(59.99996, 10.0, times)['zenith'].equals(position['zenith'])
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.get_solar_position(61.0, 10.0, times)
+    assert cache.get_size() == 3*8*8760
+    cache.get_solar_position(60.0, 10.0, times)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_systems_share_the_cache(shared_cache):
+    weather_cache = make_weather_cache()
+    systems = [PVsystem(fixture_latitude, fixture_longitude, area, None, weather_cache) for area in (1e4, 2e4)]
+    results = [system.get_annual_energy_yield() for system in systems]
+    assert (shared_cache.hits, shared_cache.misses) == (1, 1)
+    # The yield scales with the area, as the systems only differ by their area
+    assert results[1] == pytest.approx(2*results[0], rel=1e-12)
+
+    # A new cache at the exact coordinates computes the profile again, with the same result
+    shared_cache.clear()
+    set_solar_position_cache(SolarPositionCache(resolution=None))
+    assert systems[0].get_annual_energy_yield() == pytest.approx(results[0], rel=1e-12)
+
+
+@pytest.mark.parametrize('year', [1995, 2012, 2028])
+def test_meeus_matches_spa(year):
+    times = pd.date_range(f'{year}-01-01', periods=8760, freq='h', tz='UTC')
+    latitudes, longitudes = np.array(locations).T
+    meeus = get_solar_position_meeus(times, latitudes, longitudes)
+    for i, (latitude, longitude) in enumerate(locations):
+        spa = pvlib.location.Location(latitude, longitude).get_solarposition(times)
+        np.testing.assert_allclose(meeus['zenith'][:, i], spa['zenith'].to_numpy(), rtol=0, atol=0.01)
+        # The refraction near the horizon magnifies the difference, so the sun must be up
+        up = spa['apparent_zenith'].to_numpy() < 90
+        np.testing.assert_allclose(meeus['apparent_zenith'][up, i], spa['apparent_zenith'].to_numpy()[up],
+                                   rtol=0, atol=0.015)
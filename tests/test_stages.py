@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, make_weather_cache
+from FPVsimulation.pvgis import PVGISclient, get_default_client
+from FPVsimulation.simulation import FPVsimulation
+from FPVsimulation.stages import StageCache
+
+
+class RecordingStageCache(StageCache):
+    """
+    A stage cache recording the stages it evaluates.
+    """
+    def __init__(self):
+        super().__init__()
+        self.evaluated = []
+
+    def get(self, stage, PVparams, compute, inputs=()):
+        def record():
+            self.evaluated.append(stage)
+            return compute()
+        return super().get(stage, PVparams, record, inputs)
+
+
+@pytest.fixture
+def simulation():
+    simulation = FPVsimulation(weather_cache=make_weather_cache())
+    simulation.register_lakes(pd.DataFrame({'lake_id': ['lake'], 'lake_area': 1e6, 'latitude': fixture_latitude,
+                                            'longitude': fixture_longitude, 'selected_area': 2e4,
+                                            'max_power_MW': np.nan}))
+    simulation.registry.get_system_column('stage_cache')[0] = RecordingStageCache()
+    return simulation
+
+
+def assert_evaluates(simulation, stages):
+    """
+    Runs the simulation, checking the evaluated stages and the result against a run without cache.
+    """
+    column = simulation.registry.get_system_column('stage_cache')
+    stage_cache = column[0]
+    stage_cache.evaluated.clear()
+    result_df = simulation.get_annual_energy_yield()
+    assert sorted(stage_cache.evaluated) == sorted(stages)
+
+    column[0] = None
+    expected_df = simulation.get_annual_energy_yield()
+    column[0] = stage_cache
+    assert result_df['annual_energy_yield_kWh'].tolist() == expected_df['annual_energy_yield_kWh'].tolist()
+
+
+def test_changes_invalidate_the_dependent_stages(simulation):
+    all_stages = ['weather', 'solar_position', 'poa', 'module_performance', 'soiling']
+    assert_evaluates(simulation, all_stages)
+    assert_evaluates(simulation, [])
+
+    simulation.set_PVmodel_parameters({'system_derate_factor': 0.8})
+    assert_evaluates(simulation, [])
+    simulation.set_PVmodel_parameters({'eff_nom': 21})
+    assert_evaluates(simulation, ['module_performance'])
+    simulation.set_PVmodel_parameters({'tilt': 20, 'azimuth': 150})
+    assert_evaluates(simulation, ['poa', 'module_performance'])
+
+    simulation.set_soiling_table(pd.DataFrame({'latitude': [fixture_latitude], 'longitude': [fixture_longitude],
+                                               'soiling': [[2.0]*12]}))
+    assert_evaluates(simulation, ['soiling'])
+
+    simulation.set_weather_cache(make_weather_cache())
+    assert_evaluates(simulation, ['weather', 'solar_position', 'poa', 'module_performance'])
+    client = get_default_client()
+    simulation.set_client(PVGISclient(raddatabases=client.raddatabases, usehorizon=client.usehorizon))
+    assert_evaluates(simulation, ['weather', 'solar_position', 'poa', 'module_performance'])
+    assert_evaluates(simulation, [])
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from benchmarks.fixtures import load_tmy
+from FPVsimulation.pvsystem import PVsystem
+from FPVsimulation.weather_cache import WeatherCache
+
+
+class StubClient():
+    """
+    A PVGIS client serving the TMY fixture without network, counting the downloads.
+    """
+    raddatabases = ('PVGIS-SARAH2', 'PVGIS-ERA5')
+    usehorizon = 1
+
+    def __init__(self):
+        self.downloads = []
+
+    def get_tmy(self, latitude, longitude):
+        self.downloads.append((latitude, longitude))
+        return load_tmy()
+
+
+class FailingClient(StubClient):
+    def get_tmy(self, latitude, longitude):
+        raise AssertionError(f"Unexpected download of ({latitude}, {longitude})")
+
+
+def make_system(latitude, longitude, weather_cache, client):
+    system = PVsystem(latitude, longitude, 1e4, None, weather_cache)
+    system.client = client
+    return system
+
+
+def test_cache_hit_needs_no_network(tmp_path):
+    weather_cache = WeatherCache(str(tmp_path), grid_resolution=0.1)
+    client = StubClient()
+    tmy_df = make_system(60.01, 10.02, weather_cache, client).get_tmy_profile()
+    # The download is made at the grid point and stored under it
+    assert client.downloads == [(60.0, 10.0)]
+    assert weather_cache.has(60.0, 10.0, 'PVGIS-SARAH2', 1)
+
+    system = make_system(60.04, 9.97, weather_cache, FailingClient())
+    cached_df = system.get_tmy_profile()
+    assert system.raddatabase == 'PVGIS-SARAH2'
+    assert cached_df.index.equals(tmy_df.index)
+    assert cached_df.drop(columns='raddatabase').equals(tmy_df.drop(columns='raddatabase'))
+
+
+def test_offline_miss_raises(tmp_path):
+    weather_cache = WeatherCache(str(tmp_path), offline=True)
+    with pytest.raises(LookupError):
+        make_system(60.0, 10.0, weather_cache, FailingClient()).get_tmy_profile()
+    assert not os.listdir(tmp_path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    weather_cache = WeatherCache(str(tmp_path), grid_resolution=1.0, max_size_MB=None)
+    tmy_df = load_tmy()
+    locations = [(60.0, 10.0), (61.0, 10.0), (62.0, 10.0)]
+    for age, location in zip((300, 200, 100), locations):
+        weather_cache.put(*location, 'PVGIS-SARAH2', 1, tmy_df)
+        path = weather_cache.get_path(*location, 'PVGIS-SARAH2', 1)
+        os.utime(path, (os.path.getmtime(path) - age,)*2)
+    entry_size = weather_cache.get_size() / len(locations)
+
+    # Reading the oldest entry marks it as recently used, so the second entry is the oldest
+    assert weather_cache.get(60.0, 10.0, 'PVGIS-SARAH2', 1) is not None
+    weather_cache.max_size_MB = 3.5*entry_size / 1024**2
+    weather_cache.put(63.0, 10.0, 'PVGIS-SARAH2', 1, tmy_df)
+    assert [weather_cache.has(latitude, 10.0, 'PVGIS-SARAH2', 1) for latitude in (60.0, 61.0, 62.0, 63.0)] == [
+        True, False, True, True]
+    assert weather_cache.get_locations('PVGIS-SARAH2', 1) == [(60.0, 10.0), (62.0, 10.0), (63.0, 10.0)]
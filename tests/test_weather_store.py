@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import fixture_latitude, fixture_longitude, load_tmy
+from FPVsimulation.weather_store import WeatherStore
+
+
+class FailingProfiles():
+    """
+    Profiles of known length whose last item raises, like a failed download.
+    """
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    def __len__(self):
+        return len(self.profiles) + 1
+
+    def __iter__(self):
+        yield from self.profiles
+        raise ConnectionError("download failed")
+
+
+@pytest.fixture
+def tmy_df():
+    return load_tmy()
+
+
+@pytest.mark.parametrize('failure', ['duplicate', 'length', 'download'])
+def test_failed_rebuild_keeps_the_store(tmp_path, tmy_df, failure):
+    store_dir = str(tmp_path / 'store')
+    profiles = [(fixture_latitude, fixture_longitude, tmy_df), (fixture_latitude + 1, fixture_longitude, tmy_df)]
+    store = WeatherStore.create(store_dir, profiles)
+    expected = store.get(fixture_latitude, fixture_longitude)
+
+    new_profiles = [(fixture_latitude + 2, fixture_longitude, tmy_df)]
+    if failure == 'duplicate':
+        new_profiles = new_profiles * 2
+    elif failure == 'length':
+        new_profiles.append((fixture_latitude + 3, fixture_longitude, tmy_df.iloc[:-24]))
+    else:
+        new_profiles = FailingProfiles(new_profiles)
+    with pytest.raises((ValueError, ConnectionError)):
+        WeatherStore.create(store_dir, new_profiles)
+
+    assert not [name for name in os.listdir(store_dir) if name.endswith('.tmp')]
+    reopened = WeatherStore(store_dir)
+    assert len(reopened) == 2
+    assert not reopened.has(fixture_latitude + 2, fixture_longitude)
+    assert np.array_equal(reopened.get(fixture_latitude, fixture_longitude).to_numpy(), expected.to_numpy())
+
+
+def test_rebuild_replaces_the_store(tmp_path, tmy_df):
+    store_dir = str(tmp_path / 'store')
+    WeatherStore.create(store_dir, [(fixture_latitude, fixture_longitude, tmy_df)])
+    store = WeatherStore.create(store_dir, [(fixture_latitude + 2, fixture_longitude, tmy_df)])
+    assert len(store) == 1
+    assert store.has(fixture_latitude + 2, fixture_longitude)
+    assert not store.has(fixture_latitude, fixture_longitude)
+    assert sorted(os.listdir(store_dir)) == ['index.json', 'time.npy', 'weather.npy']